@@ -0,0 +1,74 @@
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from data.nutrition_store import NutritionStore, build_store, NUTRIENT_FIELDS
+from pipeline.alternatives import HealthierAlternatives, ALTERNATIVE_RULES
+from bench_nutrition_store import synthetic_catalogue
+
+def brute_force(alternatives, name, goal, k):
+    # The scan the k-d tree replaces: every food, filtered, then sorted.
+    field, direction, margin, minimum = ALTERNATIVE_RULES[goal]
+    dim = NUTRIENT_FIELDS.index(field)
+    position = alternatives.positions[name.lower()]
+    values = alternatives.values
+    point = values[position]
+    gap = max(abs(point[dim]) * margin, minimum)
+    if direction == 'lower':
+        keep = values[:, dim] < point[dim] - gap
+    else:
+        keep = values[:, dim] > point[dim] + gap
+    keep[position] = False
+    candidates = np.flatnonzero(keep)
+    distances = np.sum(((values[candidates] - point) / alternatives.scale) ** 2, axis=1)
+    return [alternatives.names[i] for i in candidates[np.argsort(distances, kind='stable')[:k]]]
+
+def timed(fn, queries):
+    timings = []
+    for args in queries:
+        start = time.perf_counter()
+        fn(*args)
+        timings.append(time.perf_counter() - start)
+    return np.percentile(timings, 50) * 1e6, np.percentile(timings, 99) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description="Healthier-alternative lookup: k-d tree vs full catalogue scan")
+    parser.add_argument("--foods", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("-k", type=int, default=3)
+    args = parser.parse_args()
+    
+    rng = random.Random(2)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "nutrition.db")
+        build_store(path, synthetic_catalogue(args.foods))
+        store = NutritionStore(path)
+        
+        start = time.perf_counter()
+        alternatives = HealthierAlternatives(store)
+        build_s = time.perf_counter() - start
+        print(f"{len(store):,} foods, {len(alternatives.tree.lo):,} leaves, built in {build_s * 1e3:.0f}ms")
+        
+        names = rng.sample(alternatives.names, args.queries)
+        print(f"{'':>14} {'tree p50 us':>12} {'tree p99 us':>12} {'scan p50 us':>12}  agreement")
+        for goal in ALTERNATIVE_RULES:
+            queries = [(name, store[name], goal, args.k) for name in names]
+            tree_p50, tree_p99 = timed(alternatives.find, queries)
+            scan_p50, _ = timed(brute_force, [(alternatives, name, goal, args.k) for name in names])
+            agree = np.mean([
+                [food['name'] for food in alternatives.find(name, store[name], goal, args.k)]
+                == brute_force(alternatives, name, goal, args.k)
+                for name in names
+            ])
+            print(f"{goal:>14} {tree_p50:>12.1f} {tree_p99:>12.1f} {scan_p50:>12.1f}  {agree:.1%}")
+        store.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from config import FOOD_CATEGORIES
+from data.create_dataset import generate_synthetic_food_images
+from data.preprocess import extract_features, extract_features_batch
+
+def main():
+    parser = argparse.ArgumentParser(description="extract_features vs extract_features_batch")
+    parser.add_argument("--images", type=int, default=256)
+    args = parser.parse_args()
+    
+    rng = np.random.default_rng(0)
+    per_class = max(1, args.images // len(FOOD_CATEGORIES))
+    images = np.concatenate([
+        generate_synthetic_food_images(food_type, per_class, rng) for food_type in FOOD_CATEGORIES
+    ]) / 255.0
+    
+    start = time.perf_counter()
+    reference = np.stack([extract_features(img) for img in images])
+    reference_time = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    batched = extract_features_batch(images)
+    batch_time = time.perf_counter() - start
+    
+    print(f"{len(images)} images, {reference.shape[1]} features")
+    print(f"max abs difference: {np.abs(reference - batched).max():.3g}")
+    print(f"extract_features:       {reference_time / len(images) * 1e3:.2f} ms/img")
+    print(f"extract_features_batch: {batch_time / len(images) * 1e3:.2f} ms/img "
+          f"({reference_time / batch_time:.2f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import joblib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from config import MODELS_DIR, FOOD_CATEGORIES
+from data.create_dataset import generate_synthetic_food_image
+from data.preprocess import preprocess_images
+from pipeline.forest_engine import CompiledForest
+
+def median_time(fn, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+def main():
+    parser = argparse.ArgumentParser(description="sklearn forest vs CompiledForest latency")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 16, 64, 256])
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+    
+    classifier_path = os.path.join(MODELS_DIR, "food_classifier.joblib")
+    if not os.path.exists(classifier_path):
+        print("Models not found. Run train_models.py first.")
+        return
+    
+    classifier = joblib.load(classifier_path)
+    start = time.perf_counter()
+    engine = CompiledForest.from_sklearn(classifier)
+    print(f"Compiled {engine.n_estimators} trees / {engine.n_nodes} nodes "
+          f"in {(time.perf_counter() - start) * 1e3:.1f} ms")
+    
+    images = [
+        generate_synthetic_food_image(FOOD_CATEGORIES[i % len(FOOD_CATEGORIES)], i)
+        for i in range(max(args.batch_sizes))
+    ]
+    X = preprocess_images(images)
+    
+    mismatches = int((classifier.predict(X) != engine.predict(X)).sum())
+    print(f"argmax mismatches vs sklearn: {mismatches} / {len(X)}")
+    
+    print(f"{'batch':>6} {'sklearn ms':>12} {'engine ms':>12} {'speedup':>8}")
+    for batch_size in args.batch_sizes:
+        batch = X[:batch_size]
+        sklearn_time = median_time(
+            lambda: (classifier.predict(batch), classifier.predict_proba(batch)), args.repeats
+        )
+        engine_time = median_time(lambda: engine.predict_with_proba(batch), args.repeats)
+        print(f"{batch_size:>6} {sklearn_time * 1e3:>12.3f} {engine_time * 1e3:>12.3f} "
+              f"{sklearn_time / engine_time:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
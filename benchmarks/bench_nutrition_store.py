@@ -0,0 +1,97 @@
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from data.nutrition_store import NutritionStore, build_store, seed_foods
+
+WORDS = (
+    "grilled baked fried roast steamed raw smoked spicy sweet sour creamy crispy "
+    "chicken beef pork lamb salmon tuna cod shrimp tofu lentil bean rice pasta noodle "
+    "potato tomato spinach kale carrot pepper mushroom onion garlic cheese yogurt "
+    "apple banana mango berry orange lemon almond walnut oat wheat corn soup salad "
+    "curry stew pie wrap burger sandwich taco pizza bread cake muffin cookie"
+).split()
+PORTIONS = ("100 g", "1 cup", "1 serving")
+
+def synthetic_catalogue(n_foods, seed=0):
+    # Multi-word names with a few portion variants each, on top of the
+    # built-in foods.
+    rng = random.Random(seed)
+    names = set()
+    while len(names) < n_foods:
+        names.add(" ".join(rng.sample(WORDS, rng.randint(2, 4))))
+    foods = list(seed_foods())
+    for name in sorted(names):
+        base = {'calories': rng.uniform(20, 800), 'protein': rng.uniform(0, 60), 'carbs': rng.uniform(0, 90),
+                'fat': rng.uniform(0, 50), 'fiber': rng.uniform(0, 12)}
+        foods.append({'name': name, 'portion': '', **base})
+        for portion in PORTIONS[:rng.randint(0, len(PORTIONS))]:
+            scale = rng.uniform(0.5, 2.5)
+            foods.append({'name': name, 'portion': portion, **{k: v * scale for k, v in base.items()}})
+    return foods
+
+def percentiles(fn, args_list):
+    timings = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        timings.append(time.perf_counter() - start)
+    return np.percentile(timings, 50) * 1e6, np.percentile(timings, 99) * 1e6
+
+def misspell(name, rng):
+    i = rng.randrange(len(name))
+    return name[:i] + name[i + 1:]
+
+def main():
+    parser = argparse.ArgumentParser(description="Lookup and search latency of the SQLite nutrition store")
+    parser.add_argument("--foods", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--cache-size", type=int, default=4096)
+    args = parser.parse_args()
+    
+    rng = random.Random(1)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "nutrition.db")
+        foods = synthetic_catalogue(args.foods)
+        start = time.perf_counter()
+        build_store(path, foods)
+        build_s = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        store = NutritionStore(path, cache_size=args.cache_size)
+        open_s = time.perf_counter() - start
+        
+        names = list(store)
+        cold = [(name,) for name in rng.sample(names, args.queries)]
+        # Hot lookups: the built-in foods, as photo predictions ask for them.
+        hot = [(rng.choice(list(seed_foods()))['name'],) for _ in range(args.queries)]
+        lookup = store.__getitem__
+        prefixes = [(name[:rng.randint(1, 5)],) for name, in cold]
+        typos = [(misspell(name, rng),) for name, in cold[:args.queries // 4]]
+        
+        print(f"{len(store):,} foods, {store.n_portions:,} portions, {os.path.getsize(path) / 1e6:.1f} MB")
+        print(f"build {build_s:.2f}s, open + index {open_s * 1e3:.0f}ms")
+        print(f"{'':>16} {'p50 us':>9} {'p99 us':>9}")
+        for label, fn, queries in (
+            ("lookup (cold)", lookup, cold),
+            ("lookup (hot)", lookup, hot),
+            ("prefix search", store.prefix_search, prefixes),
+            ("fuzzy search", store.fuzzy_search, typos),
+        ):
+            p50, p99 = percentiles(fn, queries)
+            print(f"{label:>16} {p50:>9.1f} {p99:>9.1f}")
+        
+        found = sum(name in store.fuzzy_search(typo, 5) for (name,), (typo,) in zip(cold, typos))
+        print(f"fuzzy recall@5 for one-letter typos: {found / len(typos):.1%}")
+        print(f"cache: {store.cache_info()}")
+        store.close()
+
+if __name__ == "__main__":
+    main()
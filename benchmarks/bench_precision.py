@@ -0,0 +1,68 @@
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import LabelEncoder
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from config import PROCESSED_DATA_DIR, IMAGE_SIZE
+from data.preprocess import preprocess_dataset
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory and accuracy of float64 vs float32 precision")
+    parser.add_argument("--n-jobs", type=int, default=1)
+    args = parser.parse_args()
+    
+    csv_path = os.path.join(PROCESSED_DATA_DIR, "nutrition_dataset.csv")
+    if not os.path.exists(csv_path):
+        print("Dataset not found. Run create_dataset.py first.")
+        return
+    df = pd.read_csv(csv_path)
+    
+    pixels = IMAGE_SIZE[0] * IMAGE_SIZE[1] * 3
+    results = {}
+    for precision in ("float64", "float32"):
+        start = time.perf_counter()
+        X, y = preprocess_dataset(df, n_jobs=args.n_jobs, precision=precision)
+        extract_time = time.perf_counter() - start
+        
+        y_encoded = LabelEncoder().fit_transform(y)
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y_encoded, test_size=0.2, random_state=42, stratify=y_encoded
+        )
+        classifier = RandomForestClassifier(
+            n_estimators=100, max_depth=15, min_samples_split=5,
+            min_samples_leaf=2, random_state=42, n_jobs=-1
+        )
+        classifier.fit(X_train, y_train)
+        y_pred = classifier.predict(X_test)
+        
+        image_bytes = pixels * (8 if precision == "float64" else 1)
+        results[precision] = {
+            "features_mb": X.nbytes / 1e6,
+            "image_kb": image_bytes / 1e3,
+            "extract_s": extract_time,
+            "accuracy": float((y_pred == y_test).mean()),
+            "predictions": y_pred,
+        }
+    
+    wide, narrow = results["float64"], results["float32"]
+    print(f"{'':>22} {'float64':>10} {'float32':>10}")
+    print(f"{'feature matrix (MB)':>22} {wide['features_mb']:>10.1f} {narrow['features_mb']:>10.1f}")
+    print(f"{'decoded image (KB)':>22} {wide['image_kb']:>10.1f} {narrow['image_kb']:>10.1f}")
+    print(f"{'extraction (s)':>22} {wide['extract_s']:>10.2f} {narrow['extract_s']:>10.2f}")
+    print(f"{'test accuracy':>22} {wide['accuracy']:>10.4f} {narrow['accuracy']:>10.4f}")
+    print(f"\nMemory saved: {wide['features_mb'] - narrow['features_mb']:.1f} MB of features "
+          f"({1 - narrow['features_mb'] / wide['features_mb']:.0%}), "
+          f"{1 - narrow['image_kb'] / wide['image_kb']:.0%} per decoded image")
+    print(f"Accuracy delta: {narrow['accuracy'] - wide['accuracy']:+.4f}, "
+          f"prediction agreement {np.mean(wide['predictions'] == narrow['predictions']):.2%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from config import FOOD_CATEGORIES
+from data.create_dataset import generate_synthetic_food_image
+from pipeline.predict import NutritionPredictor
+
+def make_images(n):
+    return [
+        generate_synthetic_food_image(FOOD_CATEGORIES[i % len(FOOD_CATEGORIES)], i)
+        for i in range(n)
+    ]
+
+def time_call(fn, repeats):
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput of predict vs predict_batch by batch size")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32, 128, 512])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+    
+    predictor = NutritionPredictor()
+    if not predictor.models_loaded:
+        print("Models not found. Run train_models.py first.")
+        return
+    
+    images = make_images(max(args.batch_sizes))
+    
+    print(f"{'batch':>6} {'loop img/s':>12} {'batch img/s':>12} {'speedup':>8}")
+    for batch_size in args.batch_sizes:
+        batch = images[:batch_size]
+        loop_time = time_call(lambda: [predictor.predict(img, 'weight_loss') for img in batch], args.repeats)
+        batch_time = time_call(lambda: predictor.predict_batch(batch, 'weight_loss'), args.repeats)
+        print(f"{batch_size:>6} {batch_size / loop_time:>12.1f} {batch_size / batch_time:>12.1f} "
+              f"{loop_time / batch_time:>7.2f}x")
+
+if __name__ == "__main__":
+    main()
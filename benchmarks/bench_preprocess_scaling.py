@@ -0,0 +1,50 @@
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from config import PROCESSED_DATA_DIR
+from data.preprocess import preprocess_dataset
+
+def main():
+    parser = argparse.ArgumentParser(description="preprocess_dataset scaling across worker counts")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--limit", type=int, default=None, help="Only use the first N rows")
+    args = parser.parse_args()
+    
+    csv_path = os.path.join(PROCESSED_DATA_DIR, "nutrition_dataset.csv")
+    if not os.path.exists(csv_path):
+        print("Dataset not found. Run create_dataset.py first.")
+        return
+    
+    df = pd.read_csv(csv_path)
+    if args.limit is not None:
+        df = df.head(args.limit)
+    
+    worker_counts = sorted({1, *[2 ** k for k in range(1, 8) if 2 ** k < args.max_workers], args.max_workers})
+    
+    print(f"{len(df)} images, {os.cpu_count()} CPUs")
+    print(f"{'workers':>8} {'seconds':>10} {'img/s':>10} {'speedup':>8} {'efficiency':>11}")
+    reference = None
+    baseline_time = None
+    for n_jobs in worker_counts:
+        start = time.perf_counter()
+        X, y = preprocess_dataset(df, n_jobs=n_jobs)
+        elapsed = time.perf_counter() - start
+        
+        if reference is None:
+            reference = X
+            baseline_time = elapsed
+        elif not np.array_equal(reference, X):
+            print(f"Warning: features with {n_jobs} workers differ from the serial run")
+        
+        speedup = baseline_time / elapsed
+        print(f"{n_jobs:>8} {elapsed:>10.2f} {len(X) / elapsed:>10.1f} {speedup:>7.2f}x {speedup / n_jobs:>10.0%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from config import FOOD_CATEGORIES
+from data.create_dataset import generate_synthetic_food_image
+from pipeline.metrics import METRICS, SlowRequestProfiler, set_slow_request_profiler
+from pipeline.predict import NutritionPredictor
+
+def run(predictor, images, batch_size):
+    start = time.perf_counter()
+    for image in images:
+        predictor.predict(image, 'weight_loss')
+    for i in range(0, len(images), batch_size):
+        predictor.predict_batch(images[i:i + batch_size], 'weight_loss')
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stage time breakdown and instrumentation overhead")
+    parser.add_argument("--n-images", type=int, default=256)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--profile-slow-ms", type=float, default=0.0,
+                        help="Also sample stacks of calls slower than this")
+    parser.add_argument("--dump", help="Write the metrics to this path (.json or Prometheus text)")
+    args = parser.parse_args()
+    
+    predictor = NutritionPredictor()
+    if not predictor.models_loaded:
+        print("Models not found. Run train_models.py first.")
+        return
+    
+    # Fresh PIL images decode on first use, so decode is only timed once per
+    # image; every run gets new copies to keep the stages comparable.
+    def make_images():
+        return [
+            generate_synthetic_food_image(FOOD_CATEGORIES[i % len(FOOD_CATEGORIES)], i)
+            for i in range(args.n_images)
+        ]
+    
+    METRICS.disable()
+    disabled = min(run(predictor, make_images(), args.batch_size) for _ in range(args.repeats))
+    
+    METRICS.enable()
+    if args.profile_slow_ms > 0:
+        set_slow_request_profiler(SlowRequestProfiler(args.profile_slow_ms))
+    enabled = float('inf')
+    for _ in range(args.repeats):
+        METRICS.reset()
+        enabled = min(enabled, run(predictor, make_images(), args.batch_size))
+    
+    snapshot = METRICS.snapshot()
+    print(f"{'stage':<16} {'calls':>7} {'total ms':>10} {'mean ms':>9} {'p95 ms':>8}")
+    for name, stats in snapshot['stages'].items():
+        print(f"{name:<16} {stats['count']:>7} {stats['sum_s'] * 1000:>10.1f} "
+              f"{stats['mean_s'] * 1000:>9.3f} {stats['p95_s'] * 1000:>8.2f}")
+    print(f"counters: {snapshot['counters']}")
+    print(f"\ndisabled {disabled * 1000:.1f}ms, enabled {enabled * 1000:.1f}ms, "
+          f"overhead {(enabled / disabled - 1):+.1%}")
+    
+    if args.dump:
+        METRICS.dump(args.dump)
+        print(f"Wrote {args.dump}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from config import IMAGE_SIZE
+from data.create_dataset import COLOR_MAP, generate_synthetic_food_images, batch_seed
+
+def legacy_generate(food_type, seed):
+    # The original per-pixel implementation, kept here as the reference point.
+    np.random.seed(seed)
+    base_color = np.array(COLOR_MAP.get(food_type, (128, 128, 128)))
+    img = np.zeros((IMAGE_SIZE[0], IMAGE_SIZE[1], 3), dtype=np.uint8)
+    noise = np.random.randint(-30, 30, (IMAGE_SIZE[0], IMAGE_SIZE[1], 3))
+    for i in range(3):
+        channel = np.full((IMAGE_SIZE[0], IMAGE_SIZE[1]), base_color[i], dtype=np.int32)
+        img[:, :, i] = np.clip(channel + noise[:, :, i], 0, 255).astype(np.uint8)
+    center_x, center_y = IMAGE_SIZE[0] // 2, IMAGE_SIZE[1] // 2
+    for i in range(IMAGE_SIZE[0]):
+        for j in range(IMAGE_SIZE[1]):
+            dist = np.sqrt((i - center_x) ** 2 + (j - center_y) ** 2)
+            if dist < IMAGE_SIZE[0] // 3:
+                img[i, j] = np.clip(img[i, j].astype(np.int32) + 20, 0, 255).astype(np.uint8)
+    texture = np.random.randint(-15, 15, (IMAGE_SIZE[0], IMAGE_SIZE[1], 3))
+    return np.clip(img.astype(np.int32) + texture, 0, 255).astype(np.uint8)
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic image generator throughput")
+    parser.add_argument("--legacy-images", type=int, default=20)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 64, 256, 1024])
+    args = parser.parse_args()
+    
+    start = time.perf_counter()
+    for i in range(args.legacy_images):
+        legacy_generate("pizza", i)
+    legacy_rate = args.legacy_images / (time.perf_counter() - start)
+    print(f"{'legacy loop':>12} {legacy_rate:>12.1f} img/s")
+    
+    for batch_size in args.batch_sizes:
+        rng = np.random.default_rng(batch_seed("pizza", 0, 0))
+        generate_synthetic_food_images("pizza", batch_size, rng)
+        
+        start = time.perf_counter()
+        generated = 0
+        while generated < max(batch_size, 1024):
+            rng = np.random.default_rng(batch_seed("pizza", 0, generated))
+            generate_synthetic_food_images("pizza", batch_size, rng)
+            generated += batch_size
+        rate = generated / (time.perf_counter() - start)
+        print(f"{'batch ' + str(batch_size):>12} {rate:>12.1f} img/s {rate / legacy_rate:>8.0f}x")
+
+if __name__ == "__main__":
+    main()
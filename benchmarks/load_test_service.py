@@ -0,0 +1,90 @@
+import os
+import sys
+import io
+import json
+import time
+import asyncio
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from config import FOOD_CATEGORIES
+from data.create_dataset import generate_synthetic_food_image
+
+def make_payloads(n):
+    payloads = []
+    for i in range(n):
+        buffer = io.BytesIO()
+        generate_synthetic_food_image(FOOD_CATEGORIES[i % len(FOOD_CATEGORIES)], i).save(buffer, format="PNG")
+        payloads.append(buffer.getvalue())
+    return payloads
+
+async def request(reader, writer, host, method, path, body=b""):
+    head = (
+        f"{method} {path} HTTP/1.1\r\nHost: {host}\r\n"
+        f"Content-Type: image/png\r\nContent-Length: {len(body)}\r\n\r\n"
+    )
+    writer.write(head.encode("latin-1") + body)
+    await writer.drain()
+    
+    response_head = await reader.readuntil(b"\r\n\r\n")
+    lines = response_head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split(" ")[1])
+    length = 0
+    for line in lines[1:]:
+        if line.lower().startswith("content-length:"):
+            length = int(line.split(":", 1)[1])
+    return status, json.loads(await reader.readexactly(length))
+
+async def client(host, port, payloads, n_requests, latencies, statuses):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for i in range(n_requests):
+            start = time.perf_counter()
+            status, _ = await request(reader, writer, host, "POST", "/predict?goal=weight_loss", payloads[i % len(payloads)])
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        writer.close()
+
+async def run(args):
+    payloads = make_payloads(64)
+    
+    reader, writer = await asyncio.open_connection(args.host, args.port)
+    _, before = await request(reader, writer, args.host, "GET", "/health")
+    
+    latencies, statuses = [], {}
+    per_client = args.requests // args.concurrency
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        client(args.host, args.port, payloads, per_client, latencies, statuses)
+        for _ in range(args.concurrency)
+    ])
+    elapsed = time.perf_counter() - start
+    
+    _, after = await request(reader, writer, args.host, "GET", "/health")
+    writer.close()
+    
+    latencies = np.array(latencies) * 1000
+    batches = after['batches'] - before['batches']
+    items = after['predictions'] - before['predictions']
+    print(f"concurrency {args.concurrency}, {len(latencies)} requests in {elapsed:.2f}s "
+          f"({len(latencies) / elapsed:.1f} req/s)")
+    print(f"statuses: {statuses}")
+    print(f"latency ms: p50 {np.percentile(latencies, 50):.1f}  p95 {np.percentile(latencies, 95):.1f}  "
+          f"p99 {np.percentile(latencies, 99):.1f}  max {latencies.max():.1f}")
+    if batches:
+        print(f"batches: {batches}, mean batch size {items / batches:.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent POST /predict load against a running http_server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=1024)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
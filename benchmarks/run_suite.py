@@ -0,0 +1,188 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(ROOT_DIR, 'src')
+sys.path.insert(0, SRC_DIR)
+
+# Every metric is a duration in seconds, so lower is always better.
+
+def best_of(fn, repeats):
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+def run_scale(samples_per_class, repeats, n_latency):
+    # Runs in a child process whose NUTRITION_DATA_DIR / NUTRITION_MODELS_DIR
+    # point at a scratch directory, so config resolves to it on import.
+    import pandas as pd
+    from config import FOOD_CATEGORIES, PROCESSED_DATA_DIR, MODELS_DIR
+    from data.create_dataset import create_dataset, generate_synthetic_food_image
+    from data.preprocess import extract_features, extract_features_batch, image_to_array, preprocess_dataset, feature_params
+    from models.train_classifier import train_food_classifier
+    from models.train_calorie_model import train_calorie_regressor
+    from pipeline.model_bundle import write_bundle, source_stamps
+    from pipeline.predict import NutritionPredictor
+    
+    metrics = {}
+    n_images = 32
+    foods = [FOOD_CATEGORIES[i % len(FOOD_CATEGORIES)] for i in range(n_images)]
+    
+    metrics['generate_image_s'] = best_of(
+        lambda: [generate_synthetic_food_image(food, i) for i, food in enumerate(foods)], repeats
+    ) / n_images
+    
+    images = np.stack([image_to_array(generate_synthetic_food_image(food, i)) for i, food in enumerate(foods)])
+    metrics['extract_features_s'] = best_of(lambda: [extract_features(image) for image in images], repeats) / n_images
+    metrics['extract_features_batch_s'] = best_of(lambda: extract_features_batch(images), repeats) / n_images
+    
+    metrics['create_dataset_s'], _ = timed(lambda: create_dataset(samples_per_class=samples_per_class))
+    df = pd.read_csv(os.path.join(PROCESSED_DATA_DIR, "nutrition_dataset.csv"))
+    metrics['preprocess_dataset_s'], _ = timed(lambda: preprocess_dataset(df))
+    
+    metrics['train_classifier_s'], (classifier, label_encoder, _) = timed(
+        lambda: train_food_classifier(use_feature_cache=False)
+    )
+    metrics['train_regressor_s'], (regressor, food_encoder) = timed(train_calorie_regressor)
+    write_bundle(classifier, label_encoder, regressor, food_encoder, feature_params(), sources=source_stamps(MODELS_DIR))
+    
+    metrics['predictor_load_s'], predictor = timed(NutritionPredictor)
+    
+    pil_images = [generate_synthetic_food_image(FOOD_CATEGORIES[i % len(FOOD_CATEGORIES)], 1000 + i) for i in range(n_latency)]
+    predictor.predict(pil_images[0])
+    latencies = []
+    for image in pil_images:
+        start = time.perf_counter()
+        predictor.predict(image, 'weight_loss')
+        latencies.append(time.perf_counter() - start)
+    for q in (50, 95, 99):
+        metrics[f'predict_p{q}_s'] = float(np.percentile(latencies, q))
+    
+    batch = pil_images[:32]
+    metrics['predict_batch32_per_image_s'] = best_of(lambda: predictor.predict_batch(batch), repeats) / len(batch)
+    
+    return metrics
+
+def run_child(samples_per_class, args):
+    workdir = tempfile.mkdtemp(prefix=f"nutrition-bench-{samples_per_class}-")
+    result_path = os.path.join(workdir, "result.json")
+    env = dict(os.environ,
+               NUTRITION_DATA_DIR=os.path.join(workdir, "data"),
+               NUTRITION_MODELS_DIR=os.path.join(workdir, "models"))
+    command = [
+        sys.executable, os.path.abspath(__file__), "--child", str(samples_per_class),
+        "--child-output", result_path, "--repeats", str(args.repeats), "--latency-samples", str(args.latency_samples)
+    ]
+    try:
+        subprocess.run(command, env=env, check=True, stdout=None if args.verbose else subprocess.DEVNULL)
+        with open(result_path) as f:
+            return json.load(f)
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+def environment():
+    info = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+    }
+    try:
+        import sklearn
+        info["sklearn"] = sklearn.__version__
+    except ImportError:
+        pass
+    try:
+        info["git_commit"] = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        pass
+    return info
+
+def compare(results, baseline, threshold):
+    regressions = []
+    print(f"\n{'metric':<48} {'baseline':>11} {'current':>11} {'change':>8}")
+    for name in sorted(results):
+        if name not in baseline:
+            continue
+        before, after = baseline[name], results[name]
+        change = after / before - 1 if before > 0 else 0.0
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif change < -threshold:
+            flag = "  faster"
+        print(f"{name:<48} {before * 1000:>9.2f}ms {after * 1000:>9.2f}ms {change:>+7.1%}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dataset build, feature extraction, training and inference")
+    parser.add_argument("--scales", type=int, nargs="+", default=[10, 50],
+                        help="Samples per class for each run")
+    parser.add_argument("--repeats", type=int, default=3, help="Best of N for the micro benchmarks")
+    parser.add_argument("--latency-samples", type=int, default=200)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    parser.add_argument("--baseline", help="Compare against a JSON file written by --output")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Relative slowdown reported as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch directories")
+    parser.add_argument("--verbose", action="store_true", help="Show output from dataset creation and training")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--child-output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.child is not None:
+        metrics = run_scale(args.child, args.repeats, args.latency_samples)
+        with open(args.child_output, "w") as f:
+            json.dump(metrics, f)
+        return
+    
+    results = {}
+    for scale in args.scales:
+        print(f"Running scale {scale} samples/class...")
+        for name, value in run_child(scale, args).items():
+            results[f"scale={scale}/{name}"] = value
+    
+    print(f"\n{'metric':<48} {'time':>11}")
+    for name, value in results.items():
+        print(f"{name:<48} {value * 1000:>9.2f}ms")
+    
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"environment": environment(), "results": results}, f, indent=2)
+        print(f"\nWrote {args.output}")
+    
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline["results"], args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} metric(s) slower than baseline by more than {args.threshold:.0%}")
+            if args.fail_on_regression:
+                sys.exit(1)
+
+if __name__ == "__main__":
+    main()
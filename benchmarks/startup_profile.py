@@ -0,0 +1,88 @@
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+from collections import defaultdict
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+
+# Runs in a fresh interpreter so every import and load is cold. The last line
+# of stdout is the JSON timing record.
+CHILD = '''
+import sys, time, json
+start = time.perf_counter()
+sys.path.insert(0, {src!r})
+from pipeline.predict import NutritionPredictor
+imported = time.perf_counter()
+predictor = NutritionPredictor(shared_models={shared}, load={load!r})
+constructed = time.perf_counter()
+from PIL import Image
+result = predictor.predict(Image.new("RGB", (128, 128), (200, 120, 60)))
+predicted = time.perf_counter()
+print(json.dumps({{
+    "import_s": imported - start,
+    "construct_s": constructed - imported,
+    "first_predict_s": predicted - constructed,
+    "success": bool(result["success"]),
+}}))
+'''
+
+def parse_importtime(stderr):
+    # -X importtime lines: "import time: self | cumulative | name", nested
+    # imports indented under their parent. Only top-level imports are summed
+    # so each module's time is counted once.
+    totals = defaultdict(int)
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit() or name[1:2] == " ":
+            continue
+        totals[name.strip().split(".")[0]] += int(cumulative)
+    return {package: us / 1e6 for package, us in totals.items()}
+
+def profile(load, shared):
+    code = CHILD.format(src=SRC_DIR, shared=shared, load=load)
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, check=True
+    )
+    wall = time.perf_counter() - start
+    record = json.loads(completed.stdout.strip().splitlines()[-1])
+    record.update(load=load, shared_models=shared, wall_s=wall, imports=parse_importtime(completed.stderr))
+    return record
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start breakdown: imports, model loading and first prediction")
+    parser.add_argument("--repeats", type=int, default=3, help="Best of N fresh processes per mode")
+    parser.add_argument("--top", type=int, default=10, help="Packages to list by import time")
+    parser.add_argument("--output", help="Write the records as JSON to this path")
+    args = parser.parse_args()
+    
+    modes = [("eager", False), ("eager", True), ("lazy", False), ("background", False), ("background", True)]
+    records = []
+    for load, shared in modes:
+        runs = [profile(load, shared) for _ in range(args.repeats)]
+        records.append(min(runs, key=lambda record: record["wall_s"]))
+    
+    print(f"{'mode':<20} {'import':>8} {'construct':>10} {'1st predict':>12} {'process':>9}")
+    for record in records:
+        mode = record["load"] + (" +shared" if record["shared_models"] else "")
+        print(f"{mode:<20} {record['import_s'] * 1000:>6.0f}ms {record['construct_s'] * 1000:>8.0f}ms "
+              f"{record['first_predict_s'] * 1000:>10.0f}ms {record['wall_s'] * 1000:>7.0f}ms")
+    
+    print(f"\nTop imports for eager mode (cumulative, including imports made while loading models):")
+    imports = sorted(records[0]["imports"].items(), key=lambda item: -item[1])
+    for package, seconds in imports[:args.top]:
+        print(f"  {package:<24} {seconds * 1000:>7.1f}ms")
+    
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(records, f, indent=2)
+        print(f"\nWrote {args.output}")
+
+if __name__ == "__main__":
+    main()
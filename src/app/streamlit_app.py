@@ -1,11 +1,14 @@
 import streamlit as st
 import os
+import io
 import sys
+import hashlib
+import threading
 from PIL import Image
 import numpy as np
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config import FOOD_CATEGORIES, NUTRITION_DATA, DIETARY_GOALS
+from config import FOOD_CATEGORIES, DIETARY_GOALS
 from pipeline.predict import NutritionPredictor
 
 st.set_page_config(
@@ -217,9 +220,102 @@ GOAL_EMOJIS = {
     "muscle_gain": "💪"
 }
 
+# Photos classified per predict_food_batch call when analysing a meal.
+ANALYSIS_BATCH_SIZE = 16
+CLASSIFICATION_CACHE_SIZE = 1024
+# Matches offered for a manual food search.
+MANUAL_SEARCH_LIMIT = 8
+
 @st.cache_resource
 def load_predictor():
-    return NutritionPredictor()
+    return NutritionPredictor(shared_models=True, load="background")
+
+@st.cache_resource
+def classification_cache():
+    # (model id, image hash) -> (food_type, confidence), shared by every
+    # session so the same photo is classified once per model no matter how
+    # often the page reruns or the photo is re-uploaded. Oldest entries are
+    # dropped past the limit. Guarded by classification_cache_lock.
+    return {}
+
+@st.cache_resource
+def classification_cache_lock():
+    return threading.Lock()
+
+def uploaded_image_hashes(uploaded_files):
+    # Hash each upload once rather than on every rerun.
+    known = st.session_state.get('upload_hashes', {})
+    hashes = {}
+    for uploaded_file in uploaded_files:
+        digest = known.get(uploaded_file.file_id)
+        if digest is None:
+            digest = hashlib.blake2b(uploaded_file.getvalue(), digest_size=16).hexdigest()
+        hashes[uploaded_file.file_id] = digest
+    st.session_state.upload_hashes = hashes
+    return [hashes[uploaded_file.file_id] for uploaded_file in uploaded_files]
+
+def classify_uploads(uploaded_files, image_hashes):
+    # Photos not seen before are decoded and classified together through
+    # predict_food_batch, a chunk at a time so large uploads can report
+    # progress. Photos that fail to decode or could not be classified come
+    # back as (None, 0.0) and are not cached, so a later run retries them.
+    cache = classification_cache()
+    lock = classification_cache_lock()
+    predictor = load_predictor().load()
+    model_id = predictor.model_id
+    
+    # This call's answers are kept locally: other sessions may evict shared
+    # entries at any time, and so may this call's own insert.
+    results = {}
+    with lock:
+        for image_hash in image_hashes:
+            cached = cache.get((model_id, image_hash))
+            if cached is not None:
+                results[image_hash] = cached
+    
+    pending = {}
+    for uploaded_file, image_hash in zip(uploaded_files, image_hashes):
+        if image_hash not in results:
+            pending.setdefault(image_hash, uploaded_file)
+    
+    if pending:
+        items = list(pending.items())
+        classified = {}
+        progress = None
+        if len(items) > ANALYSIS_BATCH_SIZE:
+            progress = st.progress(0.0, text=f"Analyzing {len(items)} photos...")
+        
+        for start in range(0, len(items), ANALYSIS_BATCH_SIZE):
+            chunk = items[start:start + ANALYSIS_BATCH_SIZE]
+            decoded_hashes, images = [], []
+            for image_hash, uploaded_file in chunk:
+                try:
+                    image = Image.open(io.BytesIO(uploaded_file.getvalue()))
+                    image.load()
+                except Exception:
+                    results[image_hash] = (None, 0.0)
+                    continue
+                decoded_hashes.append(image_hash)
+                images.append(image)
+            
+            food_types, confidences = predictor.predict_food_batch(images)
+            for image_hash, food_type, confidence in zip(decoded_hashes, food_types, confidences):
+                results[image_hash] = (food_type, float(confidence))
+                if food_type is not None:
+                    classified[(model_id, image_hash)] = results[image_hash]
+            
+            if progress is not None:
+                done = min(start + ANALYSIS_BATCH_SIZE, len(items))
+                progress.progress(done / len(items), text=f"Analyzed {done} of {len(items)} photos")
+        
+        if progress is not None:
+            progress.empty()
+        with lock:
+            cache.update(classified)
+            while len(cache) > CLASSIFICATION_CACHE_SIZE:
+                cache.pop(next(iter(cache)))
+    
+    return [results[image_hash] for image_hash in image_hashes]
 
 def render_metric_card(icon, label, value, color="#4CAF50"):
     st.markdown(f"""
@@ -245,11 +341,243 @@ def get_suggestion_type(text):
         return "warning"
     elif any(word in text_lower for word in ["good", "excellent", "great", "high fiber"]):
         return "success"
-    elif any(word in text_lower for word in ["consider", "try", "adding"]):
+    elif any(word in text_lower for word in ["consider", "try", "adding", "similar foods"]):
         return "tip"
     return "default"
 
+def current_intake():
+    return {
+        'calories': st.session_state.calories_consumed,
+        'protein': st.session_state.protein_consumed,
+        'carbs': st.session_state.carbs_consumed,
+        'fat': st.session_state.fat_consumed
+    }
+
+@st.fragment
+def render_goal_and_intake():
+    # Changing a goal or intake value reruns only this fragment. When a photo
+    # has been analysed its suggestions depend on these values, so the whole
+    # page is refreshed; the classification itself comes from the cache.
+    st.markdown("### 🎯 Your Goals")
+    
+    dietary_goal = st.selectbox(
+        "Select Dietary Goal",
+        options=list(DIETARY_GOALS.keys()),
+        format_func=lambda x: f"{GOAL_EMOJIS.get(x, '')} {x.replace('_', ' ').title()}",
+        key="dietary_goal"
+    )
+    
+    goal_info = DIETARY_GOALS[dietary_goal]
+    st.markdown(f"""
+        <div class="goal-card">
+            <strong>{GOAL_EMOJIS.get(dietary_goal, '')} {dietary_goal.replace('_', ' ').title()}</strong><br>
+            <small>{goal_info['description']}</small><br>
+            <strong style="color: #2E7D32;">{goal_info['daily_calories']} cal/day</strong>
+        </div>
+    """, unsafe_allow_html=True)
+    
+    st.markdown("---")
+    st.markdown("### 📊 Today's Intake")
+    
+    if 'calories_consumed' not in st.session_state:
+        st.session_state.calories_consumed = 0
+    if 'protein_consumed' not in st.session_state:
+        st.session_state.protein_consumed = 0.0
+    if 'carbs_consumed' not in st.session_state:
+        st.session_state.carbs_consumed = 0.0
+    if 'fat_consumed' not in st.session_state:
+        st.session_state.fat_consumed = 0.0
+    
+    calories_consumed = st.number_input(
+        "🔥 Calories", min_value=0, 
+        value=st.session_state.calories_consumed, step=50,
+        key="cal_input"
+    )
+    protein_consumed = st.number_input(
+        "🥩 Protein (g)", min_value=0.0, 
+        value=st.session_state.protein_consumed, step=5.0,
+        key="prot_input"
+    )
+    carbs_consumed = st.number_input(
+        "🍞 Carbs (g)", min_value=0.0, 
+        value=st.session_state.carbs_consumed, step=5.0,
+        key="carb_input"
+    )
+    fat_consumed = st.number_input(
+        "🧈 Fat (g)", min_value=0.0, 
+        value=st.session_state.fat_consumed, step=5.0,
+        key="fat_input"
+    )
+    
+    st.session_state.calories_consumed = calories_consumed
+    st.session_state.protein_consumed = protein_consumed
+    st.session_state.carbs_consumed = carbs_consumed
+    st.session_state.fat_consumed = fat_consumed
+    
+    current_progress = min(calories_consumed / goal_info['daily_calories'], 1.0)
+    st.markdown("**Daily Progress**")
+    st.progress(current_progress)
+    remaining = max(0, goal_info['daily_calories'] - calories_consumed)
+    st.caption(f"{remaining:.0f} calories remaining")
+    
+    fragment_rerun = st.session_state.get('sidebar_run') == st.session_state.app_run
+    st.session_state.sidebar_run = st.session_state.app_run
+    if fragment_rerun and st.session_state.get('analysed_image') is not None:
+        st.rerun()
+
+def render_single_result(result):
+    food_type = result['food_type']
+    confidence = result['confidence']
+    suggestions = result['suggestions']
+    food_emoji = FOOD_EMOJIS.get(food_type, "🍽️")
+    
+    st.markdown(f"""
+        <div class="food-detected">
+            <div style="font-size: 3rem;">{food_emoji}</div>
+            <p class="food-name">{food_type.title()}</p>
+            <span class="confidence-badge">
+                {confidence:.0%} confidence
+            </span>
+        </div>
+    """, unsafe_allow_html=True)
+    
+    st.markdown("#### 🍽️ Nutritional Breakdown")
+    nutrition = suggestions['nutrition']
+    render_nutrition_metrics(nutrition)
+    
+    st.markdown("#### 💡 Personalized Suggestions")
+    for suggestion in suggestions['suggestions']:
+        suggestion_type = get_suggestion_type(suggestion)
+        render_suggestion(suggestion, suggestion_type)
+    
+    st.markdown("#### 📈 Daily Progress After This Meal")
+    render_daily_progress(suggestions['after_meal']['calories'], suggestions['daily_target'])
+    
+    st.markdown("---")
+    render_intake_buttons(nutrition, "➕ Add to Today's Intake")
+
+def render_nutrition_metrics(nutrition):
+    m1, m2, m3 = st.columns(3)
+    with m1:
+        st.metric("🔥 Calories", f"{nutrition['calories']:.0f}")
+    with m2:
+        st.metric("🥩 Protein", f"{nutrition['protein']:.1f}g")
+    with m3:
+        st.metric("🍞 Carbs", f"{nutrition['carbs']:.1f}g")
+    
+    m4, m5 = st.columns(2)
+    with m4:
+        st.metric("🧈 Fat", f"{nutrition['fat']:.1f}g")
+    with m5:
+        st.metric("🌾 Fiber", f"{nutrition['fiber']:.1f}g")
+
+def render_daily_progress(after_meal_calories, daily_target):
+    st.markdown(f"""
+        <div class="progress-container">
+            <div style="display: flex; justify-content: space-between; margin-bottom: 0.5rem;">
+                <span><strong>Calories</strong></span>
+                <span>{after_meal_calories:.0f} / {daily_target}</span>
+            </div>
+        </div>
+    """, unsafe_allow_html=True)
+    
+    progress = min(after_meal_calories / daily_target, 1.0)
+    st.progress(progress)
+    
+    remaining_calories = daily_target - after_meal_calories
+    if remaining_calories > 0:
+        st.success(f"🎉 You'll have **{remaining_calories:.0f} calories** remaining!")
+    else:
+        st.warning("⚠️ This meal would exceed your daily target")
+
+def add_to_intake(nutrition):
+    st.session_state.calories_consumed += int(nutrition['calories'])
+    st.session_state.protein_consumed += float(nutrition['protein'])
+    st.session_state.carbs_consumed += float(nutrition['carbs'])
+    st.session_state.fat_consumed += float(nutrition['fat'])
+    st.rerun()
+
+def render_intake_buttons(nutrition, add_label):
+    col_a, col_b = st.columns(2)
+    with col_a:
+        if st.button(add_label, use_container_width=True):
+            add_to_intake(nutrition)
+    with col_b:
+        if st.button("🔄 Analyze Another", use_container_width=True):
+            st.rerun()
+
+@st.fragment
+def render_manual_entry():
+    # Typing a search reruns only this fragment; adding the food reruns the
+    # page so the intake sidebar picks it up.
+    st.markdown("### 🔎 Log a Food Manually")
+    query = st.text_input("Search foods", placeholder="e.g. chicken, pizza", key="manual_query")
+    if not query.strip():
+        return
+    
+    predictor = load_predictor()
+    matches = predictor.search_foods(query, MANUAL_SEARCH_LIMIT)
+    if not matches:
+        st.caption(f"No foods match \"{query}\"")
+        return
+    
+    food = st.selectbox("Food", matches, format_func=str.title, key="manual_food")
+    portions = predictor.nutrition.portions(food)
+    # Keyed per food so a new food starts from its standard portion.
+    choice = st.selectbox(
+        "Portion", range(len(portions)),
+        format_func=lambda i: portions[i]['portion'] or "Standard portion",
+        key=f"manual_portion_{food}"
+    )
+    portion = portions[choice]
+    render_nutrition_metrics(portion)
+    if st.button("➕ Add to Today's Intake", key="manual_add", use_container_width=True):
+        add_to_intake(portion)
+
+def render_meal_results(predictor, classifications, dietary_goal, consumed_today):
+    rows = []
+    totals = {'calories': 0.0, 'protein': 0.0, 'carbs': 0.0, 'fat': 0.0, 'fiber': 0.0}
+    unrecognised = 0
+    for i, (food_type, confidence) in enumerate(classifications, 1):
+        nutrition = predictor.get_nutrition_info(food_type) if food_type is not None else None
+        if nutrition is None:
+            unrecognised += 1
+            continue
+        for key in totals:
+            totals[key] += float(nutrition[key])
+        rows.append({
+            "Photo": i,
+            "Food": f"{FOOD_EMOJIS.get(food_type, '🍽️')} {food_type.title()}",
+            "Confidence": f"{confidence:.0%}",
+            "Calories": round(float(nutrition['calories'])),
+            "Protein (g)": round(float(nutrition['protein']), 1),
+            "Carbs (g)": round(float(nutrition['carbs']), 1),
+            "Fat (g)": round(float(nutrition['fat']), 1),
+        })
+    
+    if unrecognised:
+        st.warning(f"⚠️ {unrecognised} photo(s) could not be analyzed and are left out of the totals")
+    if not rows:
+        st.error("❌ Could not classify any of the photos")
+        return
+    
+    st.markdown(f"#### 🍽️ {len(rows)} Items Detected")
+    st.dataframe(rows, hide_index=True, use_container_width=True)
+    
+    st.markdown("#### 🧮 Meal Totals")
+    render_nutrition_metrics(totals)
+    
+    st.markdown("#### 📈 Daily Progress After This Meal")
+    daily_target = DIETARY_GOALS.get(dietary_goal, DIETARY_GOALS['maintenance'])['daily_calories']
+    render_daily_progress(consumed_today['calories'] + totals['calories'], daily_target)
+    
+    st.markdown("---")
+    render_intake_buttons(totals, "➕ Add Meal to Today's Intake")
+
 def main():
+    st.session_state.app_run = st.session_state.get('app_run', 0) + 1
+    # Start loading the models while the page renders and the user picks a photo.
+    load_predictor()
     st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
     
     st.markdown("""
@@ -260,187 +588,73 @@ def main():
     """, unsafe_allow_html=True)
     
     with st.sidebar:
-        st.markdown("### 🎯 Your Goals")
-        
-        dietary_goal = st.selectbox(
-            "Select Dietary Goal",
-            options=list(DIETARY_GOALS.keys()),
-            format_func=lambda x: f"{GOAL_EMOJIS.get(x, '')} {x.replace('_', ' ').title()}"
-        )
-        
-        goal_info = DIETARY_GOALS[dietary_goal]
-        st.markdown(f"""
-            <div class="goal-card">
-                <strong>{GOAL_EMOJIS.get(dietary_goal, '')} {dietary_goal.replace('_', ' ').title()}</strong><br>
-                <small>{goal_info['description']}</small><br>
-                <strong style="color: #2E7D32;">{goal_info['daily_calories']} cal/day</strong>
-            </div>
-        """, unsafe_allow_html=True)
-        
-        st.markdown("---")
-        st.markdown("### 📊 Today's Intake")
-        
-        if 'calories_consumed' not in st.session_state:
-            st.session_state.calories_consumed = 0
-        if 'protein_consumed' not in st.session_state:
-            st.session_state.protein_consumed = 0.0
-        if 'carbs_consumed' not in st.session_state:
-            st.session_state.carbs_consumed = 0.0
-        if 'fat_consumed' not in st.session_state:
-            st.session_state.fat_consumed = 0.0
-        
-        calories_consumed = st.number_input(
-            "🔥 Calories", min_value=0, 
-            value=st.session_state.calories_consumed, step=50,
-            key="cal_input"
-        )
-        protein_consumed = st.number_input(
-            "🥩 Protein (g)", min_value=0.0, 
-            value=st.session_state.protein_consumed, step=5.0,
-            key="prot_input"
-        )
-        carbs_consumed = st.number_input(
-            "🍞 Carbs (g)", min_value=0.0, 
-            value=st.session_state.carbs_consumed, step=5.0,
-            key="carb_input"
-        )
-        fat_consumed = st.number_input(
-            "🧈 Fat (g)", min_value=0.0, 
-            value=st.session_state.fat_consumed, step=5.0,
-            key="fat_input"
-        )
-        
-        st.session_state.calories_consumed = calories_consumed
-        st.session_state.protein_consumed = protein_consumed
-        st.session_state.carbs_consumed = carbs_consumed
-        st.session_state.fat_consumed = fat_consumed
-        
-        consumed_today = {
-            'calories': calories_consumed,
-            'protein': protein_consumed,
-            'carbs': carbs_consumed,
-            'fat': fat_consumed
-        }
-        
-        current_progress = min(calories_consumed / goal_info['daily_calories'], 1.0)
-        st.markdown("**Daily Progress**")
-        st.progress(current_progress)
-        remaining = max(0, goal_info['daily_calories'] - calories_consumed)
-        st.caption(f"{remaining:.0f} calories remaining")
+        render_goal_and_intake()
+    
+    dietary_goal = st.session_state.dietary_goal
+    consumed_today = current_intake()
     
     col1, col2 = st.columns([1, 1], gap="large")
     
     with col1:
-        st.markdown("### 📸 Upload Food Image")
+        st.markdown("### 📸 Upload Food Images")
         
-        uploaded_file = st.file_uploader(
+        uploaded_files = st.file_uploader(
             "Drag and drop or click to upload",
             type=['jpg', 'jpeg', 'png', 'bmp'],
-            help="Supported formats: JPG, JPEG, PNG, BMP"
+            accept_multiple_files=True,
+            help="Supported formats: JPG, JPEG, PNG, BMP. Upload several photos to analyze a whole meal."
         )
         
-        if uploaded_file is not None:
-            image = Image.open(uploaded_file)
-            st.image(image, caption="", use_container_width=True)
+        if len(uploaded_files) == 1:
+            st.image(uploaded_files[0].getvalue(), caption="", use_container_width=True)
+        elif uploaded_files:
+            thumbnails = st.columns(3)
+            for i, uploaded_file in enumerate(uploaded_files):
+                with thumbnails[i % 3]:
+                    try:
+                        st.image(uploaded_file.getvalue(), caption=f"Photo {i + 1}", use_container_width=True)
+                    except Exception:
+                        st.caption(f"Photo {i + 1}: not a readable image")
         else:
             st.markdown("""
                 <div class="upload-section">
                     <div style="font-size: 4rem; margin-bottom: 1rem;">📷</div>
-                    <h4 style="color: #2E7D32; margin: 0;">Drop your food photo here</h4>
+                    <h4 style="color: #2E7D32; margin: 0;">Drop your food photos here</h4>
                     <p style="color: #666; margin: 0.5rem 0;">or click to browse files</p>
                 </div>
             """, unsafe_allow_html=True)
+        
+        st.markdown("---")
+        render_manual_entry()
     
     with col2:
         st.markdown("### 📊 Analysis Results")
         
-        if uploaded_file is not None:
+        st.session_state.analysed_image = None
+        if uploaded_files:
             with st.spinner("🔍 Analyzing your food..."):
                 try:
-                    predictor = load_predictor()
-                    result = predictor.predict(image, dietary_goal, consumed_today)
+                    image_hashes = uploaded_image_hashes(uploaded_files)
+                    classifications = classify_uploads(uploaded_files, image_hashes)
+                    st.session_state.analysed_image = tuple(image_hashes)
                     
-                    if result['success']:
-                        food_type = result['food_type']
-                        confidence = result['confidence']
-                        suggestions = result['suggestions']
-                        food_emoji = FOOD_EMOJIS.get(food_type, "🍽️")
-                        
-                        st.markdown(f"""
-                            <div class="food-detected">
-                                <div style="font-size: 3rem;">{food_emoji}</div>
-                                <p class="food-name">{food_type.title()}</p>
-                                <span class="confidence-badge">
-                                    {confidence:.0%} confidence
-                                </span>
-                            </div>
-                        """, unsafe_allow_html=True)
-                        
-                        st.markdown("#### 🍽️ Nutritional Breakdown")
-                        nutrition = suggestions['nutrition']
-                        
-                        m1, m2, m3 = st.columns(3)
-                        with m1:
-                            st.metric("🔥 Calories", f"{nutrition['calories']:.0f}")
-                        with m2:
-                            st.metric("🥩 Protein", f"{nutrition['protein']:.1f}g")
-                        with m3:
-                            st.metric("🍞 Carbs", f"{nutrition['carbs']:.1f}g")
-                        
-                        m4, m5 = st.columns(2)
-                        with m4:
-                            st.metric("🧈 Fat", f"{nutrition['fat']:.1f}g")
-                        with m5:
-                            st.metric("🌾 Fiber", f"{nutrition['fiber']:.1f}g")
-                        
-                        st.markdown("#### 💡 Personalized Suggestions")
-                        for suggestion in suggestions['suggestions']:
-                            suggestion_type = get_suggestion_type(suggestion)
-                            render_suggestion(suggestion, suggestion_type)
-                        
-                        st.markdown("#### 📈 Daily Progress After This Meal")
-                        after_meal = suggestions['after_meal']
-                        remaining_cal = suggestions['remaining']
-                        daily_target = suggestions['daily_target']
-                        
-                        st.markdown(f"""
-                            <div class="progress-container">
-                                <div style="display: flex; justify-content: space-between; margin-bottom: 0.5rem;">
-                                    <span><strong>Calories</strong></span>
-                                    <span>{after_meal['calories']:.0f} / {daily_target}</span>
-                                </div>
-                            </div>
-                        """, unsafe_allow_html=True)
-                        
-                        progress = min(after_meal['calories'] / daily_target, 1.0)
-                        st.progress(progress)
-                        
-                        if remaining_cal['calories'] > 0:
-                            st.success(f"🎉 You'll have **{remaining_cal['calories']:.0f} calories** remaining!")
+                    # Only this step depends on the goal and intake inputs.
+                    predictor = load_predictor()
+                    if len(uploaded_files) == 1:
+                        food_type, confidence = classifications[0]
+                        result = predictor.result_for_food(food_type, confidence, dietary_goal, consumed_today)
+                        if result['success']:
+                            render_single_result(result)
                         else:
-                            st.warning("⚠️ This meal would exceed your daily target")
-                        
-                        st.markdown("---")
-                        col_a, col_b = st.columns(2)
-                        with col_a:
-                            if st.button("➕ Add to Today's Intake", use_container_width=True):
-                                st.session_state.calories_consumed += int(nutrition['calories'])
-                                st.session_state.protein_consumed += nutrition['protein']
-                                st.session_state.carbs_consumed += nutrition['carbs']
-                                st.session_state.fat_consumed += nutrition['fat']
-                                st.rerun()
-                        with col_b:
-                            if st.button("🔄 Analyze Another", use_container_width=True):
-                                st.rerun()
-                    
+                            st.error(f"❌ {result.get('error', 'Analysis failed')}")
                     else:
-                        st.error(f"❌ {result.get('error', 'Analysis failed')}")
+                        render_meal_results(predictor, classifications, dietary_goal, consumed_today)
                 
                 except Exception as e:
                     st.error(f"❌ Error analyzing image: {str(e)}")
                     st.info("💡 Make sure the models are trained properly.")
         else:
-            st.info("👆 Upload a food image to get started!")
+            st.info("👆 Upload a food image, or several for a whole meal, to get started!")
             
             st.markdown("#### 🍽️ Supported Foods")
             st.markdown('<div style="text-align: center;">', unsafe_allow_html=True)
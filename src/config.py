@@ -1,10 +1,17 @@
 import os
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-DATA_DIR = os.path.join(BASE_DIR, "data")
+# Overridable so benchmarks and tools can run against a scratch directory.
+DATA_DIR = os.environ.get("NUTRITION_DATA_DIR", os.path.join(BASE_DIR, "data"))
 RAW_DATA_DIR = os.path.join(DATA_DIR, "raw")
 PROCESSED_DATA_DIR = os.path.join(DATA_DIR, "processed")
-MODELS_DIR = os.path.join(BASE_DIR, "models")
+MODELS_DIR = os.environ.get("NUTRITION_MODELS_DIR", os.path.join(BASE_DIR, "models"))
+MODEL_BUNDLE_DIR = os.path.join(MODELS_DIR, "bundle")
+FEATURE_STORE_DIR = os.path.join(PROCESSED_DATA_DIR, "feature_store")
+PACKED_DATA_DIR = os.path.join(PROCESSED_DATA_DIR, "packed")
+# SQLite nutrition catalogue (see data/nutrition_store.py); created from
+# NUTRITION_DATA the first time it is opened.
+NUTRITION_DB_PATH = os.path.join(PROCESSED_DATA_DIR, "nutrition.db")
 
 FOOD_CATEGORIES = [
     "apple", "banana", "burger", "pizza", "salad",
@@ -14,6 +21,16 @@ FOOD_CATEGORIES = [
 
 IMAGE_SIZE = (128, 128)
 
+HOG_ORIENTATIONS = 9
+HOG_PIXELS_PER_CELL = (16, 16)
+HOG_CELLS_PER_BLOCK = (2, 2)
+HOG_BLOCK_NORM = "L2-Hys"
+COLOR_HIST_BINS = 32
+
+PRECISION = "float64"
+
+# The built-in foods the classifier is trained on. Serving reads nutrition
+# from the NutritionStore, which starts out as a copy of this.
 NUTRITION_DATA = {
     "apple": {"calories": 95, "protein": 0.5, "carbs": 25, "fat": 0.3, "fiber": 4.4},
     "banana": {"calories": 105, "protein": 1.3, "carbs": 27, "fat": 0.4, "fiber": 3.1},
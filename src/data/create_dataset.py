@@ -1,86 +1,114 @@
 import os
 import sys
+import zlib
+from functools import lru_cache
 import numpy as np
 from PIL import Image
 import pandas as pd
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config import FOOD_CATEGORIES, NUTRITION_DATA, RAW_DATA_DIR, PROCESSED_DATA_DIR, IMAGE_SIZE
+from config import FOOD_CATEGORIES, NUTRITION_DATA, RAW_DATA_DIR, PROCESSED_DATA_DIR, PACKED_DATA_DIR, IMAGE_SIZE
+from data.packed_dataset import PackedDatasetWriter
 
-def generate_synthetic_food_image(food_type, seed):
-    np.random.seed(seed)
-    
-    color_map = {
-        "apple": (200, 50, 50),
-        "banana": (255, 230, 50),
-        "burger": (150, 100, 60),
-        "pizza": (220, 160, 80),
-        "salad": (80, 180, 80),
-        "sandwich": (200, 180, 140),
-        "pasta": (240, 220, 180),
-        "rice": (250, 250, 240),
-        "chicken": (210, 170, 120),
-        "fish": (180, 200, 210),
-        "bread": (210, 180, 140),
-        "egg": (255, 240, 200),
-        "soup": (180, 100, 80),
-        "steak": (130, 80, 70),
-        "sushi": (220, 200, 180)
-    }
-    
-    base_color = np.array(color_map.get(food_type, (128, 128, 128)))
-    
-    img = np.zeros((IMAGE_SIZE[0], IMAGE_SIZE[1], 3), dtype=np.uint8)
-    
-    noise = np.random.randint(-30, 30, (IMAGE_SIZE[0], IMAGE_SIZE[1], 3))
-    
-    for i in range(3):
-        channel = np.full((IMAGE_SIZE[0], IMAGE_SIZE[1]), base_color[i], dtype=np.int32)
-        channel = channel + noise[:, :, i]
-        channel = np.clip(channel, 0, 255)
-        img[:, :, i] = channel.astype(np.uint8)
+COLOR_MAP = {
+    "apple": (200, 50, 50),
+    "banana": (255, 230, 50),
+    "burger": (150, 100, 60),
+    "pizza": (220, 160, 80),
+    "salad": (80, 180, 80),
+    "sandwich": (200, 180, 140),
+    "pasta": (240, 220, 180),
+    "rice": (250, 250, 240),
+    "chicken": (210, 170, 120),
+    "fish": (180, 200, 210),
+    "bread": (210, 180, 140),
+    "egg": (255, 240, 200),
+    "soup": (180, 100, 80),
+    "steak": (130, 80, 70),
+    "sushi": (220, 200, 180)
+}
+
+GENERATION_BATCH_SIZE = 256
+
+@lru_cache(maxsize=None)
+def _center_mask(height, width):
+    center_x, center_y = height // 2, width // 2
+    rows, cols = np.ogrid[:height, :width]
+    dist = np.sqrt((rows - center_x) ** 2 + (cols - center_y) ** 2)
+    return dist < height // 3
+
+def batch_seed(food_type, seed, start):
+    # zlib.crc32 is stable across processes, unlike hash() which depends on
+    # PYTHONHASHSEED.
+    return np.random.SeedSequence([seed, zlib.crc32(food_type.encode("utf-8")), start])
+
+def generate_synthetic_food_images(food_type, n, rng):
+    height, width = IMAGE_SIZE[0], IMAGE_SIZE[1]
+    base_color = np.array(COLOR_MAP.get(food_type, (128, 128, 128)), dtype=np.int16)
     
-    center_x, center_y = IMAGE_SIZE[0] // 2, IMAGE_SIZE[1] // 2
-    for i in range(IMAGE_SIZE[0]):
-        for j in range(IMAGE_SIZE[1]):
-            dist = np.sqrt((i - center_x) ** 2 + (j - center_y) ** 2)
-            if dist < IMAGE_SIZE[0] // 3:
-                img[i, j] = np.clip(img[i, j].astype(np.int32) + 20, 0, 255).astype(np.uint8)
+    noise = rng.integers(-30, 30, (n, height, width, 3), dtype=np.int16)
+    img = np.clip(base_color + noise, 0, 255)
     
-    texture = np.random.randint(-15, 15, (IMAGE_SIZE[0], IMAGE_SIZE[1], 3))
-    img = np.clip(img.astype(np.int32) + texture, 0, 255).astype(np.uint8)
+    img[:, _center_mask(height, width)] += 20
+    np.minimum(img, 255, out=img)
     
+    img += rng.integers(-15, 15, (n, height, width, 3), dtype=np.int16)
+    return np.clip(img, 0, 255).astype(np.uint8)
+
+def generate_synthetic_food_image(food_type, seed):
+    rng = np.random.default_rng(seed)
+    img = generate_synthetic_food_images(food_type, 1, rng)[0]
     return Image.fromarray(img, 'RGB')
 
-def create_dataset(samples_per_class=50):
+def create_dataset(samples_per_class=50, seed=0, packed=False):
     os.makedirs(RAW_DATA_DIR, exist_ok=True)
     os.makedirs(PROCESSED_DATA_DIR, exist_ok=True)
     
     dataset_info = []
+    writer = PackedDatasetWriter(PACKED_DATA_DIR) if packed else None
     
     for food_type in FOOD_CATEGORIES:
         food_dir = os.path.join(RAW_DATA_DIR, food_type)
-        os.makedirs(food_dir, exist_ok=True)
+        if not packed:
+            os.makedirs(food_dir, exist_ok=True)
         
-        for i in range(samples_per_class):
-            seed = hash(f"{food_type}_{i}") % (2**32)
-            img = generate_synthetic_food_image(food_type, seed)
-            
-            img_path = os.path.join(food_dir, f"{food_type}_{i:03d}.png")
-            img.save(img_path)
+        nutrition = NUTRITION_DATA[food_type]
+        
+        for start in range(0, samples_per_class, GENERATION_BATCH_SIZE):
+            count = min(GENERATION_BATCH_SIZE, samples_per_class - start)
+            rng = np.random.default_rng(batch_seed(food_type, seed, start))
+            images = generate_synthetic_food_images(food_type, count, rng)
+            variations = rng.uniform(0.85, 1.15, size=count)
             
-            nutrition = NUTRITION_DATA[food_type]
-            variation = np.random.uniform(0.85, 1.15)
+            batch_info = []
+            for offset in range(count):
+                variation = variations[offset]
+                record = {
+                    "food_type": food_type,
+                    "calories": nutrition["calories"] * variation,
+                    "protein": nutrition["protein"] * variation,
+                    "carbs": nutrition["carbs"] * variation,
+                    "fat": nutrition["fat"] * variation,
+                    "fiber": nutrition["fiber"] * variation
+                }
+                
+                if not packed:
+                    img_path = os.path.join(food_dir, f"{food_type}_{start + offset:03d}.png")
+                    Image.fromarray(images[offset], 'RGB').save(img_path)
+                    record = dict(image_path=img_path, **record)
+                
+                batch_info.append(record)
             
-            dataset_info.append({
-                "image_path": img_path,
-                "food_type": food_type,
-                "calories": nutrition["calories"] * variation,
-                "protein": nutrition["protein"] * variation,
-                "carbs": nutrition["carbs"] * variation,
-                "fat": nutrition["fat"] * variation,
-                "fiber": nutrition["fiber"] * variation
-            })
+            if packed:
+                writer.add(images, batch_info)
+            dataset_info.extend(batch_info)
+    
+    if packed:
+        writer.close()
+        df = pd.DataFrame(writer.records)
+        print(f"Created {len(df)} images across {len(FOOD_CATEGORIES)} categories")
+        print(f"Packed dataset saved to {PACKED_DATA_DIR} ({writer.n_shards} shards)")
+        return df
     
     df = pd.DataFrame(dataset_info)
     csv_path = os.path.join(PROCESSED_DATA_DIR, "nutrition_dataset.csv")
@@ -0,0 +1,148 @@
+import os
+import sys
+import json
+import glob
+import hashlib
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import FEATURE_STORE_DIR
+
+def params_fingerprint(params):
+    encoded = json.dumps(params, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+class FeatureStore:
+    # Features are keyed by image content hash and grouped in one directory
+    # per feature-extraction fingerprint, so changing IMAGE_SIZE, HOG or
+    # histogram settings starts a fresh store instead of serving stale rows.
+    # Each shard is a pair of .npy files: the feature rows (memory-mapped on
+    # open) and the content keys for those rows. Keys are written last, so a
+    # shard interrupted mid-write is never indexed.
+    
+    def __init__(self, root=FEATURE_STORE_DIR, params=None):
+        if params is None:
+            from data.preprocess import feature_params
+            params = feature_params()
+        
+        self.params = params
+        self.directory = os.path.join(root, params_fingerprint(params))
+        self._index = {}
+        self._shards = []
+        
+        os.makedirs(self.directory, exist_ok=True)
+        params_path = os.path.join(self.directory, "params.json")
+        if not os.path.exists(params_path):
+            with open(params_path, "w") as f:
+                json.dump(params, f, indent=2, sort_keys=True)
+        
+        self._load_shards()
+    
+    def _load_shards(self):
+        for keys_path in sorted(glob.glob(os.path.join(self.directory, "shard_*.keys.npy"))):
+            features_path = keys_path.replace(".keys.npy", ".npy")
+            if not os.path.exists(features_path):
+                continue
+            
+            keys = np.load(keys_path)
+            features = np.load(features_path, mmap_mode="r")
+            shard_id = len(self._shards)
+            self._shards.append(features)
+            for row, key in enumerate(keys):
+                self._index[str(key)] = (shard_id, row)
+    
+    def __len__(self):
+        return len(self._index)
+    
+    def __contains__(self, key):
+        return key in self._index
+    
+    @staticmethod
+    def content_key(path):
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+    
+    @staticmethod
+    def array_key(array):
+        digest = hashlib.blake2b(np.ascontiguousarray(array).data, digest_size=16)
+        return digest.hexdigest()
+    
+    def get(self, key):
+        location = self._index.get(key)
+        if location is None:
+            return None
+        shard_id, row = location
+        return self._shards[shard_id][row]
+    
+    def gather(self, keys, out):
+        hits = np.zeros(len(keys), dtype=bool)
+        for i, key in enumerate(keys):
+            location = self._index.get(key)
+            if location is not None:
+                shard_id, row = location
+                out[i] = self._shards[shard_id][row]
+                hits[i] = True
+        return hits
+    
+    def _next_shard_name(self):
+        existing = glob.glob(os.path.join(self.directory, "shard_*.keys.npy"))
+        numbers = [int(os.path.basename(path)[6:12]) for path in existing]
+        return f"shard_{max(numbers, default=-1) + 1:06d}"
+    
+    def _write_shard(self, name, keys, features):
+        features_path = os.path.join(self.directory, f"{name}.npy")
+        keys_path = os.path.join(self.directory, f"{name}.keys.npy")
+        
+        tmp_path = features_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.ascontiguousarray(features))
+        os.replace(tmp_path, features_path)
+        
+        tmp_path = keys_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.array(keys, dtype="U32"))
+        os.replace(tmp_path, keys_path)
+        
+        return features_path
+    
+    def add(self, keys, features):
+        new_rows = [i for i, key in enumerate(keys) if key not in self._index]
+        if not new_rows:
+            return 0
+        
+        # Drop duplicate content within the batch, keeping the first row.
+        seen = {}
+        for i in new_rows:
+            seen.setdefault(keys[i], i)
+        rows = list(seen.values())
+        
+        features_path = self._write_shard(
+            self._next_shard_name(), [keys[i] for i in rows], np.asarray(features)[rows]
+        )
+        
+        shard_id = len(self._shards)
+        self._shards.append(np.load(features_path, mmap_mode="r"))
+        for row, i in enumerate(rows):
+            self._index[keys[i]] = (shard_id, row)
+        return len(rows)
+    
+    def compact(self):
+        if len(self._shards) <= 1:
+            return
+        
+        keys = list(self._index)
+        features = np.empty((len(keys), self._shards[0].shape[1]), dtype=self._shards[0].dtype)
+        self.gather(keys, features)
+        
+        old_paths = glob.glob(os.path.join(self.directory, "shard_*.npy"))
+        name = self._next_shard_name()
+        self._write_shard(name, keys, features)
+        
+        self._shards = []
+        self._index = {}
+        for path in old_paths:
+            os.remove(path)
+        self._load_shards()
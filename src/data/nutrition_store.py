@@ -0,0 +1,297 @@
+import os
+import sys
+import csv
+import bisect
+import sqlite3
+import difflib
+import argparse
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import NUTRITION_DATA, NUTRITION_DB_PATH
+
+NUTRIENT_FIELDS = ('calories', 'protein', 'carbs', 'fat', 'fiber')
+SCHEMA_VERSION = 1
+DEFAULT_CACHE_SIZE = 4096
+# Fuzzy search ranks at most this many trigram candidates with difflib.
+FUZZY_CANDIDATES = 20
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS foods (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    portion TEXT NOT NULL DEFAULT '',
+    {', '.join(f'{field} REAL NOT NULL' for field in NUTRIENT_FIELDS)},
+    UNIQUE (name, portion)
+);
+PRAGMA user_version = {SCHEMA_VERSION};
+"""
+
+def normalise(name):
+    return " ".join(str(name).lower().split())
+
+def seed_foods():
+    # The built-in catalogue, one standard portion per food.
+    for name, nutrition in NUTRITION_DATA.items():
+        yield {'name': name, 'portion': '', **nutrition}
+
+def read_catalogue(csv_path):
+    # CSV with name and the nutrient columns; portion is optional and empty
+    # for a food's standard portion.
+    with open(csv_path, newline='') as f:
+        for row in csv.DictReader(f):
+            yield {'name': row['name'].strip(), 'portion': (row.get('portion') or '').strip(),
+                   **{field: float(row[field] or 0) for field in NUTRIENT_FIELDS}}
+
+def _write(conn, foods, replace=False):
+    columns = ('name', 'portion') + NUTRIENT_FIELDS
+    with conn:
+        conn.executescript(SCHEMA)
+        if replace:
+            conn.execute("DELETE FROM foods")
+        conn.executemany(
+            f"INSERT INTO foods ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+            f"ON CONFLICT (name, portion) DO UPDATE SET "
+            f"{', '.join(f'{field} = excluded.{field}' for field in NUTRIENT_FIELDS)}",
+            ((food['name'], food.get('portion', ''), *(food[field] for field in NUTRIENT_FIELDS)) for food in foods)
+        )
+
+def write_foods(path, foods, replace=False):
+    # Inserts foods, updating the nutrients of (name, portion) pairs that
+    # are already there. replace=True empties the table first.
+    conn = sqlite3.connect(path)
+    try:
+        _write(conn, foods, replace)
+    finally:
+        conn.close()
+
+def build_store(path=NUTRITION_DB_PATH, foods=None):
+    # Written beside the target and renamed into place, so open stores keep
+    # reading the old file and new ones see a complete database.
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    write_foods(tmp_path, seed_foods() if foods is None else foods)
+    os.replace(tmp_path, path)
+
+def _trigrams(key):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class NutritionStore(Mapping):
+    # Nutrition per food and portion, kept in SQLite. The names, portions
+    # and ids of every row are indexed in memory when the store opens; the
+    # nutrient rows are read on demand and the hot ones kept in a bounded
+    # LRU. As a Mapping, store[name] is the standard portion of that food,
+    # so code written against NUTRITION_DATA reads it unchanged.
+    #
+    # Opening never writes: without a database file the store serves the
+    # built-in foods from an in-memory database. "nutrition_store.py build"
+    # (or train_models.py) creates the file.
+    
+    def __init__(self, path=NUTRITION_DB_PATH, cache_size=DEFAULT_CACHE_SIZE):
+        self.in_memory = not os.path.exists(path)
+        if self.in_memory:
+            print(f"No nutrition database at {path}; using the built-in foods. "
+                  f"Run 'python src/data/nutrition_store.py build' to create it.")
+        self.path = path
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._conn_pid = None
+        self._trigram_index = None
+        self._trigram_counts = None
+        self._load_index()
+    
+    def _connection(self):
+        # One connection per process: a forked worker opens its own rather
+        # than sharing the parent's file handle.
+        if self._conn_pid != os.getpid():
+            if self.in_memory:
+                self._conn = sqlite3.connect(":memory:", check_same_thread=False)
+                _write(self._conn, seed_foods())
+            else:
+                self._conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            self._conn_pid = os.getpid()
+        return self._conn
+    
+    def _load_index(self):
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT id, name, portion FROM foods ORDER BY portion != '', id"
+            ).fetchall()
+        
+        self.n_portions = len(rows)
+        self._ids = {}
+        self._display = {}
+        for food_id, name, portion in rows:
+            key = normalise(name)
+            self._ids.setdefault(key, []).append(food_id)
+            self._display.setdefault(key, name)
+        
+        # Prefix search bisects two sorted lists: whole names, and the
+        # later words of multi-word names, so "bre" finds "chicken breast".
+        self._keys = sorted(self._ids)
+        suffixes = []
+        for key in self._keys:
+            start = key.find(" ")
+            while start != -1:
+                suffixes.append((key[start + 1:], key))
+                start = key.find(" ", start + 1)
+        suffixes.sort()
+        self._suffixes = [suffix for suffix, _ in suffixes]
+        self._suffix_keys = [key for _, key in suffixes]
+    
+    def __getitem__(self, name):
+        return self.get_by_id(self._ids[normalise(name)][0])
+    
+    def __contains__(self, name):
+        return normalise(name) in self._ids
+    
+    def __iter__(self):
+        return (self._display[key] for key in self._keys)
+    
+    def __len__(self):
+        return len(self._keys)
+    
+    def get_by_id(self, food_id):
+        with self._lock:
+            row = self._cache.get(food_id)
+            if row is not None:
+                self._cache.move_to_end(food_id)
+                self.hits += 1
+                return dict(row)
+            
+            self.misses += 1
+            values = self._connection().execute(
+                f"SELECT id, name, portion, {', '.join(NUTRIENT_FIELDS)} FROM foods WHERE id = ?", (food_id,)
+            ).fetchone()
+            if values is None:
+                raise KeyError(food_id)
+            row = dict(zip(('id', 'name', 'portion') + NUTRIENT_FIELDS, values))
+            self._cache[food_id] = row
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            return dict(row)
+    
+    def portions(self, name):
+        # Every portion of a food, the standard one first.
+        return [self.get_by_id(food_id) for food_id in self._ids.get(normalise(name), [])]
+    
+    def standard_portions(self):
+        # Names and an (n, len(NUTRIENT_FIELDS)) array of every food's
+        # standard portion, read in one query rather than row by row.
+        with self._lock:
+            rows = self._connection().execute(
+                f"SELECT id, {', '.join(NUTRIENT_FIELDS)} FROM foods"
+            ).fetchall()
+        by_id = {row[0]: row[1:] for row in rows}
+        ids = [self._ids[key][0] for key in self._keys]
+        values = np.array([by_id[food_id] for food_id in ids], dtype=np.float64)
+        return list(self), values.reshape(-1, len(NUTRIENT_FIELDS))
+    
+    def prefix_search(self, prefix, limit=10):
+        # Names starting with prefix, then names with a later word starting
+        # with it, each in alphabetical order.
+        prefix = normalise(prefix)
+        if not prefix:
+            return []
+        found = []
+        for keys, targets in ((self._keys, self._keys), (self._suffixes, self._suffix_keys)):
+            i = bisect.bisect_left(keys, prefix)
+            while i < len(keys) and len(found) < limit and keys[i].startswith(prefix):
+                if targets[i] not in found:
+                    found.append(targets[i])
+                i += 1
+        return [self._display[key] for key in found]
+    
+    def fuzzy_search(self, query, limit=10, cutoff=0.6):
+        # The names with the highest trigram overlap (Dice coefficient) are
+        # candidates; difflib ranks those, so misspellings such as "chiken"
+        # still match without comparing the query against every name.
+        query = normalise(query)
+        if not query:
+            return []
+        if self._trigram_index is None:
+            # Built on first use: trigram -> positions in _keys of the names
+            # containing it.
+            index = {}
+            for position, key in enumerate(self._keys):
+                for trigram in _trigrams(key):
+                    index.setdefault(trigram, []).append(position)
+            self._trigram_counts = np.array([len(_trigrams(key)) for key in self._keys])
+            self._trigram_index = {trigram: np.array(positions, dtype=np.int32)
+                                   for trigram, positions in index.items()}
+        
+        trigrams = _trigrams(query)
+        postings = [self._trigram_index[t] for t in trigrams if t in self._trigram_index]
+        if not postings:
+            return []
+        shared = np.bincount(np.concatenate(postings), minlength=len(self._keys))
+        candidates = np.flatnonzero(shared)
+        if len(candidates) > FUZZY_CANDIDATES:
+            dice = shared[candidates] / (len(trigrams) + self._trigram_counts[candidates])
+            candidates = candidates[np.argpartition(-dice, FUZZY_CANDIDATES)[:FUZZY_CANDIDATES]]
+        scored = []
+        for position in candidates:
+            key = self._keys[position]
+            ratio = difflib.SequenceMatcher(None, query, key).ratio()
+            if ratio >= cutoff:
+                scored.append((-ratio, key))
+        return [self._display[key] for _, key in sorted(scored)[:limit]]
+    
+    def search(self, query, limit=10):
+        # Prefix matches, topped up with fuzzy ones for manual food entry.
+        found = self.prefix_search(query, limit)
+        if len(found) < limit:
+            found += [name for name in self.fuzzy_search(query, limit) if name not in found][:limit - len(found)]
+        return found
+    
+    def cache_info(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._cache), 'max_size': self.cache_size}
+    
+    def close(self):
+        if self._conn is not None and self._conn_pid == os.getpid():
+            self._conn.close()
+        self._conn = None
+        self._conn_pid = None
+
+def main():
+    parser = argparse.ArgumentParser(description="Build, extend or search the nutrition database")
+    parser.add_argument("command", choices=["build", "import", "search", "info"])
+    parser.add_argument("argument", nargs="?", help="Catalogue CSV (import) or query (search)")
+    parser.add_argument("--path", default=NUTRITION_DB_PATH)
+    parser.add_argument("--replace", action="store_true", help="Replace the whole catalogue (import only)")
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+    
+    if args.command in ("import", "search") and not args.argument:
+        parser.error(f"{args.command} needs an argument")
+    
+    if args.command == "build":
+        build_store(args.path)
+        print(f"Wrote {len(NUTRITION_DATA)} foods to {args.path}")
+    elif args.command == "import":
+        if not os.path.exists(args.path):
+            build_store(args.path)
+        write_foods(args.path, read_catalogue(args.argument), replace=args.replace)
+        print(f"Imported {args.argument} into {args.path}")
+    elif args.command == "search":
+        store = NutritionStore(args.path)
+        for name in store.search(args.argument, args.limit):
+            for row in store.portions(name):
+                portion = f" ({row['portion']})" if row['portion'] else ""
+                print(f"{row['name']}{portion}: " + ", ".join(f"{field} {row[field]:g}" for field in NUTRIENT_FIELDS))
+    else:
+        store = NutritionStore(args.path)
+        print(f"{args.path}: {len(store)} foods, {store.n_portions} portions")
+
+if __name__ == "__main__":
+    main()
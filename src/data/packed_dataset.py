@@ -0,0 +1,158 @@
+import os
+import sys
+import json
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import PACKED_DATA_DIR, IMAGE_SIZE
+
+SHARD_SIZE = 1024
+INDEX_FILE = "index.csv"
+META_FILE = "meta.json"
+
+def _shard_name(shard_id):
+    return f"images_{shard_id:05d}.npy"
+
+class PackedDatasetWriter:
+    # Images are buffered into a fixed-size uint8 array and flushed as one
+    # .npy shard per SHARD_SIZE samples. The index CSV holds the labels and
+    # nutrition columns plus the (shard, row) of every image.
+    
+    def __init__(self, directory=PACKED_DATA_DIR, shard_size=SHARD_SIZE):
+        self.directory = directory
+        self.shard_size = shard_size
+        self.image_shape = (IMAGE_SIZE[0], IMAGE_SIZE[1], 3)
+        self.records = []
+        self.n_shards = 0
+        self._buffer = np.empty((shard_size,) + self.image_shape, dtype=np.uint8)
+        self._buffered = 0
+        
+        os.makedirs(directory, exist_ok=True)
+        for name in os.listdir(directory):
+            if name.startswith("images_") or name in (INDEX_FILE, META_FILE):
+                os.remove(os.path.join(directory, name))
+    
+    def _flush(self):
+        if self._buffered == 0:
+            return
+        path = os.path.join(self.directory, _shard_name(self.n_shards))
+        np.save(path, self._buffer[:self._buffered])
+        self.n_shards += 1
+        self._buffered = 0
+    
+    def add(self, images, records):
+        for image, record in zip(images, records):
+            if image.shape != self.image_shape or image.dtype != np.uint8:
+                raise ValueError(f"Expected uint8 image of shape {self.image_shape}, got {image.dtype} {image.shape}")
+            
+            self._buffer[self._buffered] = image
+            self.records.append(dict(record, shard=self.n_shards, row=self._buffered))
+            self._buffered += 1
+            if self._buffered == self.shard_size:
+                self._flush()
+    
+    def close(self):
+        self._flush()
+        pd.DataFrame(self.records).to_csv(os.path.join(self.directory, INDEX_FILE), index=False)
+        with open(os.path.join(self.directory, META_FILE), "w") as f:
+            json.dump({
+                "image_shape": list(self.image_shape),
+                "dtype": "uint8",
+                "shard_size": self.shard_size,
+                "n_shards": self.n_shards,
+                "n_images": len(self.records),
+            }, f, indent=2)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+
+class PackedDataset:
+    def __init__(self, directory=PACKED_DATA_DIR):
+        self.directory = directory
+        with open(os.path.join(directory, META_FILE)) as f:
+            self.meta = json.load(f)
+        
+        self.records = pd.read_csv(os.path.join(directory, INDEX_FILE))
+        self._shard_ids = self.records['shard'].to_numpy()
+        self._rows = self.records['row'].to_numpy()
+        self._shards = [
+            np.load(os.path.join(directory, _shard_name(shard_id)), mmap_mode="r")
+            for shard_id in range(self.meta["n_shards"])
+        ]
+    
+    @staticmethod
+    def exists(directory=PACKED_DATA_DIR):
+        return os.path.exists(os.path.join(directory, META_FILE))
+    
+    def __len__(self):
+        return len(self.records)
+    
+    def __getstate__(self):
+        # Workers reopen the memory maps instead of receiving pickled pixels.
+        return {"directory": self.directory}
+    
+    def __setstate__(self, state):
+        self.__init__(state["directory"])
+    
+    @property
+    def shards(self):
+        return self._shards
+    
+    def image(self, i):
+        return self._shards[self._shard_ids[i]][self._rows[i]]
+    
+    def load_raw(self, i):
+        return self.image(i)
+    
+    def describe(self, i):
+        return f"{self.directory}[{i}]"
+    
+    def content_key(self, i):
+        from data.feature_store import FeatureStore
+        return FeatureStore.array_key(self.image(i))
+    
+    def subset(self, indices):
+        return PackedSubset(self, indices)
+
+class PackedSubset:
+    # Selected rows of a PackedDataset, in the form preprocess_dataset takes.
+    
+    def __init__(self, dataset, indices):
+        self.dataset = dataset
+        self.indices = np.asarray(indices, dtype=np.intp)
+        self.records = dataset.records.iloc[self.indices].reset_index(drop=True)
+    
+    def __len__(self):
+        return len(self.indices)
+    
+    def load_raw(self, i):
+        return self.dataset.image(self.indices[i])
+    
+    def describe(self, i):
+        return self.dataset.describe(self.indices[i])
+    
+    def content_key(self, i):
+        return self.dataset.content_key(self.indices[i])
+
+def append_packed(images, records, directory=PACKED_DATA_DIR):
+    # Adds the images as one more shard and rewrites the index and meta
+    # files; existing shards are left untouched.
+    dataset = PackedDataset(directory)
+    shard_id = dataset.meta["n_shards"]
+    images = np.asarray(images, dtype=np.uint8)
+    expected = tuple(dataset.meta["image_shape"])
+    if images.shape[1:] != expected:
+        raise ValueError(f"Expected uint8 images of shape {expected}, got {images.shape[1:]}")
+    
+    np.save(os.path.join(directory, _shard_name(shard_id)), images)
+    added = pd.DataFrame([dict(record, shard=shard_id, row=row) for row, record in enumerate(records)])
+    index = pd.concat([dataset.records, added], ignore_index=True)
+    index.to_csv(os.path.join(directory, INDEX_FILE), index=False)
+    meta = dict(dataset.meta, n_shards=shard_id + 1, n_images=len(index))
+    with open(os.path.join(directory, META_FILE), "w") as f:
+        json.dump(meta, f, indent=2)
@@ -1,37 +1,75 @@
 import os
 import sys
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 import numpy as np
 from PIL import Image
-from skimage.feature import hog
-from skimage.color import rgb2gray
-from skimage.transform import resize
-import pandas as pd
-import joblib
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config import IMAGE_SIZE, PROCESSED_DATA_DIR
+from config import (
+    IMAGE_SIZE, PROCESSED_DATA_DIR, HOG_ORIENTATIONS, HOG_PIXELS_PER_CELL,
+    HOG_CELLS_PER_BLOCK, HOG_BLOCK_NORM, COLOR_HIST_BINS, PRECISION
+)
+from pipeline.metrics import stage
 
-def load_and_preprocess_image(image_path):
+def feature_dtype(precision=PRECISION):
+    return np.float32 if precision == "float32" else np.float64
+
+def feature_params(precision=PRECISION):
+    return {
+        "precision": precision,
+        "image_size": list(IMAGE_SIZE),
+        "hog_orientations": HOG_ORIENTATIONS,
+        "hog_pixels_per_cell": list(HOG_PIXELS_PER_CELL),
+        "hog_cells_per_block": list(HOG_CELLS_PER_BLOCK),
+        "hog_block_norm": HOG_BLOCK_NORM,
+        "color_hist_bins": COLOR_HIST_BINS,
+    }
+
+def feature_length():
+    n_cells = [size // cell for size, cell in zip(IMAGE_SIZE, HOG_PIXELS_PER_CELL)]
+    n_blocks = [cells - block + 1 for cells, block in zip(n_cells, HOG_CELLS_PER_BLOCK)]
+    hog_length = n_blocks[0] * n_blocks[1] * HOG_CELLS_PER_BLOCK[0] * HOG_CELLS_PER_BLOCK[1] * HOG_ORIENTATIONS
+    return hog_length + 3 * COLOR_HIST_BINS + 6
+
+def load_image_uint8(image_path):
     img = Image.open(image_path).convert('RGB')
     img = img.resize(IMAGE_SIZE)
-    img_array = np.array(img) / 255.0
+    return np.asarray(img)
+
+def load_and_preprocess_image(image_path):
+    img_array = load_image_uint8(image_path) / 255.0
     return img_array
 
+def to_uint8(img_array):
+    img_array = np.asarray(img_array)
+    if img_array.dtype == np.uint8:
+        return img_array
+    if img_array.max() <= 1:
+        img_array = img_array * 255.0
+    return np.clip(np.rint(img_array), 0, 255).astype(np.uint8)
+
 def extract_features(img_array):
+    # Reference implementation; skimage is only imported when it is used.
+    from skimage.feature import hog
+    from skimage.color import rgb2gray
+    
     gray = rgb2gray(img_array)
     
     hog_features = hog(
         gray,
-        orientations=9,
-        pixels_per_cell=(16, 16),
-        cells_per_block=(2, 2),
+        orientations=HOG_ORIENTATIONS,
+        pixels_per_cell=HOG_PIXELS_PER_CELL,
+        cells_per_block=HOG_CELLS_PER_BLOCK,
+        block_norm=HOG_BLOCK_NORM,
         visualize=False,
         feature_vector=True
     )
     
     color_hist = []
     for channel in range(3):
-        hist, _ = np.histogram(img_array[:, :, channel], bins=32, range=(0, 1))
+        hist, _ = np.histogram(img_array[:, :, channel], bins=COLOR_HIST_BINS, range=(0, 1))
         color_hist.extend(hist / hist.sum())
     
     mean_color = img_array.mean(axis=(0, 1))
@@ -46,30 +84,376 @@ def extract_features(img_array):
     
     return features
 
-def preprocess_dataset(df):
-    features_list = []
-    labels = []
+# rgb2gray luminance weights and skimage's block-normalisation epsilon.
+GRAY_COEFFS = np.array([0.2125, 0.7154, 0.0721])
+HOG_EPS = 1e-5
+FEATURE_BATCH_SIZE = 64
+
+@lru_cache(maxsize=None)
+def _cell_offsets(height, width):
+    cell_rows, cell_cols = HOG_PIXELS_PER_CELL
+    n_cells_col = width // cell_cols
+    rows = np.arange(height) // cell_rows
+    cols = np.arange(width) // cell_cols
+    return (rows[:, np.newaxis] * n_cells_col + cols[np.newaxis, :]) * HOG_ORIENTATIONS
+
+def _hog_batch(gray, exact=True):
+    n, height, width = gray.shape
+    cell_rows, cell_cols = HOG_PIXELS_PER_CELL
+    block_rows, block_cols = HOG_CELLS_PER_BLOCK
+    n_cells_row, n_cells_col = height // cell_rows, width // cell_cols
+    used_rows, used_cols = n_cells_row * cell_rows, n_cells_col * cell_cols
+    
+    g_row = np.zeros_like(gray)
+    g_col = np.zeros_like(gray)
+    g_row[:, 1:-1, :] = gray[:, 2:, :] - gray[:, :-2, :]
+    g_col[:, :, 1:-1] = gray[:, :, 2:] - gray[:, :, :-2]
+    
+    magnitude = np.hypot(g_col, g_row)
+    orientation = np.rad2deg(np.arctan2(g_row, g_col)) % 180
+    
+    if exact:
+        # Same half-open [start, end) bin test as skimage; an orientation that
+        # rounds up to exactly 180 falls in no bin there, so it votes nothing here.
+        bin_width = 180.0 / HOG_ORIENTATIONS
+        bins = np.floor(orientation / bin_width).astype(np.intp)
+        bins -= orientation < bins * bin_width
+        bins += orientation >= (bins + 1) * bin_width
+        magnitude[bins >= HOG_ORIENTATIONS] = 0.0
+        np.minimum(bins, HOG_ORIENTATIONS - 1, out=bins)
+        
+        def pixels_by_cell(a):
+            a = a[:, :used_rows, :used_cols]
+            a = a.reshape(n, n_cells_row, cell_rows, n_cells_col, cell_cols).transpose(2, 4, 0, 1, 3)
+            return np.ascontiguousarray(a).reshape(cell_rows * cell_cols, -1)
+        
+        magnitude = pixels_by_cell(magnitude)
+        bins = pixels_by_cell(bins)
+        
+        # skimage sums each cell in a float32 accumulator, pixel by pixel in
+        # row-major order. Replaying that order across all cells at once keeps
+        # the histograms bit-identical to hog().
+        hist = np.zeros(magnitude.shape[1] * HOG_ORIENTATIONS, dtype=np.float32)
+        cell_offsets = np.arange(magnitude.shape[1]) * HOG_ORIENTATIONS
+        for k in range(cell_rows * cell_cols):
+            idx = cell_offsets + bins[k]
+            hist[idx] = hist[idx] + magnitude[k]
+        hist = (hist / np.float32(cell_rows * cell_cols)).astype(gray.dtype)
+    else:
+        bins = (orientation[:, :used_rows, :used_cols] * (HOG_ORIENTATIONS / 180.0)).astype(np.intp)
+        np.minimum(bins, HOG_ORIENTATIONS - 1, out=bins)
+        
+        image_offsets = np.arange(n) * (n_cells_row * n_cells_col * HOG_ORIENTATIONS)
+        flat = image_offsets[:, np.newaxis, np.newaxis] + _cell_offsets(used_rows, used_cols) + bins
+        hist = np.bincount(
+            flat.ravel(), weights=magnitude[:, :used_rows, :used_cols].ravel(),
+            minlength=n * n_cells_row * n_cells_col * HOG_ORIENTATIONS
+        ).astype(gray.dtype) / (cell_rows * cell_cols)
+    
+    hist = hist.reshape(n, n_cells_row, n_cells_col, HOG_ORIENTATIONS)
+    
+    n_blocks_row = n_cells_row - block_rows + 1
+    n_blocks_col = n_cells_col - block_cols + 1
+    blocks = np.empty((n, n_blocks_row, n_blocks_col, block_rows, block_cols, HOG_ORIENTATIONS), dtype=gray.dtype)
+    for r in range(block_rows):
+        for c in range(block_cols):
+            blocks[:, :, :, r, c] = hist[:, r:r + n_blocks_row, c:c + n_blocks_col]
+    blocks = blocks.reshape(n, n_blocks_row, n_blocks_col, -1)
+    
+    out = blocks / np.sqrt(np.sum(blocks ** 2, axis=-1, keepdims=True) + HOG_EPS ** 2)
+    out = np.minimum(out, 0.2)
+    out = out / np.sqrt(np.sum(out ** 2, axis=-1, keepdims=True) + HOG_EPS ** 2)
+    return out.reshape(n, -1)
+
+def _histogram_bins(values):
+    # Reproduces np.histogram(..., range=(0, 1)) bin assignment, including
+    # its edge corrections and the closed last bin.
+    edges = np.linspace(0, 1, COLOR_HIST_BINS + 1)
+    idx = (values * COLOR_HIST_BINS).astype(np.intp)
+    np.clip(idx, 0, COLOR_HIST_BINS - 1, out=idx)
+    idx -= values < edges[idx]
+    idx += (values >= edges[idx + 1]) & (idx != COLOR_HIST_BINS - 1)
+    in_range = (values >= 0) & (values <= 1)
+    return idx, in_range
+
+@lru_cache(maxsize=None)
+def _level_to_bin():
+    # Bin of every value uint8 / 255.0 can take, as a (256, bins) one-hot map.
+    idx, _ = _histogram_bins(np.arange(256) / 255.0)
+    return np.eye(COLOR_HIST_BINS)[idx]
+
+def _level_counts(levels):
+    n = levels.shape[0]
+    channel_offsets = (np.arange(n)[:, np.newaxis, np.newaxis] * 3 + np.arange(3)) * 256
+    counts = np.bincount((channel_offsets + levels.reshape(n, -1, 3)).ravel(), minlength=n * 3 * 256)
+    return counts.reshape(n * 3, 256)
+
+def _color_hist_batch(images, levels=None):
+    n = images.shape[0]
+    
+    # Pixels decoded from 8-bit images are exactly k / 255, so counting the
+    # 256 levels and folding them into bins gives np.histogram's result in
+    # one pass. Anything else goes through the general edge-corrected path.
+    if levels is None:
+        with np.errstate(invalid='ignore'):
+            levels = (images * 255.0 + 0.5).astype(np.uint8)
+        if not np.array_equal(levels / 255.0, images):
+            levels = None
     
-    for idx, row in df.iterrows():
-        try:
-            img_array = load_and_preprocess_image(row['image_path'])
-            features = extract_features(img_array)
-            features_list.append(features)
-            labels.append(row['food_type'])
-        except Exception as e:
-            print(f"Error processing {row['image_path']}: {e}")
+    if levels is not None:
+        counts = _level_counts(levels) @ _level_to_bin()
+    else:
+        idx, in_range = _histogram_bins(images.reshape(n, -1, 3))
+        channel_offsets = (np.arange(n)[:, np.newaxis, np.newaxis] * 3 + np.arange(3)) * COLOR_HIST_BINS
+        counts = np.bincount((channel_offsets + idx)[in_range], minlength=n * 3 * COLOR_HIST_BINS)
+        counts = counts.reshape(n * 3, COLOR_HIST_BINS)
     
-    X = np.array(features_list)
-    y = np.array(labels)
+    return (counts / counts.sum(axis=1, keepdims=True)).reshape(n, -1)
+
+def _features_float64(batch, out, hog_length):
+    levels = batch if batch.dtype == np.uint8 else None
+    if levels is not None:
+        batch = batch / 255.0
+    else:
+        batch = np.asarray(batch, dtype=np.float64)
     
-    return X, y
+    with stage("hog"):
+        out[:, :hog_length] = _hog_batch(batch @ GRAY_COEFFS)
+    with stage("color"):
+        out[:, hog_length:-6] = _color_hist_batch(batch, levels)
+        out[:, -6:-3] = batch.mean(axis=(1, 2))
+        out[:, -3:] = batch.std(axis=(1, 2))
 
-def preprocess_single_image(image):
+def _features_float32(levels, out, hog_length):
+    # uint8 pixels in, float32 features out. HOG runs in float32 with a
+    # bincount per cell, and the colour histograms and channel moments all
+    # come from one count of the 256 levels per channel.
+    with stage("hog"):
+        gray = levels @ (GRAY_COEFFS / 255.0).astype(np.float32)
+        out[:, :hog_length] = _hog_batch(gray, exact=False)
+    
+    with stage("color"):
+        counts = _level_counts(levels)
+        n_pixels = counts[0].sum()
+        hist = counts @ _level_to_bin()
+        out[:, hog_length:-6] = (hist / n_pixels).reshape(len(levels), -1)
+        
+        scale = np.arange(256) / 255.0
+        mean = counts @ scale / n_pixels
+        variance = counts @ (scale ** 2) / n_pixels - mean ** 2
+        out[:, -6:-3] = mean.reshape(len(levels), 3)
+        out[:, -3:] = np.sqrt(np.maximum(variance, 0.0)).reshape(len(levels), 3)
+
+def extract_features_batch(images, precision=PRECISION):
+    # Vectorised equivalent of extract_features for an (N, H, W, 3) array,
+    # either uint8 or float in [0, 1]. In float64 precision the output
+    # matches extract_features to within 1e-12 absolute (bit-identical in
+    # practice), so models trained with either path are interchangeable.
+    # float32 precision is not: it computes gradients in float32 and bins
+    # orientations without the exact edge test, so pixels near a bin edge
+    # can vote in the neighbouring bin. HOG features then differ by up to
+    # about 1e-2 absolute (7.5e-3 measured on the training images) and the
+    # colour features by about 1e-7. Models must be trained and served at
+    # the same precision, which the bundle's feature_params enforce.
+    if precision == "float32":
+        images = to_uint8(images)
+        features = np.empty((images.shape[0], feature_length()), dtype=np.float32)
+        compute = _features_float32
+    else:
+        if HOG_BLOCK_NORM != "L2-Hys":
+            if np.asarray(images).dtype == np.uint8:
+                images = np.asarray(images) / 255.0
+            return np.vstack([extract_features(img) for img in images])
+        features = np.empty((images.shape[0], feature_length()))
+        compute = _features_float64
+    
+    hog_length = features.shape[1] - 3 * COLOR_HIST_BINS - 6
+    for start in range(0, images.shape[0], FEATURE_BATCH_SIZE):
+        batch = images[start:start + FEATURE_BATCH_SIZE]
+        compute(batch, features[start:start + len(batch)], hog_length)
+    
+    return features
+
+class PathSource:
+    def __init__(self, paths):
+        self.paths = paths
+    
+    def __len__(self):
+        return len(self.paths)
+    
+    def load_raw(self, i):
+        return load_image_uint8(self.paths[i])
+    
+    def describe(self, i):
+        return self.paths[i]
+    
+    def content_key(self, i):
+        from data.feature_store import FeatureStore
+        return FeatureStore.content_key(self.paths[i])
+
+class SubsetSource:
+    def __init__(self, source, indices):
+        self.source = source
+        self.indices = indices
+    
+    def __len__(self):
+        return len(self.indices)
+    
+    def load_raw(self, i):
+        return self.source.load_raw(self.indices[i])
+    
+    def describe(self, i):
+        return self.source.describe(self.indices[i])
+
+def _extract_into(source, start, stop, out, ok, precision):
+    errors = []
+    for batch_start in range(start, stop, FEATURE_BATCH_SIZE):
+        batch_stop = min(batch_start + FEATURE_BATCH_SIZE, stop)
+        images = []
+        rows = []
+        for i in range(batch_start, batch_stop):
+            try:
+                images.append(source.load_raw(i))
+                rows.append(i - start)
+            except Exception as e:
+                errors.append((i, f"Error processing {source.describe(i)}: {e}"))
+        
+        if rows:
+            out[rows] = extract_features_batch(np.stack(images), precision)
+            ok[rows] = True
+    return errors
+
+_worker_state = {}
+
+def _attach_worker(source, features_name, ok_name, shape, dtype, precision):
+    features_shm = shared_memory.SharedMemory(name=features_name)
+    ok_shm = shared_memory.SharedMemory(name=ok_name)
+    _worker_state['source'] = source
+    _worker_state['precision'] = precision
+    _worker_state['shm'] = (features_shm, ok_shm)
+    _worker_state['features'] = np.ndarray(shape, dtype=dtype, buffer=features_shm.buf)
+    _worker_state['ok'] = np.ndarray(shape[:1], dtype=bool, buffer=ok_shm.buf)
+
+def _extract_chunk(start, stop):
+    return _extract_into(
+        _worker_state['source'], start, stop,
+        _worker_state['features'][start:stop], _worker_state['ok'][start:stop],
+        _worker_state['precision']
+    )
+
+def _extract_parallel(source, out, ok, n_jobs, precision, chunk_size=None):
+    # Workers write feature rows straight into a shared buffer and only send
+    # back error messages, so no arrays are pickled between processes.
+    n = len(source)
+    if chunk_size is None:
+        chunk_size = max(1, min(256, n // (n_jobs * 4)))
+    
+    features_shm = shared_memory.SharedMemory(create=True, size=max(1, out.nbytes))
+    ok_shm = shared_memory.SharedMemory(create=True, size=max(1, n))
+    try:
+        shared_features = np.ndarray(out.shape, dtype=out.dtype, buffer=features_shm.buf)
+        shared_ok = np.ndarray(ok.shape, dtype=bool, buffer=ok_shm.buf)
+        shared_ok[:] = False
+        
+        errors = []
+        with ProcessPoolExecutor(
+            max_workers=n_jobs,
+            initializer=_attach_worker,
+            initargs=(source, features_shm.name, ok_shm.name, out.shape, out.dtype, precision)
+        ) as executor:
+            futures = [
+                executor.submit(_extract_chunk, start, min(start + chunk_size, n))
+                for start in range(0, n, chunk_size)
+            ]
+            for future in futures:
+                errors.extend(future.result())
+        
+        out[:] = shared_features
+        ok[:] = shared_ok
+        del shared_features, shared_ok
+    finally:
+        features_shm.close()
+        features_shm.unlink()
+        ok_shm.close()
+        ok_shm.unlink()
+    
+    return errors
+
+def extract_source(source, out, ok, n_jobs=1, precision=PRECISION):
+    if n_jobs is None or n_jobs < 1:
+        n_jobs = os.cpu_count() or 1
+    
+    if n_jobs == 1 or len(source) < 2:
+        errors = _extract_into(source, 0, len(source), out, ok, precision)
+    else:
+        errors = _extract_parallel(source, out, ok, n_jobs, precision)
+    
+    for _, message in sorted(errors):
+        print(message)
+
+def _as_source(dataset):
+    if hasattr(dataset, 'load_raw'):
+        return dataset, dataset.records['food_type'].tolist()
+    return PathSource(dataset['image_path'].tolist()), dataset['food_type'].tolist()
+
+def preprocess_dataset(dataset, feature_store=None, n_jobs=1, precision=PRECISION):
+    source, labels = _as_source(dataset)
+    labels = np.array(labels)
+    
+    X = np.empty((len(source), feature_length()), dtype=feature_dtype(precision))
+    ok = np.zeros(len(source), dtype=bool)
+    
+    if feature_store is None:
+        extract_source(source, X, ok, n_jobs=n_jobs, precision=precision)
+    else:
+        keys = []
+        for i in range(len(source)):
+            try:
+                keys.append(source.content_key(i))
+            except Exception as e:
+                print(f"Error processing {source.describe(i)}: {e}")
+                keys.append(None)
+        
+        ok[:] = feature_store.gather(keys, X)
+        missing = np.array([i for i, key in enumerate(keys) if key is not None and not ok[i]], dtype=np.intp)
+        
+        if len(missing) > 0:
+            print(f"Feature cache: {int(ok.sum())} hits, {len(missing)} to extract")
+            missing_features = np.empty((len(missing), X.shape[1]), dtype=X.dtype)
+            missing_ok = np.zeros(len(missing), dtype=bool)
+            extract_source(
+                SubsetSource(source, missing), missing_features, missing_ok,
+                n_jobs=n_jobs, precision=precision
+            )
+            
+            X[missing] = missing_features
+            ok[missing] = missing_ok
+            feature_store.add([keys[i] for i in missing[missing_ok]], missing_features[missing_ok])
+    
+    return X[ok], labels[ok]
+
+def _rgb_resized(image):
+    # PIL decodes lazily, so convert() is where an opened file is decoded.
+    with stage("decode"):
+        image = image.convert('RGB')
+    with stage("resize"):
+        return image.resize(IMAGE_SIZE)
+
+def image_to_array(image, precision=PRECISION):
+    if precision == "float32":
+        if isinstance(image, str):
+            with stage("decode"):
+                return load_image_uint8(image)
+        if isinstance(image, Image.Image):
+            return np.asarray(_rgb_resized(image))
+        if image.dtype == np.uint8 and image.shape == tuple(IMAGE_SIZE) + (3,):
+            return image
+    
     if isinstance(image, str):
-        img_array = load_and_preprocess_image(image)
+        with stage("decode"):
+            img_array = load_and_preprocess_image(image)
     elif isinstance(image, Image.Image):
-        img = image.convert('RGB').resize(IMAGE_SIZE)
-        img_array = np.array(img) / 255.0
+        img_array = np.array(_rgb_resized(image)) / 255.0
     else:
         img_array = image
         if img_array.max() > 1:
@@ -77,12 +461,24 @@ def preprocess_single_image(image):
         if len(img_array.shape) == 2:
             img_array = np.stack([img_array] * 3, axis=-1)
         if img_array.shape[:2] != IMAGE_SIZE:
-            img_array = resize(img_array, IMAGE_SIZE)
+            from skimage.transform import resize
+            with stage("resize"):
+                img_array = resize(img_array, IMAGE_SIZE)
     
-    features = extract_features(img_array)
-    return features.reshape(1, -1)
+    if precision == "float32":
+        return to_uint8(img_array)
+    return img_array
+
+def preprocess_single_image(image, precision=PRECISION):
+    img_array = image_to_array(image, precision)
+    return extract_features_batch(img_array[np.newaxis], precision)
+
+def preprocess_images(images, precision=PRECISION):
+    return extract_features_batch(np.stack([image_to_array(image, precision) for image in images]), precision)
 
 if __name__ == "__main__":
+    import pandas as pd
+    
     csv_path = os.path.join(PROCESSED_DATA_DIR, "nutrition_dataset.csv")
     if os.path.exists(csv_path):
         df = pd.read_csv(csv_path)
@@ -0,0 +1,123 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import LabelEncoder
+from sklearn.model_selection import train_test_split
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import PROCESSED_DATA_DIR, PACKED_DATA_DIR, PRECISION
+from data.packed_dataset import PackedDataset
+from data.preprocess import preprocess_single_image, load_image_uint8
+from models.train_classifier import load_features
+from pipeline.backends import BACKENDS, get_backend, save_engine
+from pipeline.timing import single_row_latency
+
+def batch_throughput(engine, X_test, batch_size, min_seconds=0.5):
+    # Rows per second through predict_with_proba in batches of batch_size.
+    batch = X_test[:batch_size]
+    engine.predict_with_proba(batch)
+    rows = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < min_seconds:
+        engine.predict_with_proba(batch)
+        rows += len(batch)
+    return rows / (time.perf_counter() - start)
+
+def artifact_bytes(engine):
+    directory = tempfile.mkdtemp(prefix="backend-")
+    try:
+        save_engine(engine, directory)
+        return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+    finally:
+        shutil.rmtree(directory)
+
+def feature_latency(precision, n_samples=20, packed=False):
+    # Feature extraction is the same for every backend; timed once so the
+    # backend latencies can be read against it.
+    if packed:
+        dataset = PackedDataset(PACKED_DATA_DIR)
+        images = [dataset.image(i) for i in range(min(n_samples, len(dataset)))]
+    else:
+        dataset = pd.read_csv(os.path.join(PROCESSED_DATA_DIR, "nutrition_dataset.csv"))
+        images = [load_image_uint8(path) for path in dataset['image_path'][:n_samples]]
+    if not images:
+        return float('nan')
+    preprocess_single_image(images[0], precision)
+    timings = []
+    for image in images:
+        start = time.perf_counter()
+        preprocess_single_image(image, precision)
+        timings.append(time.perf_counter() - start)
+    return float(np.percentile(timings, 50))
+
+def leaderboard(names, X, y, latency_samples=200, batch_size=256):
+    label_encoder = LabelEncoder()
+    y_encoded = label_encoder.fit_transform(y)
+    # The same split train_food_classifier reports on.
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y_encoded, test_size=0.2, random_state=42, stratify=y_encoded
+    )
+    
+    results = []
+    for name in names:
+        backend = get_backend(name)
+        print(f"Fitting {backend.description}...")
+        start = time.perf_counter()
+        model = backend.fit(X_train, y_train, {})
+        fit_s = time.perf_counter() - start
+        
+        # Everything is measured on the compiled engine, the form the
+        # predictor serves from a bundle.
+        engine = backend.compile(model)
+        predictions, _ = engine.predict_with_proba(X_test)
+        p50, p99 = single_row_latency(engine.predict_with_proba, X_test, latency_samples, (50, 99))
+        results.append({
+            'backend': name,
+            'accuracy': float(np.mean(predictions == y_test)),
+            'latency_p50_s': p50,
+            'latency_p99_s': p99,
+            'batch_rows_per_s': batch_throughput(engine, X_test, batch_size),
+            'model_bytes': artifact_bytes(engine),
+            'fit_s': fit_s,
+        })
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Fit each classifier backend on one feature matrix and compare accuracy, latency and size"
+    )
+    parser.add_argument("--backends", nargs="+", choices=sorted(BACKENDS), default=list(BACKENDS))
+    parser.add_argument("--latency-samples", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=256, help="Rows per call for the throughput column")
+    parser.add_argument("--n-jobs", type=int, default=1, help="Feature extraction processes")
+    parser.add_argument("--packed", action="store_true", help="Read images from the packed dataset")
+    parser.add_argument("--precision", choices=["float64", "float32"], default=PRECISION)
+    parser.add_argument("--output", help="Write the results as JSON to this path")
+    args = parser.parse_args()
+    
+    X, y = load_features(n_jobs=args.n_jobs, packed=args.packed, precision=args.precision)
+    results = leaderboard(args.backends, X, y, args.latency_samples, args.batch_size)
+    features_s = feature_latency(args.precision, packed=args.packed)
+    
+    print(f"\n{'backend':<24} {'accuracy':>8} {'p50 us':>8} {'p99 us':>8} {'batch rows/s':>13} "
+          f"{'size KB':>9} {'fit s':>7}")
+    for result in sorted(results, key=lambda r: -r['accuracy']):
+        print(f"{result['backend']:<24} {result['accuracy']:>8.4f} {result['latency_p50_s'] * 1e6:>8.0f} "
+              f"{result['latency_p99_s'] * 1e6:>8.0f} {result['batch_rows_per_s']:>13.0f} "
+              f"{result['model_bytes'] / 1024:>9.0f} {result['fit_s']:>7.2f}")
+    print(f"Latencies are the classifier only; feature extraction adds {features_s * 1e6:.0f}us per image.")
+    print("Train with one: python train_models.py --backend <backend>")
+    
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({'feature_latency_s': features_s, 'results': results}, f, indent=2)
+        print(f"\nWrote {args.output}")
+
+if __name__ == "__main__":
+    main()
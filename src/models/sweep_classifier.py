@@ -0,0 +1,201 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import itertools
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import LabelEncoder
+from sklearn.model_selection import train_test_split
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import PRECISION
+from models.train_classifier import CLASSIFIER_PARAMS, load_features
+from pipeline.forest_engine import CompiledForest
+from pipeline.timing import single_row_latency
+
+DEFAULT_GRID = {
+    'n_estimators': [25, 50, 100, 200],
+    'max_depth': [8, 12, 15, None],
+    'min_samples_leaf': [1, 2, 4],
+}
+
+def parse_value(text):
+    if text.lower() == 'none':
+        return None
+    for convert in (int, float):
+        try:
+            return convert(text)
+        except ValueError:
+            pass
+    return text
+
+def parse_grid(specs):
+    # "--grid max_depth=8,15,none" entries replace the default axis of the
+    # same name.
+    grid = dict(DEFAULT_GRID)
+    for spec in specs or []:
+        name, _, values = spec.partition('=')
+        if not values:
+            raise SystemExit(f"Bad --grid entry {spec!r}, expected name=v1,v2,...")
+        grid[name.strip()] = [parse_value(value.strip()) for value in values.split(',')]
+    return grid
+
+def configurations(grid, n_random=None, seed=42):
+    names = sorted(grid)
+    configs = [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+    if n_random is not None and n_random < len(configs):
+        configs = random.Random(seed).sample(configs, n_random)
+    return [{**CLASSIFIER_PARAMS, **config} for config in configs]
+
+class SharedArrays:
+    # The train/test split lives in shared memory once. Workers map the
+    # same pages instead of each receiving a pickled copy of X.
+    
+    def __init__(self, arrays):
+        self.blocks = {}
+        self.specs = {}
+        for name, array in arrays.items():
+            block = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+            self.blocks[name] = block
+            self.specs[name] = (block.name, array.shape, array.dtype.str)
+    
+    def close(self):
+        for block in self.blocks.values():
+            block.close()
+            block.unlink()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+_worker_state = {}
+
+def _attach_worker(specs):
+    for name, (block_name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        _worker_state.setdefault('blocks', []).append(block)
+        _worker_state[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+
+def _evaluate(params):
+    # sklearn trains on float32, and the split is stored as float32 C-order
+    # arrays, so fit() uses the shared pages without converting them.
+    X_train, y_train = _worker_state['X_train'], _worker_state['y_train']
+    X_test, y_test = _worker_state['X_test'], _worker_state['y_test']
+    
+    start = time.perf_counter()
+    classifier = RandomForestClassifier(**params, random_state=42, n_jobs=1)
+    classifier.fit(X_train, y_train)
+    fit_s = time.perf_counter() - start
+    
+    accuracy = float(np.mean(classifier.predict(X_test) == y_test))
+    return params, accuracy, fit_s, CompiledForest.from_sklearn(classifier)
+
+def sweep(configs, X, y, n_jobs=None, latency_samples=200):
+    label_encoder = LabelEncoder()
+    y_encoded = label_encoder.fit_transform(y)
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y_encoded, test_size=0.2, random_state=42, stratify=y_encoded
+    )
+    
+    shared = {
+        'X_train': np.ascontiguousarray(X_train, dtype=np.float32),
+        'X_test': np.ascontiguousarray(X_test, dtype=np.float32),
+        'y_train': y_train,
+        'y_test': y_test,
+    }
+    n_jobs = n_jobs or os.cpu_count() or 1
+    
+    results = []
+    with SharedArrays(shared) as arrays:
+        del shared
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_attach_worker, initargs=(arrays.specs,)) as executor:
+            for i, (params, accuracy, fit_s, forest) in enumerate(executor.map(_evaluate, configs), 1):
+                # Latency is timed here, one model at a time, so it is not
+                # skewed by workers still training.
+                p50, p95 = single_row_latency(forest.predict_with_proba, X_test, latency_samples)
+                results.append({
+                    'params': params,
+                    'accuracy': accuracy,
+                    'fit_s': fit_s,
+                    'n_nodes': int(forest.n_nodes),
+                    'model_bytes': forest.nbytes,
+                    'latency_p50_s': p50,
+                    'latency_p95_s': p95,
+                })
+                print(f"[{i}/{len(configs)}] {format_params(params)}: accuracy {accuracy:.4f}, "
+                      f"{p50 * 1e6:.0f}us")
+    
+    mark_pareto(results)
+    return results
+
+def mark_pareto(results):
+    # A config is on the front when nothing at least as fast is more accurate.
+    best_accuracy = -1.0
+    for result in sorted(results, key=lambda r: (r['latency_p50_s'], -r['accuracy'])):
+        result['pareto'] = result['accuracy'] > best_accuracy
+        best_accuracy = max(best_accuracy, result['accuracy'])
+
+def pick(results, accuracy_floor):
+    eligible = [result for result in results if result['accuracy'] >= accuracy_floor]
+    if not eligible:
+        return None
+    return min(eligible, key=lambda r: (r['latency_p50_s'], -r['accuracy']))
+
+def format_params(params):
+    return " ".join(f"{name}={params[name]}" for name in sorted(params))
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Sweep RandomForest hyperparameters over one shared feature matrix"
+    )
+    parser.add_argument("--grid", action="append", metavar="NAME=V1,V2,...",
+                        help="Values for one hyperparameter (repeatable); replaces that axis of the default grid")
+    parser.add_argument("--random", type=int, metavar="N", help="Evaluate N random configurations of the grid")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for --random")
+    parser.add_argument("--accuracy-floor", type=float, default=0.0,
+                        help="Pick the fastest configuration at or above this accuracy")
+    parser.add_argument("--n-jobs", type=int, default=None, help="Worker processes (default: all CPUs)")
+    parser.add_argument("--latency-samples", type=int, default=200)
+    parser.add_argument("--packed", action="store_true", help="Read images from the packed dataset")
+    parser.add_argument("--precision", choices=["float64", "float32"], default=PRECISION)
+    parser.add_argument("--output", help="Write the results as JSON to this path")
+    args = parser.parse_args()
+    
+    configs = configurations(parse_grid(args.grid), args.random, args.seed)
+    print(f"Evaluating {len(configs)} configurations")
+    
+    X, y = load_features(n_jobs=args.n_jobs or 1, packed=args.packed, precision=args.precision)
+    results = sweep(configs, X, y, args.n_jobs, args.latency_samples)
+    
+    print(f"\n{'':1} {'accuracy':>8} {'p50 us':>8} {'p95 us':>8} {'nodes':>8} {'size KB':>9} {'fit s':>7}  params")
+    for result in sorted(results, key=lambda r: r['latency_p50_s']):
+        print(f"{'*' if result['pareto'] else ' ':1} {result['accuracy']:>8.4f} "
+              f"{result['latency_p50_s'] * 1e6:>8.0f} {result['latency_p95_s'] * 1e6:>8.0f} "
+              f"{result['n_nodes']:>8} {result['model_bytes'] / 1024:>9.0f} {result['fit_s']:>7.2f}  "
+              f"{format_params(result['params'])}")
+    print("* accuracy/latency Pareto front")
+    
+    best = pick(results, args.accuracy_floor)
+    if best is None:
+        print(f"\nNo configuration reaches accuracy {args.accuracy_floor:.4f}")
+    else:
+        print(f"\nFastest configuration with accuracy >= {args.accuracy_floor:.4f}: "
+              f"accuracy {best['accuracy']:.4f}, {best['latency_p50_s'] * 1e6:.0f}us")
+        print(f"  train_food_classifier(params={best['params']})")
+    
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({'accuracy_floor': args.accuracy_floor, 'pick': best, 'results': results}, f, indent=2)
+        print(f"\nWrote {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -9,40 +9,85 @@ from sklearn.preprocessing import LabelEncoder
 import joblib
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config import PROCESSED_DATA_DIR, MODELS_DIR, NUTRITION_DATA, FOOD_CATEGORIES
+from config import PROCESSED_DATA_DIR, PACKED_DATA_DIR, MODELS_DIR, FOOD_CATEGORIES
+from data.packed_dataset import PackedDataset
+from data.nutrition_store import NutritionStore
 
-def create_nutrition_features(df):
-    label_encoder = LabelEncoder()
-    food_encoded = label_encoder.fit_transform(df['food_type'])
-    
-    features = []
-    for idx, row in df.iterrows():
-        food_type = row['food_type']
-        base_nutrition = NUTRITION_DATA[food_type]
-        
-        feature_vector = [
-            food_encoded[idx],
-            base_nutrition['protein'],
-            base_nutrition['carbs'],
-            base_nutrition['fat'],
-            base_nutrition['fiber'],
-            base_nutrition['protein'] * 4,
-            base_nutrition['carbs'] * 4,
-            base_nutrition['fat'] * 9,
-        ]
-        features.append(feature_vector)
+# Columns of the regressor's feature rows after the encoded food type; the
+# last three features are the calories of protein, carbs and fat.
+BASE_FIELDS = ('protein', 'carbs', 'fat', 'fiber')
+N_FEATURES = 8
+DEFAULT_CHUNKSIZE = 1_000_000
+
+def feature_table(label_encoder, nutrition=None):
+    # One finished feature row per food, indexed by its encoded label, so a
+    # dataset's features are a single gather of this table by food code.
+    # Nutrition comes from the same store the predictor regresses with.
+    nutrition = nutrition if nutrition is not None else NutritionStore()
+    rows = [nutrition[food] for food in label_encoder.classes_]
+    table = np.empty((len(label_encoder.classes_), N_FEATURES))
+    table[:, 0] = np.arange(len(label_encoder.classes_))
+    table[:, 1:5] = [[row[field] for field in BASE_FIELDS] for row in rows]
+    table[:, 5] = table[:, 1] * 4
+    table[:, 6] = table[:, 2] * 4
+    table[:, 7] = table[:, 3] * 9
+    return table
+
+def food_codes(food_types, label_encoder):
+    # Hash lookup of each row's label; LabelEncoder.transform would sort them.
+    codes = pd.Categorical(food_types, categories=label_encoder.classes_).codes
+    if (codes < 0).any():
+        unknown = sorted(set(np.asarray(food_types)[codes < 0]))
+        raise KeyError(f"Food types missing from the encoder: {unknown}")
+    return codes
+
+def create_nutrition_features(df, label_encoder=None, out=None):
+    if label_encoder is None:
+        label_encoder = LabelEncoder().fit(pd.unique(df['food_type']))
+    codes = food_codes(df['food_type'], label_encoder)
+    return np.take(feature_table(label_encoder), codes, axis=0, out=out), label_encoder
+
+def scan_food_types(csv_path, chunksize=DEFAULT_CHUNKSIZE):
+    # Row count and distinct foods of a CSV, reading only its food_type column.
+    n_rows, food_types = 0, set()
+    for chunk in pd.read_csv(csv_path, usecols=['food_type'], chunksize=chunksize):
+        n_rows += len(chunk)
+        food_types.update(pd.unique(chunk['food_type']))
+    return n_rows, LabelEncoder().fit(sorted(food_types))
+
+def load_nutrition_features(csv_path, label_encoder=None, chunksize=DEFAULT_CHUNKSIZE, out_path=None):
+    # Two passes over the CSV, a chunk at a time: the first sizes the matrix
+    # and finds the foods, the second fills it in place. With out_path the
+    # matrix is a .npy memmap, so it need not fit in RAM.
+    n_rows, scanned = scan_food_types(csv_path, chunksize)
+    label_encoder = label_encoder or scanned
+    if out_path:
+        X = np.lib.format.open_memmap(out_path, mode='w+', dtype=np.float64, shape=(n_rows, N_FEATURES))
+    else:
+        X = np.empty((n_rows, N_FEATURES))
+    y = np.empty(n_rows)
     
-    return np.array(features), label_encoder
+    table = feature_table(label_encoder)
+    start = 0
+    for chunk in pd.read_csv(csv_path, usecols=['food_type', 'calories'], chunksize=chunksize):
+        stop = start + len(chunk)
+        np.take(table, food_codes(chunk['food_type'], label_encoder), axis=0, out=X[start:stop])
+        y[start:stop] = chunk['calories'].to_numpy()
+        start = stop
+    return X, y, label_encoder
 
-def train_calorie_regressor():
+def train_calorie_regressor(packed=False, chunksize=None):
     os.makedirs(MODELS_DIR, exist_ok=True)
     
     csv_path = os.path.join(PROCESSED_DATA_DIR, "nutrition_dataset.csv")
-    df = pd.read_csv(csv_path)
-    
     print("Creating nutrition features...")
-    X, food_encoder = create_nutrition_features(df)
-    y = df['calories'].values
+    if chunksize and not packed:
+        # Streams the CSV instead of loading every column of it at once.
+        X, y, food_encoder = load_nutrition_features(csv_path, chunksize=chunksize)
+    else:
+        df = PackedDataset(PACKED_DATA_DIR).records if packed else pd.read_csv(csv_path)
+        X, food_encoder = create_nutrition_features(df)
+        y = df['calories'].values
     
     X_train, X_test, y_train, y_test = train_test_split(
         X, y, test_size=0.2, random_state=42
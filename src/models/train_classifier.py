@@ -1,7 +1,6 @@
 import os
 import sys
 import numpy as np
-from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import LabelEncoder
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score, classification_report
@@ -9,36 +8,54 @@ import joblib
 import pandas as pd
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config import PROCESSED_DATA_DIR, MODELS_DIR, FOOD_CATEGORIES
-from data.preprocess import preprocess_dataset
+from config import PROCESSED_DATA_DIR, PACKED_DATA_DIR, MODELS_DIR, FOOD_CATEGORIES, PRECISION
+from data.preprocess import preprocess_dataset, feature_params
+from data.feature_store import FeatureStore
+from data.packed_dataset import PackedDataset
+from pipeline.backends import get_backend, DEFAULT_BACKEND
 
-def train_food_classifier():
-    os.makedirs(MODELS_DIR, exist_ok=True)
-    
-    csv_path = os.path.join(PROCESSED_DATA_DIR, "nutrition_dataset.csv")
-    df = pd.read_csv(csv_path)
+# RandomForest hyperparameters used unless train_food_classifier is given
+# others, for example the pick of a sweep_classifier.py run.
+CLASSIFIER_PARAMS = {
+    'n_estimators': 100,
+    'max_depth': 15,
+    'min_samples_split': 5,
+    'min_samples_leaf': 2,
+}
+
+def load_features(use_feature_cache=True, n_jobs=1, packed=False, precision=PRECISION):
+    if packed:
+        dataset = PackedDataset(PACKED_DATA_DIR)
+    else:
+        csv_path = os.path.join(PROCESSED_DATA_DIR, "nutrition_dataset.csv")
+        dataset = pd.read_csv(csv_path)
     
     print("Extracting features from images...")
-    X, y = preprocess_dataset(df)
+    feature_store = FeatureStore(params=feature_params(precision)) if use_feature_cache else None
+    X, y = preprocess_dataset(dataset, feature_store=feature_store, n_jobs=n_jobs, precision=precision)
+    print(f"Feature matrix: {X.shape} {X.dtype}, {X.nbytes / 1e6:.1f} MB")
+    return X, y
+
+def holdout_split(labels):
+    # Row indices train_food_classifier trains on and holds out; the update
+    # tools reuse it to tell the two apart.
+    return train_test_split(np.arange(len(labels)), test_size=0.2, random_state=42, stratify=labels)
+
+def train_food_classifier(use_feature_cache=True, n_jobs=1, packed=False, precision=PRECISION, params=None,
+                          backend=DEFAULT_BACKEND):
+    os.makedirs(MODELS_DIR, exist_ok=True)
+    
+    X, y = load_features(use_feature_cache, n_jobs, packed, precision)
     
     label_encoder = LabelEncoder()
     y_encoded = label_encoder.fit_transform(y)
     
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y_encoded, test_size=0.2, random_state=42, stratify=y_encoded
-    )
-    
-    print("Training RandomForest classifier...")
-    classifier = RandomForestClassifier(
-        n_estimators=100,
-        max_depth=15,
-        min_samples_split=5,
-        min_samples_leaf=2,
-        random_state=42,
-        n_jobs=-1
-    )
+    train_rows, test_rows = holdout_split(y_encoded)
+    X_train, X_test, y_train, y_test = X[train_rows], X[test_rows], y_encoded[train_rows], y_encoded[test_rows]
     
-    classifier.fit(X_train, y_train)
+    backend = get_backend(backend)
+    print(f"Training {backend.description} classifier...")
+    classifier = backend.fit(X_train, y_train, params or {})
     
     y_pred = classifier.predict(X_test)
     accuracy = accuracy_score(y_test, y_pred)
@@ -0,0 +1,216 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+import joblib
+from sklearn.model_selection import train_test_split
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import PROCESSED_DATA_DIR, PACKED_DATA_DIR, MODELS_DIR, MODEL_BUNDLE_DIR, PRECISION
+from data.preprocess import preprocess_dataset, feature_params, load_image_uint8
+from data.nutrition_store import NutritionStore
+from data.feature_store import FeatureStore
+from data.packed_dataset import PackedDataset, append_packed
+from models.train_classifier import holdout_split
+from pipeline.model_bundle import write_bundle, source_stamps, JOBLIB_FILES
+from pipeline.backends import backend_of
+
+NUTRITION_COLUMNS = ('calories', 'protein', 'carbs', 'fat', 'fiber')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+def read_new_samples(source):
+    # A CSV with image_path and food_type columns (nutrition columns are
+    # optional), or a directory with one sub-directory of photos per food.
+    if os.path.isdir(source):
+        rows = []
+        for food_type in sorted(os.listdir(source)):
+            food_dir = os.path.join(source, food_type)
+            if not os.path.isdir(food_dir):
+                continue
+            for name in sorted(os.listdir(food_dir)):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    rows.append({'image_path': os.path.join(food_dir, name), 'food_type': food_type})
+        df = pd.DataFrame(rows, columns=['image_path', 'food_type'])
+    else:
+        df = pd.read_csv(source)
+        base = os.path.dirname(os.path.abspath(source))
+        df['image_path'] = [os.path.join(base, path) for path in df['image_path']]
+    
+    df['image_path'] = [os.path.abspath(path) for path in df['image_path']]
+    nutrition = NutritionStore()
+    for column in NUTRITION_COLUMNS:
+        nominal = df['food_type'].map(lambda food: (nutrition.get(food) or {}).get(column, np.nan))
+        df[column] = df[column].fillna(nominal) if column in df else nominal
+    return df
+
+def read_new_images(new):
+    # Packed datasets store pixels, so the new photos are decoded up front;
+    # unreadable ones are dropped.
+    images, keep = [], []
+    for i, path in enumerate(new['image_path']):
+        try:
+            images.append(load_image_uint8(path))
+            keep.append(i)
+        except Exception as e:
+            print(f"Error processing {path}: {e}")
+    return new.iloc[keep].reset_index(drop=True), images
+
+def stratified_sample(df, per_class, seed):
+    return df.sample(frac=1, random_state=seed).groupby('food_type').head(per_class)
+
+def select_rows(dataset, index):
+    if isinstance(dataset, PackedDataset):
+        return dataset.subset(index)
+    return dataset.loc[index]
+
+def accuracy(classifier, X, y):
+    if len(y) == 0:
+        return float('nan')
+    return float(np.mean(classifier.predict(X) == y))
+
+def update_classifier(source, trees=10, replace_oldest=False, replay_per_class=20, holdout=0.2,
+                      precision=PRECISION, seed=0, publish=True, packed=False):
+    start = time.perf_counter()
+    classifier = joblib.load(os.path.join(MODELS_DIR, JOBLIB_FILES['classifier']))
+    label_encoder = joblib.load(os.path.join(MODELS_DIR, JOBLIB_FILES['label_encoder']))
+    if backend_of(classifier).name != "random_forest":
+        raise SystemExit(f"Incremental updates grow a random forest; retrain the {backend_of(classifier).name} "
+                         f"classifier with train_models.py")
+    
+    csv_path = os.path.join(PROCESSED_DATA_DIR, "nutrition_dataset.csv")
+    new = read_new_samples(source)
+    if packed:
+        dataset = PackedDataset(PACKED_DATA_DIR)
+        records = dataset.records
+        new, new_images = read_new_images(new)
+        known = {dataset.content_key(i) for i in range(len(dataset))}
+        fresh = [FeatureStore.array_key(image) not in known for image in new_images]
+        new_images = [image for image, keep in zip(new_images, fresh) if keep]
+        new = new[fresh].reset_index(drop=True)
+    else:
+        dataset = records = pd.read_csv(csv_path)
+        dataset['image_path'] = [os.path.abspath(path) for path in dataset['image_path']]
+        new = new[~new['image_path'].isin(set(dataset['image_path']))].reset_index(drop=True)
+    if len(new) == 0:
+        print("No new samples to add.")
+        return None
+    
+    unknown = sorted(set(new['food_type']) - set(label_encoder.classes_))
+    if unknown:
+        # Trees added with warm_start must share the forest's classes_.
+        raise SystemExit(f"New food types {unknown} need a full retrain (train_models.py)")
+    
+    # Replay a stratified sample of the existing training rows alongside the
+    # new photos, so the added trees still see every class and do not simply
+    # vote for whatever the new batch is made of. The rows train_models.py
+    # held out check the update does not hurt what the model already knew;
+    # rows appended by earlier updates shift that split until the next full
+    # retrain.
+    train_rows, test_rows = holdout_split(records['food_type'].to_numpy())
+    replay = stratified_sample(records.iloc[train_rows], replay_per_class, seed)
+    
+    feature_store = FeatureStore(params=feature_params(precision))
+    extract_start = time.perf_counter()
+    X_new, y_new = preprocess_dataset(new, feature_store=feature_store, precision=precision)
+    X_replay, y_replay = preprocess_dataset(select_rows(dataset, replay.index), feature_store=feature_store,
+                                            precision=precision)
+    X_probe, y_probe = preprocess_dataset(select_rows(dataset, records.index[test_rows]), feature_store=feature_store,
+                                          precision=precision)
+    extract_s = time.perf_counter() - extract_start
+    
+    y_new = label_encoder.transform(y_new)
+    y_replay = label_encoder.transform(y_replay)
+    y_probe = label_encoder.transform(y_probe)
+    
+    if holdout > 0 and len(y_new) >= 10:
+        try:
+            X_train_new, X_test_new, y_train_new, y_test_new = train_test_split(
+                X_new, y_new, test_size=holdout, random_state=seed, stratify=y_new
+            )
+        except ValueError:
+            # Too few photos of some food to stratify.
+            X_train_new, X_test_new, y_train_new, y_test_new = train_test_split(
+                X_new, y_new, test_size=holdout, random_state=seed
+            )
+    else:
+        X_train_new, X_test_new, y_train_new, y_test_new = X_new, X_new[:0], y_new, y_new[:0]
+    
+    X_train = np.concatenate([X_train_new, X_replay])
+    y_train = np.concatenate([y_train_new, y_replay])
+    missing = set(range(len(label_encoder.classes_))) - set(np.unique(y_train).tolist())
+    if missing:
+        # warm_start refits classes_ from y, so a missing class would shift
+        # the class indices of every existing tree.
+        names = label_encoder.inverse_transform(sorted(missing)).tolist()
+        raise SystemExit(f"No training samples for {names}; increase --replay-per-class")
+    
+    before = (accuracy(classifier, X_test_new, y_test_new), accuracy(classifier, X_probe, y_probe))
+    
+    n_before = len(classifier.estimators_)
+    if replace_oldest:
+        # Rebuild the oldest trees on the new data; the forest keeps its size.
+        classifier.estimators_ = classifier.estimators_[trees:]
+    
+    fit_start = time.perf_counter()
+    classifier.set_params(warm_start=True, n_estimators=len(classifier.estimators_) + trees)
+    classifier.fit(X_train, y_train)
+    classifier.set_params(warm_start=False)
+    fit_s = time.perf_counter() - fit_start
+    
+    after = (accuracy(classifier, X_test_new, y_test_new), accuracy(classifier, X_probe, y_probe))
+    
+    print(f"\n{len(new)} new samples ({len(y_test_new)} held out), {len(y_replay)} replayed")
+    print(f"Trees: {n_before} -> {len(classifier.estimators_)}")
+    print(f"Accuracy on held-out new samples:   {before[0]:.4f} -> {after[0]:.4f}")
+    print(f"Accuracy on held-out existing data: {before[1]:.4f} -> {after[1]:.4f}")
+    print(f"Feature extraction {extract_s:.1f}s, fit {fit_s:.1f}s")
+    
+    if publish:
+        joblib.dump(classifier, os.path.join(MODELS_DIR, JOBLIB_FILES['classifier']))
+        
+        # New rows go into the dataset so later replays and full retrains
+        # include them.
+        if packed:
+            append_packed(new_images, new.drop(columns='image_path').to_dict('records'), PACKED_DATA_DIR)
+        else:
+            new.reindex(columns=dataset.columns).to_csv(csv_path, mode='a', header=False, index=False)
+        
+        regressor_path = os.path.join(MODELS_DIR, JOBLIB_FILES['regressor'])
+        regressor = food_encoder = None
+        if os.path.exists(regressor_path):
+            regressor = joblib.load(regressor_path)
+            food_encoder = joblib.load(os.path.join(MODELS_DIR, JOBLIB_FILES['food_encoder']))
+        manifest = write_bundle(
+            classifier, label_encoder, regressor, food_encoder, feature_params(precision),
+            sources=source_stamps(MODELS_DIR)
+        )
+        print(f"Model bundle {manifest['bundle_id']} written to {MODEL_BUNDLE_DIR}")
+    
+    print(f"Update took {time.perf_counter() - start:.1f}s")
+    return classifier
+
+def main():
+    parser = argparse.ArgumentParser(description="Add a batch of labelled photos to the food classifier without a full retrain")
+    parser.add_argument("source", help="CSV with image_path,food_type columns, or a directory of <food_type>/ folders")
+    parser.add_argument("--trees", type=int, default=10, help="Trees to train on the new data")
+    parser.add_argument("--replace-oldest", action="store_true",
+                        help="Drop the oldest --trees trees so the forest keeps its size")
+    parser.add_argument("--replay-per-class", type=int, default=20,
+                        help="Existing samples per class trained alongside the new ones")
+    parser.add_argument("--holdout", type=float, default=0.2, help="Fraction of new samples kept for evaluation")
+    parser.add_argument("--precision", choices=["float64", "float32"], default=PRECISION)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--packed", action="store_true",
+                        help="Read and extend the packed dataset instead of nutrition_dataset.csv")
+    parser.add_argument("--dry-run", action="store_true", help="Report the effect without saving anything")
+    args = parser.parse_args()
+    
+    update_classifier(
+        args.source, args.trees, args.replace_oldest, args.replay_per_class, args.holdout,
+        args.precision, args.seed, publish=not args.dry_run, packed=args.packed
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data.nutrition_store import NUTRIENT_FIELDS, normalise
+
+LEAF_SIZE = 32
+# Leaves scanned per vectorised step of a query.
+LEAF_BATCH = 8
+# Goal -> (nutrient, direction, margin, minimum): an alternative must have
+# less or more of the nutrient than the food it replaces, by the larger of
+# margin (relative) and minimum (absolute, so near-zero values still need a
+# real gain).
+ALTERNATIVE_RULES = {
+    'weight_loss': ('calories', 'lower', 0.15, 50.0),
+    'muscle_gain': ('protein', 'higher', 0.15, 5.0),
+}
+
+class KDTree:
+    # k-d tree partition kept as flat arrays, numpy only. Building splits
+    # the widest dimension at its median until at most leaf_size points
+    # remain. Leaf i holds points[i, :size[i]] (the rest is padding) with
+    # caller indices index[i], inside the box lo[i]..hi[i].
+    #
+    # A query measures the distance to every leaf box in one vectorised
+    # step instead of walking the inner nodes in Python, then scans leaves
+    # nearest first, LEAF_BATCH at a time, until no box can hold anything
+    # closer than the k-th best point found.
+    
+    def __init__(self, points, leaf_size=LEAF_SIZE):
+        points = np.asarray(points, dtype=np.float64)
+        order = np.arange(len(points))
+        leaves = []
+        
+        def split(begin, end):
+            block = points[order[begin:end]]
+            if end - begin <= leaf_size:
+                leaves.append(order[begin:end])
+                return
+            dim = int(np.argmax(block.max(axis=0) - block.min(axis=0)))
+            middle = (end - begin) // 2
+            order[begin:end] = order[begin:end][np.argpartition(block[:, dim], middle)]
+            split(begin, begin + middle)
+            split(begin + middle, end)
+        
+        if len(points):
+            split(0, len(points))
+        n_dims = points.shape[1]
+        self.points = np.zeros((len(leaves), leaf_size, n_dims))
+        self.index = np.full((len(leaves), leaf_size), -1, dtype=np.int64)
+        self.size = np.array([len(leaf) for leaf in leaves], dtype=np.int64)
+        self.lo = np.empty((len(leaves), n_dims))
+        self.hi = np.empty((len(leaves), n_dims))
+        for i, leaf in enumerate(leaves):
+            self.points[i, :len(leaf)] = points[leaf]
+            self.index[i, :len(leaf)] = leaf
+            self.lo[i] = points[leaf].min(axis=0)
+            self.hi[i] = points[leaf].max(axis=0)
+    
+    def query(self, point, k, dim=None, below=None, above=None, exclude=None):
+        # The k points nearest to point with points[:, dim] < below (or
+        # > above), best first, as (squared distances, caller indices).
+        point = np.asarray(point, dtype=np.float64)
+        gap = np.maximum(self.lo - point, 0.0) + np.maximum(point - self.hi, 0.0)
+        bounds = np.einsum('ij,ij->i', gap, gap)
+        allowed = np.ones(len(bounds), dtype=bool)
+        if below is not None:
+            allowed &= self.lo[:, dim] < below
+        if above is not None:
+            allowed &= self.hi[:, dim] > above
+        leaves = np.flatnonzero(allowed)
+        leaves = leaves[np.argsort(bounds[leaves], kind='stable')]
+        
+        best_distances = np.zeros(0)
+        best_indices = np.zeros(0, dtype=np.int64)
+        for batch_start in range(0, len(leaves), LEAF_BATCH):
+            batch = leaves[batch_start:batch_start + LEAF_BATCH]
+            if len(best_distances) == k and bounds[batch[0]] >= best_distances[-1]:
+                break
+            block = self.points[batch]
+            index = self.index[batch]
+            keep = index >= 0
+            if below is not None:
+                keep &= block[:, :, dim] < below
+            if above is not None:
+                keep &= block[:, :, dim] > above
+            if exclude is not None:
+                keep &= index != exclude
+            difference = block[keep] - point
+            distances = np.concatenate([best_distances, np.einsum('ij,ij->i', difference, difference)])
+            indices = np.concatenate([best_indices, index[keep]])
+            top = np.lexsort((indices, distances))[:k]
+            best_distances, best_indices = distances[top], indices[top]
+        return best_distances, best_indices
+
+class HealthierAlternatives:
+    # Foods whose calories and macros are close to a given food's, limited
+    # to those that are better for a goal (ALTERNATIVE_RULES). Each nutrient
+    # is scaled by its spread over the catalogue so grams of fiber count as
+    # much as hundreds of calories; the tree is built once per catalogue.
+    
+    def __init__(self, store, rules=ALTERNATIVE_RULES):
+        self.rules = rules
+        self.names, values = store.standard_portions()
+        self.values = values
+        self.scale = values.std(axis=0) if len(values) else np.ones(len(NUTRIENT_FIELDS))
+        self.scale[self.scale == 0] = 1.0
+        self.tree = KDTree(values / self.scale)
+        self.positions = {normalise(name): i for i, name in enumerate(self.names)}
+    
+    def find(self, food_type, nutrition, goal, k=3):
+        # nutrition is the food's own record, on the same basis as the
+        # catalogue (its standard portion); returns up to k dicts of name
+        # and nutrients.
+        rule = self.rules.get(goal)
+        if rule is None:
+            return []
+        field, direction, margin, minimum = rule
+        dim = NUTRIENT_FIELDS.index(field)
+        values = np.array([float(nutrition[f]) for f in NUTRIENT_FIELDS])
+        point = values / self.scale
+        gap = max(abs(values[dim]) * margin, minimum) / self.scale[dim]
+        if direction == 'lower':
+            bounds = {'below': point[dim] - gap}
+        else:
+            bounds = {'above': point[dim] + gap}
+        
+        _, indices = self.tree.query(point, k, dim=dim, exclude=self.positions.get(normalise(food_type)), **bounds)
+        return [
+            {'name': self.names[i], **dict(zip(NUTRIENT_FIELDS, self.values[i].tolist()))}
+            for i in indices.tolist()
+        ]
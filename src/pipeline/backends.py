@@ -0,0 +1,265 @@
+import os
+import sys
+import json
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pipeline.forest_engine import CompiledForest
+
+# Classifier backends. Each one fits an sklearn model on the feature matrix
+# and compiles it into a numpy-only engine with predict_with_proba(),
+# save() and load(), so serving never imports sklearn whichever family the
+# bundle holds. sklearn is only imported inside the fit functions.
+
+def _softmax(scores):
+    scores = scores - scores.max(axis=1, keepdims=True)
+    np.exp(scores, out=scores)
+    scores /= scores.sum(axis=1, keepdims=True)
+    return scores
+
+class LinearModel:
+    # Class scores X @ coef.T + intercept with any feature scaling folded
+    # into coef and intercept; probabilities are their softmax.
+    
+    def __init__(self, coef, intercept, classes):
+        self.coef = coef
+        self.intercept = intercept
+        self.classes = classes
+    
+    @classmethod
+    def from_scaled(cls, coef, intercept, scaler, classes):
+        # Scores of a model fitted on (X - mean) / scale, rewritten in terms of X.
+        coef = np.asarray(coef, dtype=np.float64)
+        scaled_coef = coef / scaler.scale_
+        return cls(
+            np.ascontiguousarray(scaled_coef),
+            np.asarray(intercept, dtype=np.float64) - scaled_coef @ scaler.mean_,
+            np.asarray(classes)
+        )
+    
+    @classmethod
+    def from_logistic(cls, pipeline):
+        scaler, model = pipeline.steps[0][1], pipeline.steps[-1][1]
+        coef, intercept = model.coef_, model.intercept_
+        if coef.shape[0] == 1:
+            # Binary models keep one row; softmax([0, s]) is their sigmoid.
+            coef = np.vstack([np.zeros_like(coef), coef])
+            intercept = np.concatenate([[0.0], intercept])
+        return cls.from_scaled(coef, intercept, scaler, model.classes_)
+    
+    @classmethod
+    def from_nearest_centroid(cls, pipeline):
+        # argmin |x - c|^2 is argmax x.c - |c|^2 / 2, so nearest centroid is
+        # linear. The softmax of those scores is the class posterior under
+        # unit-variance Gaussians around each centroid.
+        scaler, model = pipeline.steps[0][1], pipeline.steps[-1][1]
+        centroids = model.centroids_
+        return cls.from_scaled(centroids, -0.5 * np.sum(centroids ** 2, axis=1), scaler, model.classes_)
+    
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for name in ('coef', 'intercept', 'classes'):
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+    
+    @classmethod
+    def load(cls, directory, mmap_mode="r"):
+        return cls(*(
+            np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode if name != 'classes' else None)
+            for name in ('coef', 'intercept', 'classes')
+        ))
+    
+    @property
+    def nbytes(self):
+        return int(self.coef.nbytes + self.intercept.nbytes)
+    
+    def predict_proba(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        return _softmax(X @ self.coef.T + self.intercept)
+    
+    def predict_with_proba(self, X):
+        proba = self.predict_proba(X)
+        return self.classes[proba.argmax(axis=1)], proba
+    
+    def predict(self, X):
+        return self.predict_with_proba(X)[0]
+
+class BoostedTrees:
+    # Gradient-boosted trees: each iteration adds one tree per class to the
+    # raw scores, which start at baseline. The trees are a CompiledForest
+    # with one value per node, laid out iteration by iteration.
+    
+    def __init__(self, trees, baseline, classes):
+        self.trees = trees
+        self.baseline = baseline
+        self.classes = classes
+    
+    @classmethod
+    def from_sklearn(cls, model):
+        # Reads the fitted HistGradientBoostingClassifier's tree predictors.
+        # Splits send x <= num_threshold left, as CompiledForest does; the
+        # features have no missing values and no categorical splits. The
+        # thresholds stay float64 since these trees split the float64 input.
+        features, thresholds, children, values, roots = [], [], [], [], []
+        max_depth = 0
+        offset = 0
+        for iteration in model._predictors:
+            for predictor in iteration:
+                nodes = predictor.nodes
+                node_ids = np.arange(len(nodes), dtype=np.int32)
+                is_leaf = nodes['is_leaf'].astype(bool)
+                
+                tree_children = np.empty((len(nodes), 2), dtype=np.int32)
+                tree_children[:, 0] = np.where(is_leaf, node_ids, nodes['left'])
+                tree_children[:, 1] = np.where(is_leaf, node_ids, nodes['right'])
+                
+                features.append(np.where(is_leaf, 0, nodes['feature_idx']).astype(np.int32))
+                thresholds.append(np.where(is_leaf, np.inf, nodes['num_threshold']).astype(np.float64))
+                children.append(tree_children + offset)
+                values.append(nodes['value'].astype(np.float64))
+                roots.append(offset)
+                max_depth = max(max_depth, int(nodes['depth'].max()))
+                offset += len(nodes)
+        
+        trees = CompiledForest(
+            feature=np.concatenate(features),
+            threshold=np.concatenate(thresholds),
+            children=np.concatenate(children),
+            value=np.concatenate(values)[:, np.newaxis],
+            roots=np.array(roots, dtype=np.int32),
+            max_depth=max_depth,
+        )
+        return cls(trees, np.asarray(model._baseline_prediction, dtype=np.float64).ravel(), np.asarray(model.classes_))
+    
+    def save(self, directory):
+        self.trees.save(directory)
+        np.save(os.path.join(directory, "baseline.npy"), self.baseline)
+        np.save(os.path.join(directory, "classes.npy"), self.classes)
+    
+    @classmethod
+    def load(cls, directory, mmap_mode="r"):
+        return cls(
+            CompiledForest.load(directory, mmap_mode=mmap_mode),
+            np.load(os.path.join(directory, "baseline.npy")),
+            np.load(os.path.join(directory, "classes.npy"))
+        )
+    
+    @property
+    def n_estimators(self):
+        return self.trees.n_estimators
+    
+    @property
+    def nbytes(self):
+        return self.trees.nbytes + int(self.baseline.nbytes)
+    
+    def decision_function(self, X):
+        leaves = self.trees.apply(X)
+        per_tree = self.trees.value[leaves, 0]
+        n_outputs = len(self.baseline)
+        raw = per_tree.reshape(-1, n_outputs, per_tree.shape[1]).sum(axis=0).T
+        return raw + self.baseline
+    
+    def predict_proba(self, X):
+        raw = self.decision_function(X)
+        if raw.shape[1] == 1:
+            raw = np.hstack([np.zeros_like(raw), raw])
+        return _softmax(raw)
+    
+    def predict_with_proba(self, X):
+        proba = self.predict_proba(X)
+        return self.classes[proba.argmax(axis=1)], proba
+    
+    def predict(self, X):
+        return self.predict_with_proba(X)[0]
+
+def _fit_random_forest(X, y, params):
+    from sklearn.ensemble import RandomForestClassifier
+    from models.train_classifier import CLASSIFIER_PARAMS
+    
+    return RandomForestClassifier(**{**CLASSIFIER_PARAMS, **params}, random_state=42, n_jobs=-1).fit(X, y)
+
+def _fit_logistic_regression(X, y, params):
+    from sklearn.pipeline import make_pipeline
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.linear_model import LogisticRegression
+    
+    return make_pipeline(StandardScaler(), LogisticRegression(**{'C': 0.1, 'max_iter': 1000, **params})).fit(X, y)
+
+def _fit_nearest_centroid(X, y, params):
+    from sklearn.pipeline import make_pipeline
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.neighbors import NearestCentroid
+    
+    return make_pipeline(StandardScaler(), NearestCentroid(**params)).fit(X, y)
+
+def _fit_hist_gradient_boosting(X, y, params):
+    from sklearn.ensemble import HistGradientBoostingClassifier
+    
+    # Kept small: one tree per class per iteration makes this the slowest
+    # family to fit on ~1,900 features.
+    defaults = {'max_iter': 30, 'max_leaf_nodes': 15, 'learning_rate': 0.2, 'early_stopping': False, 'random_state': 42}
+    return HistGradientBoostingClassifier(**{**defaults, **params}).fit(X, y)
+
+class Backend:
+    def __init__(self, name, fit, compile, engine, model_type, description):
+        self.name = name
+        self.fit = fit
+        self.compile = compile
+        self.engine = engine
+        self.model_type = model_type
+        self.description = description
+
+BACKENDS = {}
+
+def register_backend(name, fit, compile, engine, model_type, description=""):
+    # fit(X, y, params) returns an sklearn model, compile(model) its engine;
+    # model_type is the class name of the (final) sklearn estimator.
+    BACKENDS[name] = Backend(name, fit, compile, engine, model_type, description)
+
+register_backend("random_forest", _fit_random_forest, CompiledForest.from_sklearn, CompiledForest,
+                 "RandomForestClassifier", "RandomForest")
+register_backend("logistic_regression", _fit_logistic_regression, LinearModel.from_logistic, LinearModel,
+                 "LogisticRegression", "logistic regression")
+register_backend("nearest_centroid", _fit_nearest_centroid, LinearModel.from_nearest_centroid, LinearModel,
+                 "NearestCentroid", "nearest centroid")
+register_backend("hist_gradient_boosting", _fit_hist_gradient_boosting, BoostedTrees.from_sklearn, BoostedTrees,
+                 "HistGradientBoostingClassifier", "histogram gradient boosting")
+
+DEFAULT_BACKEND = "random_forest"
+
+def get_backend(name):
+    try:
+        return BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown classifier backend {name!r}; choose from {', '.join(sorted(BACKENDS))}")
+
+def backend_of(model):
+    estimator = model.steps[-1][1] if hasattr(model, 'steps') else model
+    for backend in BACKENDS.values():
+        if type(estimator).__name__ == backend.model_type:
+            return backend
+    raise ValueError(f"No classifier backend for {type(estimator).__name__}")
+
+def compile_model(model):
+    return backend_of(model).compile(model)
+
+ENGINES = {engine.__name__: engine for engine in (CompiledForest, LinearModel, BoostedTrees)}
+
+def save_engine(engine, directory):
+    # Records the engine class next to its arrays so load_engine can
+    # dispatch without knowing which backend produced it.
+    engine.save(directory)
+    with open(os.path.join(directory, "engine.json"), "w") as f:
+        json.dump({"engine": type(engine).__name__}, f)
+
+def load_engine(directory, mmap_mode="r"):
+    # Directories written before backends existed hold a CompiledForest.
+    path = os.path.join(directory, "engine.json")
+    name = CompiledForest.__name__
+    if os.path.exists(path):
+        with open(path) as f:
+            name = json.load(f)["engine"]
+    if name not in ENGINES:
+        raise ValueError(f"Unknown classifier engine {name!r}")
+    return ENGINES[name].load(directory, mmap_mode=mmap_mode)
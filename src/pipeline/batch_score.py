@@ -0,0 +1,275 @@
+import os
+import sys
+import csv
+import glob
+import json
+import time
+import argparse
+import itertools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data.preprocess import image_to_array
+from pipeline.predict import NutritionPredictor, NUTRITION_FIELDS
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+COLUMNS = ('path', 'food_type', 'confidence') + NUTRITION_FIELDS + ('error',)
+CHECKPOINT_VERSION = 1
+
+def iter_directory(directory):
+    # Sorted walk, so every run sees the same order and a checkpoint can
+    # record progress as a count of inputs.
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                yield os.path.join(root, name)
+
+def iter_manifest(manifest, path_column='image_path'):
+    # A .csv manifest is read by column (the dataset CSV works as is), any
+    # other file as one path per line. Relative paths are taken relative to
+    # the manifest.
+    base = os.path.dirname(os.path.abspath(manifest))
+    with open(manifest, newline='') as f:
+        if manifest.endswith('.csv'):
+            rows = (row[path_column] for row in csv.DictReader(f))
+        else:
+            rows = (line.strip() for line in f)
+        for path in rows:
+            if path and not path.startswith('#'):
+                yield os.path.join(base, path)
+
+def iter_inputs(source, path_column='image_path'):
+    if os.path.isdir(source):
+        return iter_directory(source)
+    return iter_manifest(source, path_column)
+
+def decode_chunk(paths, precision):
+    arrays, errors = [], {}
+    for i, path in enumerate(paths):
+        try:
+            arrays.append(image_to_array(path, precision))
+        except Exception as e:
+            errors[i] = f"{type(e).__name__}: {e}"
+    return paths, arrays, errors
+
+def decoded_chunks(paths, chunk_size, workers, precision):
+    # Decoding runs on a thread pool with at most 2 * workers chunks in
+    # flight, so memory stays bounded however long the input is, while the
+    # caller extracts features and runs the forest on the finished chunks.
+    in_flight = deque()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="decode") as pool:
+        while True:
+            while len(in_flight) < 2 * workers:
+                chunk = list(itertools.islice(paths, chunk_size))
+                if not chunk:
+                    break
+                in_flight.append(pool.submit(decode_chunk, chunk, precision))
+            if not in_flight:
+                return
+            yield in_flight.popleft().result()
+
+def score_chunk(predictor, paths, arrays, errors):
+    food_types, confidences = predictor.predict_food_batch(arrays)
+    scored = iter(zip(food_types, confidences))
+    rows = []
+    for i, path in enumerate(paths):
+        row = dict.fromkeys(COLUMNS, '')
+        row['path'] = path
+        if i in errors:
+            row['error'] = errors[i]
+            rows.append(row)
+            continue
+        
+        food_type, confidence = next(scored)
+        nutrition = predictor.get_nutrition_info(food_type) if food_type is not None else None
+        if nutrition is None:
+            row['error'] = "Could not classify food image"
+        else:
+            row['food_type'] = food_type
+            row['confidence'] = round(float(confidence), 6)
+            for field in NUTRITION_FIELDS:
+                row[field] = round(float(nutrition[field]), 4)
+        rows.append(row)
+    return rows
+
+class CsvOutput:
+    # Rows are appended as they are scored. The checkpoint records the file
+    # size, and a resumed run truncates back to it to drop rows written
+    # after the last checkpoint.
+    
+    def __init__(self, path, state=None):
+        self.path = path
+        if state is None:
+            self.f = open(path, 'w', newline='')
+            csv.writer(self.f).writerow(COLUMNS)
+        else:
+            self.f = open(path, 'r+', newline='')
+            self.f.truncate(state['bytes'])
+            self.f.seek(state['bytes'])
+        self.writer = csv.DictWriter(self.f, fieldnames=COLUMNS)
+    
+    def write(self, rows):
+        self.writer.writerows(rows)
+    
+    def flush(self):
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        return {'bytes': self.f.tell()}
+    
+    def close(self):
+        self.f.close()
+
+class ParquetOutput:
+    # Parquet files cannot be appended to, so the output is a directory of
+    # part files, one per checkpoint. A resumed run deletes parts newer than
+    # its checkpoint.
+    
+    def __init__(self, path, state=None):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise SystemExit("Parquet output needs pyarrow (pip install pyarrow), or use a .csv output")
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.path = path
+        self.parts = 0 if state is None else state['parts']
+        self.rows = []
+        self.schema = pyarrow.schema([
+            (column, pyarrow.string() if column in ('path', 'food_type', 'error') else pyarrow.float64())
+            for column in COLUMNS
+        ])
+        
+        os.makedirs(path, exist_ok=True)
+        for part in glob.glob(os.path.join(path, "part-*.parquet")):
+            if state is None or int(os.path.basename(part)[5:10]) >= self.parts:
+                os.remove(part)
+    
+    def write(self, rows):
+        self.rows.extend(rows)
+    
+    def flush(self):
+        if self.rows:
+            # An explicit schema keeps every part identical, including parts
+            # where a column happens to be all empty.
+            columns = {
+                column: [None if row[column] == '' else row[column] for row in self.rows]
+                for column in COLUMNS
+            }
+            table = self.pa.Table.from_pydict(columns, schema=self.schema)
+            part = os.path.join(self.path, f"part-{self.parts:05d}.parquet")
+            self.pq.write_table(table, part + ".tmp")
+            os.replace(part + ".tmp", part)
+            self.parts += 1
+            self.rows = []
+        return {'parts': self.parts}
+    
+    def close(self):
+        pass
+
+def output_format(path, requested=None):
+    if requested:
+        return requested
+    return 'parquet' if path.endswith(('.parquet', '.pq')) else 'csv'
+
+def read_checkpoint(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def write_checkpoint(path, checkpoint):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp_path, path)
+
+def score(source, output, fmt=None, checkpoint_path=None, checkpoint_every=10000, chunk_size=64,
+          workers=4, precision=None, restart=False, path_column='image_path', predictor=None):
+    fmt = output_format(output, fmt)
+    checkpoint_path = checkpoint_path or output.rstrip(os.sep) + ".checkpoint.json"
+    
+    predictor = predictor or NutritionPredictor(precision, shared_models=True)
+    if not predictor.models_loaded:
+        raise SystemExit("Models not found. Run train_models.py first.")
+    # Images are decoded at the precision the loaded models use. The model
+    # is part of the job, so a resume after retraining cannot mix models.
+    precision = predictor.precision
+    job = {'source': os.path.abspath(source), 'output': os.path.abspath(output), 'format': fmt, 'precision': precision,
+           'model': predictor.model_id}
+    
+    checkpoint = None if restart else read_checkpoint(checkpoint_path)
+    if checkpoint is not None:
+        if checkpoint.get('version') != CHECKPOINT_VERSION or checkpoint['job'] != job:
+            raise SystemExit(f"{checkpoint_path} belongs to a different job; pass --restart to start over")
+        if checkpoint['complete']:
+            print(f"Already complete: {checkpoint['done']} images in {output}")
+            return checkpoint
+        print(f"Resuming after {checkpoint['done']} images")
+    else:
+        checkpoint = {'version': CHECKPOINT_VERSION, 'job': job, 'done': 0, 'errors': 0,
+                      'elapsed_s': 0.0, 'output': None, 'complete': False}
+    
+    writer = (ParquetOutput if fmt == 'parquet' else CsvOutput)(output, checkpoint['output'])
+    paths = itertools.islice(iter_inputs(source, path_column), checkpoint['done'], None)
+    
+    start = time.perf_counter()
+    elapsed_before = checkpoint['elapsed_s']
+    done_before = checkpoint['done']
+    since_checkpoint = 0
+    
+    def save(complete=False):
+        checkpoint['output'] = writer.flush()
+        checkpoint['elapsed_s'] = elapsed_before + time.perf_counter() - start
+        checkpoint['complete'] = complete
+        write_checkpoint(checkpoint_path, checkpoint)
+        scored = checkpoint['done'] - done_before
+        rate = scored / max(time.perf_counter() - start, 1e-9)
+        print(f"{checkpoint['done']} images ({checkpoint['errors']} errors), {rate:.1f} images/s")
+    
+    try:
+        for chunk_paths, arrays, errors in decoded_chunks(paths, chunk_size, workers, precision):
+            rows = score_chunk(predictor, chunk_paths, arrays, errors)
+            writer.write(rows)
+            checkpoint['done'] += len(rows)
+            checkpoint['errors'] += sum(1 for row in rows if row['error'])
+            since_checkpoint += len(rows)
+            if since_checkpoint >= checkpoint_every:
+                save()
+                since_checkpoint = 0
+        save(complete=True)
+    except KeyboardInterrupt:
+        print("Interrupted; rerun the same command to resume from the last checkpoint")
+        raise SystemExit(130)
+    finally:
+        writer.close()
+    return checkpoint
+
+def main():
+    parser = argparse.ArgumentParser(description="Score a directory or manifest of food images to CSV or Parquet")
+    parser.add_argument("source", help="Image directory (searched recursively) or manifest (.csv or one path per line)")
+    parser.add_argument("output", help="Output .csv file, or .parquet directory of part files")
+    parser.add_argument("--format", choices=["csv", "parquet"], help="Default: from the output extension")
+    parser.add_argument("--path-column", default="image_path", help="Path column of a .csv manifest")
+    parser.add_argument("--checkpoint", help="Default: <output>.checkpoint.json")
+    parser.add_argument("--checkpoint-every", type=int, default=10000, help="Images between checkpoints")
+    parser.add_argument("--chunk-size", type=int, default=64, help="Images per predict_food_batch call")
+    parser.add_argument("--workers", type=int, default=4, help="Decode threads")
+    parser.add_argument("--precision", choices=["float64", "float32"],
+                        help="Feature precision; default: the one the model bundle was built with")
+    parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint and start over")
+    args = parser.parse_args()
+    
+    checkpoint = score(
+        args.source, args.output, args.format, args.checkpoint, args.checkpoint_every,
+        args.chunk_size, args.workers, args.precision, args.restart, args.path_column
+    )
+    rate = checkpoint['done'] / max(checkpoint['elapsed_s'], 1e-9)
+    print(f"Scored {checkpoint['done']} images in {checkpoint['elapsed_s']:.1f}s "
+          f"({rate:.1f} images/s overall) -> {args.output}")
+
+if __name__ == "__main__":
+    main()
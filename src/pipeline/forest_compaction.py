@@ -0,0 +1,322 @@
+import os
+import sys
+import shutil
+import tempfile
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import MODELS_DIR, MODEL_BUNDLE_DIR, PRECISION
+from pipeline.forest_engine import CompiledForest
+from pipeline.timing import timed, single_row_latency
+
+# Narrowest first; each is kept only if the model stays within budget.
+VALUE_DTYPES = (np.float16, np.float32, np.float64)
+THRESHOLD_DTYPES = (np.float16, np.float32)
+
+def tree_ranges(forest):
+    # from_sklearn and rebuild() both lay each tree out contiguously, root first.
+    ends = np.append(forest.roots[1:], forest.n_nodes)
+    return list(zip(forest.roots.tolist(), ends.tolist()))
+
+def _leaf_values(forest, start, stop):
+    if forest.value_index is None:
+        return forest.value[start:stop]
+    return forest.value[forest.value_index[start:stop]]
+
+def rebuild(forest, trees=None, value_dtype=np.float64, threshold_dtype=np.float32):
+    # Copies the selected trees with leaf values cast to value_dtype. Any
+    # split whose two children are leaves with identical (cast) values is
+    # turned into a leaf, repeatedly, and identical leaf rows across the
+    # whole forest are stored once behind value_index. The merges are exact
+    # for the cast values, so they never change a prediction.
+    ranges = tree_ranges(forest)
+    if trees is None:
+        trees = range(len(ranges))
+    
+    features, thresholds, children, node_values, roots = [], [], [], [], []
+    table, table_index = [], {}
+    max_depth = 0
+    offset = 0
+    for tree in trees:
+        start, stop = ranges[tree]
+        local_children = forest.children[start:stop] - start
+        values = np.ascontiguousarray(_leaf_values(forest, start, stop), dtype=value_dtype)
+        is_leaf = local_children[:, 0] == np.arange(stop - start)
+        
+        # sklearn numbers children after their parent, so a reverse sweep
+        # sees both children before the node itself.
+        for node in range(stop - start - 1, -1, -1):
+            if is_leaf[node]:
+                continue
+            left, right = local_children[node]
+            if is_leaf[left] and is_leaf[right] and values[left].tobytes() == values[right].tobytes():
+                is_leaf[node] = True
+                values[node] = values[left]
+        
+        order, depths = [0], [0]
+        new_id = {0: 0}
+        i = 0
+        while i < len(order):
+            node = order[i]
+            if not is_leaf[node]:
+                for child in local_children[node]:
+                    new_id[int(child)] = len(order)
+                    order.append(int(child))
+                    depths.append(depths[i] + 1)
+            i += 1
+        
+        order = np.array(order)
+        tree_children = np.empty((len(order), 2), dtype=np.int32)
+        tree_value_index = np.empty(len(order), dtype=np.int32)
+        for i, node in enumerate(order):
+            if is_leaf[node]:
+                tree_children[i] = i
+                key = values[node].tobytes()
+                if key not in table_index:
+                    table_index[key] = len(table)
+                    table.append(values[node])
+                tree_value_index[i] = table_index[key]
+            else:
+                tree_children[i] = [new_id[int(child)] for child in local_children[node]]
+                tree_value_index[i] = 0
+        
+        leaf = is_leaf[order]
+        tree_threshold = forest.threshold[start:stop][order].astype(np.float64)
+        tree_threshold[leaf] = np.inf
+        features.append(np.where(leaf, 0, forest.feature[start:stop][order]).astype(np.int32))
+        thresholds.append(tree_threshold.astype(threshold_dtype))
+        children.append(tree_children + offset)
+        node_values.append(tree_value_index)
+        roots.append(offset)
+        max_depth = max(max_depth, max(depths))
+        offset += len(order)
+    
+    return CompiledForest(
+        feature=np.concatenate(features),
+        threshold=np.concatenate(thresholds),
+        children=np.concatenate(children),
+        value=np.array(table, dtype=value_dtype),
+        roots=np.array(roots, dtype=np.int32),
+        max_depth=max_depth,
+        classes=forest.classes,
+        value_index=np.concatenate(node_values),
+    )
+
+def tree_outputs(forest, X):
+    # Per-tree leaf values, shape (n_trees, n_samples, n_outputs), so the
+    # effect of dropping any tree can be scored without re-running the forest.
+    leaves = forest.apply(X)
+    if forest.value_index is not None:
+        leaves = forest.value_index[leaves]
+    return forest.value[leaves].astype(np.float64)
+
+def _loss(summed, n_trees, classes, y):
+    # Classification error or MAE of summed per-tree outputs; summed may
+    # carry leading axes (one per candidate forest).
+    if classes is not None:
+        return np.mean(classes[summed.argmax(axis=-1)] != y, axis=-1)
+    return np.mean(np.abs(summed[..., 0] / n_trees - y), axis=-1)
+
+def evaluate(forest, X, y):
+    if forest.classes is not None:
+        return float(np.mean(forest.predict(X) != y))
+    return float(np.mean(np.abs(forest.predict(X) - y)))
+
+def elimination_order(forest, X, y, min_trees):
+    # Greedy backward elimination: repeatedly drop the tree whose removal
+    # leaves the lowest loss on (X, y).
+    outputs = tree_outputs(forest, X)
+    keep = list(range(forest.n_estimators))
+    total = outputs.sum(axis=0)
+    order = []
+    while len(keep) > min_trees:
+        without = total[np.newaxis] - outputs[keep]
+        best = int(np.argmin(_loss(without, len(keep) - 1, forest.classes, y)))
+        total = without[best]
+        order.append(keep.pop(best))
+    return order
+
+def prefix_losses(forest, X, y, order):
+    # Loss after dropping each prefix of order.
+    outputs = tree_outputs(forest, X)
+    total = outputs.sum(axis=0)
+    losses = []
+    for n_dropped, tree in enumerate(order, 1):
+        total = total - outputs[tree]
+        losses.append(float(_loss(total, forest.n_estimators - n_dropped, forest.classes, y)))
+    return losses
+
+def compact(forest, X, y, allowed, min_trees=10, seed=0, log=print):
+    # allowed(loss) is the highest loss (classification error or MAE) the
+    # compacted forest may have where the original forest has loss.
+    X = np.asarray(X, dtype=np.float32)
+    limit = allowed(evaluate(forest, X, y))
+    compacted = rebuild(forest)
+    log(f"  merge leaves: {forest.n_nodes} -> {compacted.n_nodes} nodes, "
+        f"{len(compacted.value)} distinct leaf values, loss {evaluate(compacted, X, y):.4f}")
+    
+    for value_dtype in VALUE_DTYPES:
+        candidate = rebuild(forest, value_dtype=value_dtype)
+        loss = evaluate(candidate, X, y)
+        if loss <= limit:
+            compacted = candidate
+            log(f"  leaf values as {np.dtype(value_dtype).name}: loss {loss:.4f}")
+            break
+    
+    for threshold_dtype in THRESHOLD_DTYPES:
+        candidate = rebuild(forest, value_dtype=compacted.value.dtype, threshold_dtype=threshold_dtype)
+        loss = evaluate(candidate, X, y)
+        if loss <= limit:
+            compacted = candidate
+            log(f"  thresholds as {np.dtype(threshold_dtype).name}: loss {loss:.4f}")
+            break
+    
+    # Trees are chosen on one half of the data and the cut is confirmed on
+    # the other, so the selection cannot simply overfit the split it is
+    # judged on. Both halves must stay within budget.
+    halves = np.array_split(np.random.default_rng(seed).permutation(len(y)), 2)
+    order = elimination_order(compacted, X[halves[0]], y[halves[0]], min_trees)
+    checks = [
+        (prefix_losses(compacted, X[half], y[half], order), allowed(evaluate(forest, X[half], y[half])))
+        for half in halves
+    ]
+    n_drop = 0
+    for n in range(len(order), 0, -1):
+        if all(losses[n - 1] <= half_limit for losses, half_limit in checks):
+            n_drop = n
+            break
+    
+    if n_drop:
+        keep = sorted(set(range(compacted.n_estimators)) - set(order[:n_drop]))
+        compacted = rebuild(compacted, keep, compacted.value.dtype, compacted.threshold.dtype)
+        log(f"  drop trees: {forest.n_estimators} -> {compacted.n_estimators}, loss {evaluate(compacted, X, y):.4f}")
+    return compacted
+
+def measure(forest, X, y, repeats=5):
+    directory = tempfile.mkdtemp(prefix="forest-")
+    try:
+        forest.save(directory)
+        on_disk = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+        load_s = min(timed(lambda: CompiledForest.load(directory, mmap_mode=None)) for _ in range(repeats))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    
+    latency_p50_s, = single_row_latency(forest.predict, np.asarray(X[:200], dtype=np.float32), percentiles=(50,))
+    return {
+        'loss': evaluate(forest, X, y),
+        'trees': forest.n_estimators,
+        'nodes': forest.n_nodes,
+        'bytes': on_disk,
+        'load_s': load_s,
+        'latency_p50_s': latency_p50_s,
+    }
+
+def print_report(name, loss_name, rows):
+    print(f"\n{name:<24} {loss_name:>8} {'trees':>6} {'nodes':>8} {'size KB':>9} {'load ms':>8} {'p50 us':>8}")
+    for label, row in rows:
+        print(f"  {label:<22} {row['loss']:>8.4f} {row['trees']:>6} {row['nodes']:>8} {row['bytes'] / 1024:>9.1f} "
+              f"{row['load_s'] * 1000:>8.2f} {row['latency_p50_s'] * 1e6:>8.1f}")
+
+def joblib_measure(path, repeats=3):
+    import joblib
+    return os.path.getsize(path), min(timed(lambda: joblib.load(path)) for _ in range(repeats))
+
+def classifier_validation(precision=PRECISION, packed=False):
+    # The held-out split train_food_classifier evaluates on.
+    from sklearn.model_selection import train_test_split
+    from sklearn.preprocessing import LabelEncoder
+    from models.train_classifier import load_features
+    
+    X, y = load_features(packed=packed, precision=precision)
+    y_encoded = LabelEncoder().fit_transform(y)
+    _, X_test, _, y_test = train_test_split(X, y_encoded, test_size=0.2, random_state=42, stratify=y_encoded)
+    return X_test, y_test
+
+def regressor_validation(packed=False):
+    # The held-out split train_calorie_regressor evaluates on.
+    import pandas as pd
+    from sklearn.model_selection import train_test_split
+    from config import PROCESSED_DATA_DIR, PACKED_DATA_DIR
+    from data.packed_dataset import PackedDataset
+    from models.train_calorie_model import create_nutrition_features
+    
+    if packed:
+        df = PackedDataset(PACKED_DATA_DIR).records
+    else:
+        df = pd.read_csv(os.path.join(PROCESSED_DATA_DIR, "nutrition_dataset.csv"))
+    X, _ = create_nutrition_features(df)
+    _, X_test, _, y_test = train_test_split(X, df['calories'].values, test_size=0.2, random_state=42)
+    return X_test, y_test
+
+def compact_models(classifier, regressor, max_accuracy_drop=0.005, max_mae_increase=0.02,
+                   min_trees=10, precision=PRECISION, classifier_data=None, regressor_data=None, packed=False):
+    # Returns compacted CompiledForests for write_bundle. The classifier may
+    # lose at most max_accuracy_drop accuracy (absolute) and the regressor's
+    # MAE may grow by at most max_mae_increase (relative) on the held-out
+    # splits the trainers report on, read from the packed dataset when
+    # packed=True as the trainers do. Only forests are compacted; a classifier
+    # of another backend is left out of the result.
+    from pipeline.backends import backend_of
+    
+    compacted = {}
+    if classifier is not None and backend_of(classifier).name != "random_forest":
+        print(f"The {backend_of(classifier).name} classifier is not a forest; leaving it as is")
+    elif classifier is not None:
+        X, y = classifier_data or classifier_validation(precision, packed)
+        forest = CompiledForest.from_sklearn(classifier)
+        base = evaluate(forest, X, y)
+        print(f"Compacting classifier (accuracy {1 - base:.4f}, may drop to {1 - base - max_accuracy_drop:.4f})")
+        compacted['classifier'] = (forest, compact(forest, X, y, lambda loss: loss + max_accuracy_drop, min_trees), X, y)
+    if regressor is not None:
+        X, y = regressor_data or regressor_validation(packed)
+        forest = CompiledForest.from_sklearn(regressor)
+        base = evaluate(forest, X, y)
+        print(f"Compacting regressor (MAE {base:.2f}, may rise to {base * (1 + max_mae_increase):.2f})")
+        compacted['regressor'] = (forest, compact(forest, X, y, lambda loss: loss * (1 + max_mae_increase), min_trees), X, y)
+    
+    for name, (forest, small, X, y) in compacted.items():
+        X = np.asarray(X, dtype=np.float32)
+        loss_name = "error" if forest.classes is not None else "MAE"
+        print_report(name, loss_name, [("compiled", measure(forest, X, y)), ("compacted", measure(small, X, y))])
+    return {name: small for name, (_, small, _, _) in compacted.items()}
+
+def main():
+    import joblib
+    from data.preprocess import feature_params
+    from pipeline.model_bundle import write_bundle, source_stamps, JOBLIB_FILES
+    
+    parser = argparse.ArgumentParser(description="Compact the trained forests within an accuracy/MAE budget and write the model bundle")
+    parser.add_argument("--max-accuracy-drop", type=float, default=0.005,
+                        help="Largest allowed classifier accuracy loss (absolute)")
+    parser.add_argument("--max-mae-increase", type=float, default=0.02,
+                        help="Largest allowed regressor MAE increase (relative)")
+    parser.add_argument("--min-trees", type=int, default=10,
+                        help="Keep at least this many trees so confidences stay averaged over an ensemble")
+    parser.add_argument("--precision", choices=["float64", "float32"], default=PRECISION,
+                        help="Feature precision the models were trained with")
+    parser.add_argument("--packed", action="store_true", help="Validate on the packed dataset")
+    parser.add_argument("--dry-run", action="store_true", help="Report without writing the bundle")
+    args = parser.parse_args()
+    
+    paths = {name: os.path.join(MODELS_DIR, filename) for name, filename in JOBLIB_FILES.items()}
+    models = {name: joblib.load(path) if os.path.exists(path) else None for name, path in paths.items()}
+    for name in ('classifier', 'regressor'):
+        if models[name] is not None:
+            size, load_s = joblib_measure(paths[name])
+            print(f"{JOBLIB_FILES[name]}: {size / 1024:.1f} KB, joblib load {load_s * 1000:.1f} ms")
+    
+    compacted = compact_models(
+        models['classifier'], models['regressor'], args.max_accuracy_drop, args.max_mae_increase,
+        args.min_trees, args.precision, packed=args.packed
+    )
+    if not args.dry_run:
+        manifest = write_bundle(
+            compacted.get('classifier', models['classifier']), models['label_encoder'],
+            compacted.get('regressor', models['regressor']), models['food_encoder'],
+            feature_params(args.precision), sources=source_stamps(MODELS_DIR)
+        )
+        print(f"\nCompacted model bundle {manifest['bundle_id']} written to {MODEL_BUNDLE_DIR}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+import os
+import json
+import numpy as np
+
+LEAF = -1
+ARRAY_FIELDS = ('feature', 'threshold', 'children', 'value', 'roots')
+# Only present in compacted forests (see forest_compaction.py).
+OPTIONAL_ARRAY_FIELDS = ('value_index',)
+
+def _float32_floor(threshold):
+    # x <= t and x <= floor32(t) agree for every float32 x, so rounding the
+    # split thresholds down keeps the traversal identical to sklearn's.
+    threshold32 = threshold.astype(np.float32)
+    rounded_up = threshold32.astype(np.float64) > threshold
+    threshold32[rounded_up] = np.nextafter(threshold32[rounded_up], np.float32(-np.inf))
+    return threshold32
+
+class CompiledForest:
+    # value holds one row per node, or with value_index set, one row per
+    # distinct leaf value that value_index maps each node to.
+    
+    def __init__(self, feature, threshold, children, value, roots, max_depth, classes=None, value_index=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.value = value
+        self.roots = roots
+        self.max_depth = max_depth
+        self.classes = classes
+        self.value_index = value_index
+    
+    @classmethod
+    def from_sklearn(cls, forest):
+        is_classifier = hasattr(forest, 'classes_')
+        
+        features, thresholds, children, values, roots = [], [], [], [], []
+        max_depth = 0
+        offset = 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            node_ids = np.arange(n_nodes, dtype=np.int32)
+            is_leaf = tree.children_left == LEAF
+            
+            tree_children = np.empty((n_nodes, 2), dtype=np.int32)
+            tree_children[:, 0] = np.where(is_leaf, node_ids, tree.children_left)
+            tree_children[:, 1] = np.where(is_leaf, node_ids, tree.children_right)
+            
+            value = tree.value[:, 0, :].astype(np.float64)
+            # Older scikit-learn stores class counts and normalises them in
+            # predict_proba; newer versions store the fractions, which must
+            # not be divided again or the last bit can differ.
+            if is_classifier and not np.allclose(value.sum(axis=1), 1.0):
+                normalizer = value.sum(axis=1, keepdims=True)
+                normalizer[normalizer == 0.0] = 1.0
+                value = value / normalizer
+            
+            features.append(np.where(is_leaf, 0, tree.feature).astype(np.int32))
+            thresholds.append(_float32_floor(np.where(is_leaf, np.inf, tree.threshold)))
+            children.append(tree_children + offset)
+            values.append(value)
+            roots.append(offset)
+            max_depth = max(max_depth, tree.max_depth)
+            offset += n_nodes
+        
+        return cls(
+            feature=np.concatenate(features),
+            threshold=np.concatenate(thresholds),
+            children=np.concatenate(children),
+            value=np.concatenate(values),
+            roots=np.array(roots, dtype=np.int32),
+            max_depth=max_depth,
+            classes=np.asarray(forest.classes_) if is_classifier else None
+        )
+    
+    def save(self, directory):
+        # One .npy per array so load() can memory-map them; processes that map
+        # the same files share the pages instead of holding private copies.
+        os.makedirs(directory, exist_ok=True)
+        for name in ARRAY_FIELDS + OPTIONAL_ARRAY_FIELDS:
+            if getattr(self, name) is not None:
+                np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+        if self.classes is not None:
+            np.save(os.path.join(directory, "classes.npy"), self.classes)
+        with open(os.path.join(directory, "meta.json"), "w") as f:
+            json.dump({
+                "max_depth": int(self.max_depth),
+                "is_classifier": self.classes is not None,
+                "compacted": self.value_index is not None,
+            }, f, indent=2)
+    
+    @classmethod
+    def load(cls, directory, mmap_mode="r"):
+        with open(os.path.join(directory, "meta.json")) as f:
+            meta = json.load(f)
+        arrays = {
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode)
+            for name in ARRAY_FIELDS
+        }
+        if meta.get("compacted"):
+            arrays['value_index'] = np.load(os.path.join(directory, "value_index.npy"), mmap_mode=mmap_mode)
+        classes = np.load(os.path.join(directory, "classes.npy")) if meta["is_classifier"] else None
+        return cls(max_depth=meta["max_depth"], classes=classes, **arrays)
+    
+    @property
+    def n_estimators(self):
+        return len(self.roots)
+    
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+    
+    def apply(self, X):
+        # Compared in float32 like sklearn's trees, unless the thresholds
+        # are float64 (boosted trees, which split the float64 input).
+        X = np.asarray(X, dtype=np.float64 if self.threshold.dtype == np.float64 else np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        
+        rows = np.arange(X.shape[0])
+        nodes = np.repeat(self.roots[:, np.newaxis], X.shape[0], axis=1)
+        for _ in range(self.max_depth):
+            go_right = X[rows, self.feature[nodes]] > self.threshold[nodes]
+            nodes = self.children[nodes, go_right.view(np.int8)]
+        
+        return nodes
+    
+    @property
+    def nbytes(self):
+        return int(sum(
+            getattr(self, name).nbytes for name in ARRAY_FIELDS + OPTIONAL_ARRAY_FIELDS
+            if getattr(self, name) is not None
+        ))
+    
+    def _accumulate(self, X):
+        leaves = self.apply(X)
+        if self.value_index is not None:
+            leaves = self.value_index[leaves]
+        # cumsum adds tree by tree in order, so the averages match sklearn's
+        # forest accumulation bit for bit. Compacted float16/float32 leaf
+        # values are still summed in float64.
+        total = np.cumsum(self.value[leaves], axis=0, dtype=np.float64)[-1]
+        return total / self.n_estimators
+    
+    def predict_proba(self, X):
+        return self._accumulate(X)
+    
+    def predict_with_proba(self, X):
+        proba = self._accumulate(X)
+        return self.classes[proba.argmax(axis=1)], proba
+    
+    def predict(self, X):
+        if self.classes is None:
+            return self._accumulate(X)[:, 0]
+        return self.predict_with_proba(X)[0]
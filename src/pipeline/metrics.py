@@ -0,0 +1,285 @@
+import os
+import sys
+import time
+import json
+import bisect
+import threading
+from collections import Counter, deque
+
+# Latency buckets in seconds, Prometheus-style upper bounds.
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+    
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+    
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation.
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+class _StageTimer:
+    __slots__ = ('registry', 'name', 'start')
+    
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.name = name
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.registry.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+class MetricsRegistry:
+    # Disabled by default. While disabled, stage() hands back one shared
+    # no-op context manager and count()/observe_batch() return immediately,
+    # so the instrumented hot path costs a function call and a flag check.
+    
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        with self._lock:
+            self.stages = {}
+            self.counters = Counter()
+            self.batch_sizes = Histogram(BATCH_BUCKETS)
+            self.started = time.time()
+    
+    def enable(self):
+        self.enabled = True
+    
+    def disable(self):
+        self.enabled = False
+    
+    def stage(self, name):
+        if not self.enabled:
+            return _NULL_TIMER
+        return _StageTimer(self, name)
+    
+    def observe(self, name, seconds):
+        with self._lock:
+            histogram = self.stages.get(name)
+            if histogram is None:
+                histogram = self.stages[name] = Histogram(LATENCY_BUCKETS)
+            histogram.observe(seconds)
+    
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] += n
+    
+    def observe_batch(self, size):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.batch_sizes.observe(size)
+    
+    def snapshot(self):
+        with self._lock:
+            return {
+                'uptime_s': time.time() - self.started,
+                'stages': {
+                    name: {
+                        'count': h.count,
+                        'sum_s': h.sum,
+                        'mean_s': h.sum / h.count if h.count else 0.0,
+                        'p50_s': h.quantile(0.5),
+                        'p95_s': h.quantile(0.95),
+                        'p99_s': h.quantile(0.99),
+                    }
+                    for name, h in sorted(self.stages.items())
+                },
+                'counters': dict(self.counters),
+                'batch_size': {'count': self.batch_sizes.count, 'sum': self.batch_sizes.sum},
+            }
+    
+    def to_prometheus(self):
+        lines = []
+        with self._lock:
+            lines.append("# HELP nutrition_stage_seconds Time spent per pipeline stage.")
+            lines.append("# TYPE nutrition_stage_seconds histogram")
+            for name, h in sorted(self.stages.items()):
+                _histogram_lines(lines, "nutrition_stage_seconds", f'stage="{name}"', h)
+            
+            lines.append("# HELP nutrition_batch_size Images per predict_batch call.")
+            lines.append("# TYPE nutrition_batch_size histogram")
+            _histogram_lines(lines, "nutrition_batch_size", "", self.batch_sizes)
+            
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"# TYPE nutrition_{name}_total counter")
+                lines.append(f"nutrition_{name}_total {value}")
+        return "\n".join(lines) + "\n"
+    
+    def dump(self, path):
+        # .json gets the snapshot, anything else the Prometheus text format
+        # (for node_exporter's textfile collector, for example).
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            if path.endswith(".json"):
+                json.dump(self.snapshot(), f, indent=2)
+            else:
+                f.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+
+def _histogram_lines(lines, metric, labels, histogram):
+    separator = "," if labels else ""
+    cumulative = 0
+    for bound, count in zip(histogram.buckets, histogram.counts):
+        cumulative += count
+        lines.append(f'{metric}_bucket{{{labels}{separator}le="{bound}"}} {cumulative}')
+    lines.append(f'{metric}_bucket{{{labels}{separator}le="+Inf"}} {histogram.count}')
+    suffix = f"{{{labels}}}" if labels else ""
+    lines.append(f"{metric}_sum{suffix} {histogram.sum}")
+    lines.append(f"{metric}_count{suffix} {histogram.count}")
+
+class SlowRequestProfiler:
+    # A single daemon thread samples the stacks of the threads currently
+    # inside watch() every interval_ms. When a watched request takes longer
+    # than threshold_ms its samples are kept as collapsed stacks
+    # ("file:function;file:function count", the flame graph input format)
+    # and optionally written to output_dir. Requests under the threshold
+    # discard their samples.
+    
+    def __init__(self, threshold_ms=250.0, interval_ms=2.0, output_dir=None, max_reports=20):
+        self.threshold = threshold_ms / 1000.0
+        self.interval = interval_ms / 1000.0
+        self.output_dir = output_dir
+        self.reports = deque(maxlen=max_reports)
+        self._active = {}
+        self._lock = threading.Lock()
+        self._thread = None
+    
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="slow-request-profiler", daemon=True)
+                self._thread.start()
+    
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    continue
+                frames = sys._current_frames()
+                for thread_id, samples in self._active.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        samples[_collapse(frame)] += 1
+    
+    def watch(self, label):
+        return _Watch(self, label)
+    
+    def _report(self, label, elapsed, samples):
+        report = {
+            'label': label,
+            'elapsed_s': elapsed,
+            'time': time.time(),
+            'samples': sum(samples.values()),
+            'stacks': samples.most_common(),
+        }
+        self.reports.append(report)
+        print(f"Slow {label}: {elapsed * 1000:.0f}ms, {report['samples']} stack samples")
+        
+        if self.output_dir:
+            os.makedirs(self.output_dir, exist_ok=True)
+            path = os.path.join(self.output_dir, f"slow-{label}-{int(report['time'] * 1000)}.folded")
+            with open(path, "w") as f:
+                for stack, count in report['stacks']:
+                    f.write(f"{stack} {count}\n")
+
+class _Watch:
+    def __init__(self, profiler, label):
+        self.profiler = profiler
+        self.label = label
+        self.samples = Counter()
+    
+    def __enter__(self):
+        self.thread_id = threading.get_ident()
+        with self.profiler._lock:
+            self.profiler._active[self.thread_id] = self.samples
+        self.profiler._ensure_started()
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        with self.profiler._lock:
+            self.profiler._active.pop(self.thread_id, None)
+        if elapsed >= self.profiler.threshold:
+            self.profiler._report(self.label, elapsed, self.samples)
+        return False
+
+def _collapse(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+METRICS = MetricsRegistry(enabled=os.environ.get("NUTRITION_METRICS", "") not in ("", "0"))
+_profiler = None
+
+def stage(name):
+    return METRICS.stage(name)
+
+def set_slow_request_profiler(profiler):
+    global _profiler
+    _profiler = profiler
+
+def request(label):
+    # Times a whole predict/predict_batch call and, when a slow request
+    # profiler is installed, samples its stack.
+    if _profiler is not None:
+        return _RequestScope(label, _profiler.watch(label))
+    return METRICS.stage(label)
+
+class _RequestScope:
+    def __init__(self, label, watch):
+        self.timer = METRICS.stage(label)
+        self.watch = watch
+    
+    def __enter__(self):
+        self.watch.__enter__()
+        self.timer.__enter__()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.timer.__exit__(exc_type, exc, tb)
+        self.watch.__exit__(exc_type, exc, tb)
+        return False
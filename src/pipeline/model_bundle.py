@@ -0,0 +1,302 @@
+import os
+import sys
+import json
+import fcntl
+import shutil
+import hashlib
+import argparse
+from datetime import datetime, timezone
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import MODELS_DIR, MODEL_BUNDLE_DIR, FOOD_CATEGORIES, PRECISION
+from pipeline.forest_engine import CompiledForest
+from pipeline.backends import backend_of, save_engine, load_engine
+
+FORMAT_VERSION = 2
+# Version 2 added compacted forests (value_index.npy). Readers of version 1
+# would ignore that file and score garbage, so they must refuse these bundles.
+SUPPORTED_FORMAT_VERSIONS = (1, 2)
+MANIFEST_FILE = "manifest.json"
+
+# Joblib artifacts written by the trainers; the bundle is built from these.
+JOBLIB_FILES = {
+    'classifier': "food_classifier.joblib",
+    'label_encoder': "label_encoder.joblib",
+    'regressor': "calorie_regressor.joblib",
+    'food_encoder': "food_encoder.joblib",
+}
+
+class BundleError(ValueError):
+    pass
+
+class ClassLabels:
+    # The part of LabelEncoder used at inference, so serving from a bundle
+    # never has to import sklearn.
+    
+    def __init__(self, classes):
+        self.classes_ = classes
+        self._index = {label: i for i, label in enumerate(classes.tolist())}
+    
+    def transform(self, labels):
+        try:
+            return np.array([self._index[label] for label in labels], dtype=np.intp)
+        except KeyError as e:
+            raise ValueError(f"y contains previously unseen labels: {e}")
+    
+    def inverse_transform(self, indices):
+        return self.classes_[np.asarray(indices, dtype=np.intp)]
+
+class ModelBundle:
+    def __init__(self, manifest, classifier=None, label_encoder=None, regressor=None, food_encoder=None):
+        self.manifest = manifest
+        self.classifier = classifier
+        self.label_encoder = label_encoder
+        self.regressor = regressor
+        self.food_encoder = food_encoder
+    
+    @property
+    def bundle_id(self):
+        return self.manifest["bundle_id"]
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def bundle_exists(directory=MODEL_BUNDLE_DIR):
+    return os.path.exists(os.path.join(directory, MANIFEST_FILE))
+
+def source_stamps(models_dir):
+    # By content rather than mtime, so a clone, copy or deploy of the models
+    # directory does not make the bundle look stale.
+    stamps = {}
+    for name, filename in JOBLIB_FILES.items():
+        path = os.path.join(models_dir, filename)
+        if os.path.exists(path):
+            stamps[name] = {"size": os.path.getsize(path), "sha256": file_sha256(path)}
+    return stamps
+
+def write_bundle(classifier, label_encoder, regressor, food_encoder, params,
+                 directory=MODEL_BUNDLE_DIR, sources=None, backend=None):
+    # classifier is an sklearn model of any registered backend, or an
+    # already compiled engine whose backend name is passed as backend; the
+    # regressor is a RandomForestRegressor or a (compacted) CompiledForest.
+    # The bundle is written to a sibling temp directory, then published
+    # with publish_bundle.
+    from data.preprocess import feature_length
+    
+    tmp_dir = f"{directory}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    
+    components = {}
+    if classifier is not None:
+        if hasattr(classifier, 'predict_with_proba'):
+            backend = backend or "random_forest"
+        else:
+            backend = backend_of(classifier).name
+            classifier = backend_of(classifier).compile(classifier)
+        save_engine(classifier, os.path.join(tmp_dir, "classifier"))
+        os.makedirs(os.path.join(tmp_dir, "label_encoder"))
+        np.save(os.path.join(tmp_dir, "label_encoder", "classes.npy"), np.asarray(label_encoder.classes_.tolist()))
+        components['classifier'] = {
+            "backend": backend,
+            "n_estimators": getattr(classifier, 'n_estimators', None),
+            "n_classes": len(label_encoder.classes_),
+            "compacted": getattr(classifier, 'value_index', None) is not None,
+        }
+        components['label_encoder'] = {"classes": label_encoder.classes_.tolist()}
+    if regressor is not None:
+        if not isinstance(regressor, CompiledForest):
+            regressor = CompiledForest.from_sklearn(regressor)
+        regressor.save(os.path.join(tmp_dir, "regressor"))
+        os.makedirs(os.path.join(tmp_dir, "food_encoder"))
+        np.save(os.path.join(tmp_dir, "food_encoder", "classes.npy"), np.asarray(food_encoder.classes_.tolist()))
+        components['regressor'] = {"n_estimators": regressor.n_estimators, "compacted": regressor.value_index is not None}
+        components['food_encoder'] = {"classes": food_encoder.classes_.tolist()}
+    
+    files = {}
+    for root, _, names in os.walk(tmp_dir):
+        for name in sorted(names):
+            path = os.path.join(root, name)
+            relative = os.path.relpath(path, tmp_dir).replace(os.sep, "/")
+            files[relative] = {"sha256": file_sha256(path), "bytes": os.path.getsize(path)}
+    
+    bundle_id = hashlib.sha256(json.dumps(
+        [params, sorted((name, entry["sha256"]) for name, entry in files.items())]
+    ).encode("utf-8")).hexdigest()[:16]
+    
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "bundle_id": bundle_id,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "feature_params": params,
+        "n_features": feature_length(),
+        "food_categories": sorted(FOOD_CATEGORIES),
+        "components": components,
+        "sources": sources or {},
+        "files": files,
+    }
+    with open(os.path.join(tmp_dir, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+    
+    publish_bundle(tmp_dir, directory, bundle_id)
+    return manifest
+
+def publish_bundle(tmp_dir, directory, bundle_id):
+    # directory is a relative symlink to a sibling version directory named
+    # after the bundle id. The new version is renamed in under its own name
+    # and the link swapped with os.replace, so readers always find a
+    # complete bundle and concurrent writers never rename over each other.
+    # Writers hold a lock file from the rename to the clean-up, which keeps
+    # the new and the previous version for loaders that resolved it.
+    version_dir = f"{directory}.{bundle_id}"
+    with open(f"{directory}.lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if os.path.exists(os.path.join(version_dir, MANIFEST_FILE)):
+            # Already published under this id: identical contents.
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        else:
+            shutil.rmtree(version_dir, ignore_errors=True)
+            os.rename(tmp_dir, version_dir)
+        previous = os.path.realpath(directory) if os.path.islink(directory) else None
+        if os.path.isdir(directory) and not os.path.islink(directory):
+            # A bundle from before versioned directories, moved aside once.
+            os.rename(directory, f"{directory}.legacy-{os.getpid()}")
+        link_tmp = f"{directory}.link-{os.getpid()}"
+        if os.path.lexists(link_tmp):
+            os.remove(link_tmp)
+        os.symlink(os.path.basename(version_dir), link_tmp)
+        os.replace(link_tmp, directory)
+        
+        keep = {os.path.realpath(version_dir), previous}
+        parent, name = os.path.split(os.path.abspath(directory))
+        for entry in os.listdir(parent):
+            path = os.path.join(parent, entry)
+            if (entry.startswith(f"{name}.") and ".tmp-" not in entry and not os.path.islink(path)
+                    and os.path.isdir(path) and os.path.realpath(path) not in keep):
+                shutil.rmtree(path, ignore_errors=True)
+
+def build_from_joblib(models_dir=MODELS_DIR, directory=MODEL_BUNDLE_DIR, precision=PRECISION):
+    import joblib
+    from data.preprocess import feature_params
+    
+    paths = {name: os.path.join(models_dir, filename) for name, filename in JOBLIB_FILES.items()}
+    loaded = {name: joblib.load(path) if os.path.exists(path) else None for name, path in paths.items()}
+    if loaded['classifier'] is None and loaded['regressor'] is None:
+        raise BundleError(f"No trained models in {models_dir}. Run training first.")
+    
+    return write_bundle(
+        loaded['classifier'], loaded['label_encoder'], loaded['regressor'], loaded['food_encoder'],
+        feature_params(precision), directory, sources=source_stamps(models_dir)
+    )
+
+def read_manifest(directory=MODEL_BUNDLE_DIR):
+    try:
+        with open(os.path.join(directory, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        raise BundleError(f"No model bundle in {directory}")
+    except ValueError as e:
+        raise BundleError(f"Corrupt manifest in {directory}: {e}")
+    
+    if manifest.get("format_version") not in SUPPORTED_FORMAT_VERSIONS:
+        raise BundleError(
+            f"Bundle format {manifest.get('format_version')} is not supported (expected {FORMAT_VERSION})"
+        )
+    return manifest
+
+def check_compatible(manifest, params):
+    from data.preprocess import feature_length
+    
+    problems = []
+    if manifest["feature_params"] != params:
+        changed = sorted(
+            key for key in set(params) | set(manifest["feature_params"])
+            if params.get(key) != manifest["feature_params"].get(key)
+        )
+        problems.append(f"feature settings differ ({', '.join(changed)})")
+    if manifest["n_features"] != feature_length():
+        problems.append(f"bundle expects {manifest['n_features']} features, pipeline produces {feature_length()}")
+    if manifest["food_categories"] != sorted(FOOD_CATEGORIES):
+        problems.append("FOOD_CATEGORIES changed since the bundle was built")
+    if problems:
+        raise BundleError(f"Model bundle {manifest['bundle_id']} does not match this pipeline: " + "; ".join(problems))
+
+def verify_files(directory, manifest, checksums=True):
+    for relative, entry in manifest["files"].items():
+        path = os.path.join(directory, relative)
+        if not os.path.exists(path):
+            raise BundleError(f"Bundle file missing: {relative}")
+        if os.path.getsize(path) != entry["bytes"]:
+            raise BundleError(f"Bundle file has the wrong size: {relative}")
+        if checksums and file_sha256(path) != entry["sha256"]:
+            raise BundleError(f"Bundle file checksum mismatch: {relative}")
+
+def load_bundle(directory=MODEL_BUNDLE_DIR, params=None, verify=True):
+    # verify=True hashes every payload before mapping it. That reads the
+    # arrays once, which inference would do anyway, and is still far cheaper
+    # than unpickling the sklearn forests.
+    # The link is resolved once per attempt, so a bundle published mid-load
+    # cannot mix versions. A version deleted under the load (two publishes
+    # during it) is retried at the new target.
+    for attempt in range(3):
+        version_dir = os.path.realpath(directory)
+        try:
+            return _load_version(version_dir, params, verify)
+        except (BundleError, OSError):
+            if attempt == 2 or os.path.realpath(directory) == version_dir:
+                raise
+
+def _load_version(directory, params, verify):
+    manifest = read_manifest(directory)
+    if params is not None:
+        check_compatible(manifest, params)
+    verify_files(directory, manifest, checksums=verify)
+    
+    components = manifest["components"]
+    bundle = ModelBundle(manifest)
+    if 'classifier' in components:
+        bundle.classifier = load_engine(os.path.join(directory, "classifier"), mmap_mode="r")
+        bundle.label_encoder = ClassLabels(np.load(os.path.join(directory, "label_encoder", "classes.npy")))
+    if 'regressor' in components:
+        bundle.regressor = CompiledForest.load(os.path.join(directory, "regressor"), mmap_mode="r")
+        bundle.food_encoder = ClassLabels(np.load(os.path.join(directory, "food_encoder", "classes.npy")))
+    return bundle
+
+def is_stale(manifest, models_dir=MODELS_DIR):
+    # True when the trainers have rewritten a joblib file since the bundle
+    # was built from them.
+    recorded = manifest.get("sources") or {}
+    return bool(recorded) and source_stamps(models_dir) != recorded
+
+def main():
+    parser = argparse.ArgumentParser(description="Build, verify or inspect the serving model bundle")
+    parser.add_argument("command", choices=["build", "verify", "info"])
+    parser.add_argument("--directory", default=MODEL_BUNDLE_DIR)
+    parser.add_argument("--precision", choices=["float64", "float32"], default=PRECISION,
+                        help="Feature precision the models were trained with (build only)")
+    args = parser.parse_args()
+    
+    try:
+        if args.command == "build":
+            manifest = build_from_joblib(directory=args.directory, precision=args.precision)
+            print(f"Wrote bundle {manifest['bundle_id']} to {args.directory}")
+        elif args.command == "verify":
+            manifest = read_manifest(args.directory)
+            verify_files(args.directory, manifest)
+            from data.preprocess import feature_params
+            check_compatible(manifest, feature_params(manifest["feature_params"].get("precision", PRECISION)))
+            print(f"Bundle {manifest['bundle_id']} OK ({len(manifest['files'])} files)")
+        else:
+            manifest = read_manifest(args.directory)
+            print(json.dumps({key: value for key, value in manifest.items() if key != "files"}, indent=2))
+    except BundleError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,152 @@
 import os
 import sys
+import json
+import hashlib
+import threading
 import numpy as np
 from PIL import Image
-import joblib
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config import MODELS_DIR, NUTRITION_DATA, DIETARY_GOALS
-from data.preprocess import preprocess_single_image
+from config import MODELS_DIR, MODEL_BUNDLE_DIR, DIETARY_GOALS, PRECISION
+from data.preprocess import preprocess_single_image, preprocess_images, feature_params
+from data.nutrition_store import NutritionStore, normalise
+from pipeline.alternatives import HealthierAlternatives
+from pipeline.backends import compile_model
+from pipeline.model_bundle import bundle_exists, build_from_joblib, load_bundle, read_manifest, is_stale, source_stamps
+from pipeline.metrics import METRICS, stage, request
+
+NUTRITION_FIELDS = ('calories', 'protein', 'carbs', 'fat', 'fiber')
+NUTRITION_DTYPE = np.dtype([(field, np.float64) for field in NUTRITION_FIELDS])
+# Healthier alternatives named in a suggestion.
+ALTERNATIVES_PER_SUGGESTION = 3
+
+def _join_names(items):
+    return items[0] if len(items) == 1 else f"{', '.join(items[:-1])} or {items[-1]}"
 
 class NutritionPredictor:
-    def __init__(self):
+    # Models come from the bundle in MODEL_BUNDLE_DIR when there is one: the
+    # forests are memory-mapped compiled arrays, so forked workers share one
+    # copy of the pages and sklearn is never imported. Without a bundle the
+    # joblib files are loaded directly, unless shared_models=True, in which
+    # case the bundle is built from them first. A bundle older than the
+    # joblib files (a trainer was rerun on its own) is never served: it is
+    # rebuilt when shared_models=True, otherwise the joblib files are used.
+    #
+    # load="eager" loads the models in the constructor, "lazy" on first use
+    # and "background" on a daemon thread started by the constructor. Every
+    # public method waits for loading to finish before touching the models.
+    # A failed load is kept in load_error; later calls raise instead of
+    # loading again, so a server can report the failure.
+    #
+    # Nutrition comes from a NutritionStore. The foods the classifier knows
+    # are compiled into nutrition_table with regressed calories; any other
+    # food in the store is looked up there on demand.
+    #
+    # precision=None takes the feature precision the bundle was built with
+    # (PRECISION without one); an explicit precision must match the bundle.
+    #
+    # model_id names the loaded models: the bundle id, or a digest of the
+    # joblib files' stamps, so callers can tell results of a retrain apart.
+    
+    def __init__(self, precision=None, shared_models=False, load="eager", nutrition_store=None):
+        self.requested_precision = precision
+        self.precision = precision or PRECISION
+        self.shared_models = shared_models
+        self.nutrition = nutrition_store
         self.classifier = None
+        self.classifier_engine = None
         self.label_encoder = None
         self.calorie_regressor = None
         self.food_encoder = None
-        self._load_models()
+        self.model_id = None
+        self.load_error = None
+        self.food_index = {}
+        self.nutrition_table = np.zeros(0, dtype=NUTRITION_DTYPE)
+        self._nutrition_rows = []
+        self._loaded = threading.Event()
+        self._load_lock = threading.Lock()
+        self._alternatives = None
+        self._alternatives_lock = threading.Lock()
+        
+        if load == "eager":
+            self.load()
+        elif load == "background":
+            threading.Thread(target=self.load, name="model-loader", daemon=True).start()
+        elif load != "lazy":
+            raise ValueError(f"Unknown load mode: {load}")
+    
+    def load(self):
+        if self._loaded.is_set():
+            return self
+        with self._load_lock:
+            if self.load_error is not None:
+                raise RuntimeError(f"Model loading failed: {self.load_error}")
+            if not self._loaded.is_set():
+                try:
+                    with stage("model_load"):
+                        self._load_models()
+                        self._compile_nutrition_table()
+                except Exception as e:
+                    self.load_error = e
+                    raise
+                self._loaded.set()
+        return self
+    
+    @property
+    def is_loaded(self):
+        return self._loaded.is_set()
     
     def _load_models(self):
+        manifest = read_manifest(MODEL_BUNDLE_DIR) if bundle_exists(MODEL_BUNDLE_DIR) else None
+        if manifest is not None and self.requested_precision is None:
+            self.precision = manifest["feature_params"].get("precision", PRECISION)
+        stale = manifest is not None and is_stale(manifest, MODELS_DIR)
+        if self.shared_models and os.path.exists(os.path.join(MODELS_DIR, "food_classifier.joblib")):
+            if not bundle_exists(MODEL_BUNDLE_DIR):
+                print("Building model bundle from joblib files...")
+                build_from_joblib(MODELS_DIR, MODEL_BUNDLE_DIR, self.precision)
+            elif stale:
+                print("Joblib models changed since the bundle was built; rebuilding it...")
+                build_from_joblib(MODELS_DIR, MODEL_BUNDLE_DIR, self.precision)
+                stale = False
+        
+        if bundle_exists(MODEL_BUNDLE_DIR) and not stale:
+            self._load_bundle()
+        else:
+            if stale:
+                print("Joblib models changed since the bundle was built; loading them instead. "
+                      "Run 'python src/pipeline/model_bundle.py build' to refresh the bundle.")
+            self._load_joblib()
+    
+    def _load_bundle(self):
+        bundle = load_bundle(MODEL_BUNDLE_DIR, params=feature_params(self.precision))
+        self.classifier_engine = bundle.classifier
+        self.label_encoder = bundle.label_encoder
+        self.calorie_regressor = bundle.regressor
+        self.food_encoder = bundle.food_encoder
+        self.model_id = bundle.bundle_id
+        
+        if self.classifier_engine is None:
+            print("Warning: Model bundle has no food classifier.")
+        if self.calorie_regressor is None:
+            print("Warning: Model bundle has no calorie regressor.")
+        backend = bundle.manifest["components"].get("classifier", {}).get("backend", "random_forest")
+        print(f"Model bundle {bundle.bundle_id} loaded successfully ({backend} classifier)")
+    
+    def _load_joblib(self):
+        import joblib
+        
         classifier_path = os.path.join(MODELS_DIR, "food_classifier.joblib")
         encoder_path = os.path.join(MODELS_DIR, "label_encoder.joblib")
         regressor_path = os.path.join(MODELS_DIR, "calorie_regressor.joblib")
         food_encoder_path = os.path.join(MODELS_DIR, "food_encoder.joblib")
+        stamps = json.dumps(source_stamps(MODELS_DIR), sort_keys=True)
+        self.model_id = hashlib.sha256(stamps.encode("utf-8")).hexdigest()[:16]
         
         if os.path.exists(classifier_path):
             self.classifier = joblib.load(classifier_path)
             self.label_encoder = joblib.load(encoder_path)
+            self.classifier_engine = compile_model(self.classifier)
             print("Food classifier loaded successfully")
         else:
             print("Warning: Food classifier not found. Run training first.")
@@ -36,53 +158,116 @@ class NutritionPredictor:
         else:
             print("Warning: Calorie regressor not found. Run training first.")
     
+    @property
+    def models_loaded(self):
+        self.load()
+        return self.classifier_engine is not None
+    
     def predict_food(self, image):
-        if self.classifier is None:
+        self.load()
+        if self.classifier_engine is None:
             return None, 0.0
         
-        features = preprocess_single_image(image)
-        
-        prediction = self.classifier.predict(features)[0]
-        probabilities = self.classifier.predict_proba(features)[0]
+        features = preprocess_single_image(image, self.precision)
         
-        food_type = self.label_encoder.inverse_transform([prediction])[0]
-        confidence = probabilities[prediction]
+        with stage("forest"):
+            predictions, probabilities = self.classifier_engine.predict_with_proba(features)
+            prediction = predictions[0]
+            
+            food_type = self.label_encoder.inverse_transform([prediction])[0]
+            confidence = probabilities[0][prediction]
         
+        METRICS.count("images")
         return food_type, confidence
     
-    def predict_calories(self, food_type):
-        if food_type not in NUTRITION_DATA:
-            return None
+    def _regress_calories(self, food_types):
+        food_encoded = self.food_encoder.transform(food_types)
+        base = np.array([
+            [self.nutrition[food][field] for field in ('protein', 'carbs', 'fat', 'fiber')]
+            for food in food_types
+        ], dtype=np.float64)
         
-        base_nutrition = NUTRITION_DATA[food_type]
+        features = np.empty((len(food_types), 8))
+        features[:, 0] = food_encoded
+        features[:, 1:5] = base
+        features[:, 5] = base[:, 0] * 4
+        features[:, 6] = base[:, 1] * 4
+        features[:, 7] = base[:, 2] * 9
+        with stage("regressor"):
+            return self.calorie_regressor.predict(features)
+    
+    def _compile_nutrition_table(self):
+        if self.nutrition is None:
+            self.nutrition = NutritionStore()
+        if self.label_encoder is not None:
+            food_types = [food for food in self.label_encoder.classes_ if food in self.nutrition]
+        else:
+            food_types = []
+        
+        table = np.zeros(len(food_types), dtype=NUTRITION_DTYPE)
+        rows = [self.nutrition[food] for food in food_types]
+        for field in NUTRITION_FIELDS:
+            table[field] = [row[field] for row in rows]
         
         if self.calorie_regressor is not None and self.food_encoder is not None:
-            try:
-                food_encoded = self.food_encoder.transform([food_type])[0]
-                features = np.array([[
-                    food_encoded,
-                    base_nutrition['protein'],
-                    base_nutrition['carbs'],
-                    base_nutrition['fat'],
-                    base_nutrition['fiber'],
-                    base_nutrition['protein'] * 4,
-                    base_nutrition['carbs'] * 4,
-                    base_nutrition['fat'] * 9,
-                ]])
-                predicted_calories = self.calorie_regressor.predict(features)[0]
-                return predicted_calories
-            except Exception:
-                pass
-        
-        return base_nutrition['calories']
+            known = np.isin(food_types, self.food_encoder.classes_)
+            if known.any():
+                try:
+                    regressed = self._regress_calories([f for f, k in zip(food_types, known) if k])
+                    table['calories'][known] = regressed
+                except Exception:
+                    pass
+        
+        table.flags.writeable = False
+        # Keyed like the store, so "Pizza" finds the regressed row too.
+        self.food_index = {normalise(food): idx for idx, food in enumerate(food_types)}
+        self.nutrition_table = table
+        # The rows as plain dicts, built once; get_nutrition_info copies one.
+        self._nutrition_rows = [dict(zip(NUTRITION_FIELDS, row)) for row in table.tolist()]
     
-    def get_nutrition_info(self, food_type):
-        if food_type not in NUTRITION_DATA:
+    def _store_record(self, food_type):
+        # A food outside the classifier's classes, from the store.
+        if food_type not in self.nutrition:
+            return None
+        row = self.nutrition[food_type]
+        return {field: row[field] for field in NUTRITION_FIELDS}
+    
+    def predict_calories(self, food_type):
+        nutrition = self.get_nutrition_info(food_type)
+        if nutrition is None:
             return None
         
-        nutrition = NUTRITION_DATA[food_type].copy()
-        nutrition['calories'] = self.predict_calories(food_type)
-        return nutrition
+        return nutrition['calories']
+    
+    def get_nutrition_info(self, food_type):
+        # A fresh dict per call, so callers may modify it; None for unknown
+        # foods.
+        self.load()
+        idx = self.food_index.get(normalise(food_type))
+        if idx is None:
+            return self._store_record(food_type)
+        
+        return dict(self._nutrition_rows[idx])
+    
+    def healthier_alternatives(self, food_type, goal, k=ALTERNATIVES_PER_SUGGESTION):
+        # Foods close to food_type in calories and macros that suit the goal
+        # better; the k-d tree over the catalogue is built on first use.
+        # Compared on the store's standard portions on both sides, not the
+        # regressed calories, so the margins and the values shown agree.
+        self.load()
+        if food_type not in self.nutrition:
+            return []
+        nutrition = self.nutrition[food_type]
+        if self._alternatives is None:
+            with self._alternatives_lock:
+                if self._alternatives is None:
+                    self._alternatives = HealthierAlternatives(self.nutrition)
+        return self._alternatives.find(food_type, nutrition, goal, k)
+    
+    def search_foods(self, query, limit=10):
+        # Food names for manual entry: prefix matches, then fuzzy ones.
+        self.load()
+        return self.nutrition.search(query, limit)
     
     def get_dietary_suggestions(self, food_type, goal, consumed_today=None):
         if consumed_today is None:
@@ -113,6 +298,8 @@ class NutritionPredictor:
             'fat': max(0, fat_target - after_meal['fat'])
         }
         
+        # Only queried for the suggestions below that name alternatives.
+        alternatives = []
         suggestions = []
         
         if after_meal['calories'] > daily_target:
@@ -128,13 +315,22 @@ class NutritionPredictor:
             if nutrition['fiber'] >= 3:
                 suggestions.append("High fiber helps keep you full longer.")
             if nutrition['calories'] > 400:
-                suggestions.append("Consider a lower calorie alternative for faster results.")
+                alternatives = self.healthier_alternatives(food_type, goal)
+                if alternatives:
+                    names = _join_names([f"{food['name']} ({food['calories']:.0f} cal)" for food in alternatives])
+                    suggestions.append(f"Consider a lower calorie alternative such as {names} for faster results.")
+                else:
+                    suggestions.append("Consider a lower calorie alternative for faster results.")
         
         elif goal == 'muscle_gain':
             if nutrition['protein'] >= 25:
                 suggestions.append("Excellent protein content for muscle building!")
             elif nutrition['protein'] < 15:
                 suggestions.append("Consider adding a protein source to this meal.")
+                alternatives = self.healthier_alternatives(food_type, goal)
+                if alternatives:
+                    names = _join_names([f"{food['name']} ({food['protein']:.0f}g protein)" for food in alternatives])
+                    suggestions.append(f"Similar foods with more protein: {names}.")
             if nutrition['carbs'] >= 30:
                 suggestions.append("Good carbs for energy and recovery.")
         
@@ -151,19 +347,29 @@ class NutritionPredictor:
             'daily_target': daily_target,
             'after_meal': after_meal,
             'remaining': remaining,
+            'alternatives': alternatives,
             'suggestions': suggestions
         }
     
     def predict(self, image, goal='maintenance', consumed_today=None):
+        with request("predict"):
+            return self._predict(image, goal, consumed_today)
+    
+    def _predict(self, image, goal, consumed_today):
         food_type, confidence = self.predict_food(image)
-        
+        return self.result_for_food(food_type, confidence, goal, consumed_today)
+    
+    def result_for_food(self, food_type, confidence, goal='maintenance', consumed_today=None):
+        # The goal-dependent half of predict(), for callers that cache the
+        # classification and only redo the suggestions.
         if food_type is None:
             return {
                 'success': False,
                 'error': 'Could not classify food image'
             }
         
-        suggestions = self.get_dietary_suggestions(food_type, goal, consumed_today)
+        with stage("suggestions"):
+            suggestions = self.get_dietary_suggestions(food_type, goal, consumed_today)
         
         return {
             'success': True,
@@ -171,6 +377,70 @@ class NutritionPredictor:
             'confidence': confidence,
             'suggestions': suggestions
         }
+    
+    def predict_food_batch(self, images):
+        self.load()
+        if self.classifier_engine is None:
+            return [None] * len(images), np.zeros(len(images))
+        
+        if len(images) == 0:
+            return [], np.zeros(0)
+        
+        features = preprocess_images(images, self.precision)
+        with stage("forest"):
+            predictions, probabilities = self.classifier_engine.predict_with_proba(features)
+            
+            confidences = probabilities[np.arange(len(predictions)), predictions]
+            food_types = self.label_encoder.inverse_transform(predictions)
+        
+        METRICS.count("images", len(images))
+        return list(food_types), confidences
+    
+    def predict_batch(self, images, goals='maintenance', consumed=None):
+        with request("predict_batch"):
+            return self._predict_batch(list(images), goals, consumed)
+    
+    def _predict_batch(self, images, goals, consumed):
+        shared_inputs = isinstance(goals, str) and not isinstance(consumed, (list, tuple))
+        if isinstance(goals, str):
+            goals = [goals] * len(images)
+        if not isinstance(consumed, (list, tuple)):
+            consumed = [consumed] * len(images)
+        if len(goals) != len(images) or len(consumed) != len(images):
+            raise ValueError(f"Got {len(images)} images but {len(goals)} goals and {len(consumed)} intakes")
+        
+        METRICS.observe_batch(len(images))
+        food_types, confidences = self.predict_food_batch(images)
+        
+        with stage("suggestions"):
+            return self._batch_suggestions(food_types, confidences, goals, consumed, shared_inputs)
+    
+    def _batch_suggestions(self, food_types, confidences, goals, consumed, shared_inputs):
+        suggestions_cache = {}
+        results = []
+        for food_type, confidence, goal, consumed_today in zip(food_types, confidences, goals, consumed):
+            if food_type is None:
+                results.append({
+                    'success': False,
+                    'error': 'Could not classify food image'
+                })
+                continue
+            
+            if shared_inputs:
+                if food_type not in suggestions_cache:
+                    suggestions_cache[food_type] = self.get_dietary_suggestions(food_type, goal, consumed_today)
+                suggestions = suggestions_cache[food_type]
+            else:
+                suggestions = self.get_dietary_suggestions(food_type, goal, consumed_today)
+            
+            results.append({
+                'success': True,
+                'food_type': food_type,
+                'confidence': confidence,
+                'suggestions': suggestions
+            })
+        
+        return results
 
 if __name__ == "__main__":
     predictor = NutritionPredictor()
@@ -0,0 +1,16 @@
+import time
+import numpy as np
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+def single_row_latency(predict, X, n_samples=200, percentiles=(50, 95)):
+    # Percentiles of predict's wall time on one feature row at a time, the
+    # model's share of a single-image predict(). The first call warms up
+    # and is not timed.
+    rows = X[:n_samples]
+    predict(rows[:1])
+    timings = [timed(lambda: predict(rows[i:i + 1])) for i in range(len(rows))]
+    return tuple(float(np.percentile(timings, q)) for q in percentiles)
@@ -0,0 +1,431 @@
+import os
+import sys
+import io
+import json
+import time
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from email.parser import BytesParser
+from email.policy import HTTP
+from urllib.parse import urlsplit, parse_qs, unquote
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import DIETARY_GOALS
+from pipeline.metrics import METRICS, SlowRequestProfiler, set_slow_request_profiler
+
+INTAKE_FIELDS = ('calories', 'protein', 'carbs', 'fat')
+
+REASONS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"
+}
+
+class Overloaded(Exception):
+    pass
+
+class BadRequest(Exception):
+    pass
+
+class PayloadTooLarge(Exception):
+    pass
+
+def decode_image(image_bytes):
+    image = Image.open(io.BytesIO(image_bytes))
+    image.load()
+    return image
+
+def to_jsonable(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, dict):
+        return {key: to_jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(item) for item in value]
+    return value
+
+class MicroBatcher:
+    # Requests wait on a bounded queue. A single consumer pulls the first
+    # request, keeps collecting until max_batch_size requests are in hand or
+    # max_wait_ms has passed, then scores the whole batch with one
+    # predict_batch call on a worker thread so the event loop stays free.
+    
+    def __init__(self, predictor, max_batch_size=32, max_wait_ms=5.0, max_queue=256):
+        self.predictor = predictor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="batcher")
+        self.batches = 0
+        self.items = 0
+        self._task = None
+    
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self.executor.shutdown(wait=False)
+    
+    @property
+    def depth(self):
+        return self.queue.qsize()
+    
+    @property
+    def full(self):
+        return self.queue.full()
+    
+    async def submit(self, image, goal, consumed):
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((image, goal, consumed, future))
+        except asyncio.QueueFull:
+            raise Overloaded("Prediction queue is full")
+        return await future
+    
+    async def _collect(self):
+        batch = [await self.queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+    
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            images, goals, consumed, futures = zip(*batch)
+            try:
+                results = await loop.run_in_executor(
+                    self.executor, self.predictor.predict_batch, list(images), list(goals), list(consumed)
+                )
+            except Exception as e:
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            
+            self.batches += 1
+            self.items += len(batch)
+            for future, result in zip(futures, results):
+                if not future.done():
+                    future.set_result(result)
+
+class NutritionService:
+    def __init__(self, predictor, batcher, max_concurrency, max_body_bytes=10 * 1024 * 1024, decode_workers=4):
+        self.predictor = predictor
+        self.batcher = batcher
+        self.decoder = ThreadPoolExecutor(max_workers=decode_workers, thread_name_prefix="decode")
+        self.max_body_bytes = max_body_bytes
+        self.slots = asyncio.Semaphore(max_concurrency)
+        self.started = time.time()
+    
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request = await self._read_head(reader)
+                if request is None:
+                    break
+                method, target, headers, length = request
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                
+                # Shed load before reading the body, so requests that would
+                # only wait never buffer their upload. The unread body is
+                # still on the socket, so the connection is closed after.
+                reason = self._overloaded(target)
+                if reason is not None:
+                    await self._write_response(writer, 503, {'success': False, 'error': reason},
+                                               {'Retry-After': '1'}, False)
+                    break
+                
+                async with self.slots:
+                    body = await reader.readexactly(length) if length else b""
+                    status, payload, extra_headers = await self._dispatch(method, target, headers, body)
+                
+                await self._write_response(writer, status, payload, extra_headers, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except BadRequest as e:
+            await self._write_response(writer, 400, {'success': False, 'error': str(e)}, {}, False)
+        except PayloadTooLarge as e:
+            await self._write_response(writer, 413, {'success': False, 'error': str(e)}, {}, False)
+        finally:
+            writer.close()
+    
+    def _overloaded(self, target):
+        if self.slots.locked():
+            return "Server is handling too many requests"
+        if urlsplit(target).path.rstrip('/') == '/predict' and self.batcher.full:
+            return "Prediction queue is full"
+        return None
+    
+    async def _read_head(self, reader):
+        # Request line and headers; the body is left on the reader.
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError:
+            return None
+        except asyncio.LimitOverrunError:
+            raise BadRequest("Request header too large")
+        
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise BadRequest("Malformed request line")
+        
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        
+        try:
+            length = int(headers.get('content-length', 0) or 0)
+        except ValueError:
+            raise BadRequest("Content-Length must be an integer")
+        if length < 0:
+            raise BadRequest("Content-Length must not be negative")
+        if length > self.max_body_bytes:
+            raise PayloadTooLarge(f"Body exceeds {self.max_body_bytes} bytes")
+        return method.upper(), target, headers, length
+    
+    async def _write_response(self, writer, status, payload, extra_headers, keep_alive):
+        if isinstance(payload, str):
+            body = payload.encode("utf-8")
+            content_type = 'text/plain; version=0.0.4; charset=utf-8'
+        else:
+            body = json.dumps(to_jsonable(payload)).encode("utf-8")
+            content_type = 'application/json'
+        headers = {
+            'Content-Type': content_type,
+            'Content-Length': str(len(body)),
+            'Connection': 'keep-alive' if keep_alive else 'close',
+        }
+        headers.update(extra_headers)
+        head = f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+        head += "".join(f"{name}: {value}\r\n" for name, value in headers.items())
+        writer.write(head.encode("latin-1") + b"\r\n" + body)
+        await writer.drain()
+    
+    async def _dispatch(self, method, target, headers, body):
+        url = urlsplit(target)
+        path = url.path.rstrip('/') or '/'
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        
+        try:
+            if path == '/health':
+                if method != 'GET':
+                    return 405, {'error': 'Use GET'}, {}
+                health = self.health()
+                return (500 if health['status'] == 'error' else 200), health, {}
+            
+            if path == '/metrics':
+                if method != 'GET':
+                    return 405, {'error': 'Use GET'}, {}
+                if not METRICS.enabled:
+                    return 404, {'error': 'Metrics are disabled; start the server with --metrics'}, {}
+                return 200, METRICS.to_prometheus(), {}
+            
+            if path.startswith('/nutrition/'):
+                if method != 'GET':
+                    return 405, {'error': 'Use GET'}, {}
+                return self.nutrition(unquote(path[len('/nutrition/'):]))
+            
+            if path == '/foods':
+                if method != 'GET':
+                    return 405, {'error': 'Use GET'}, {}
+                return self.search_foods(query)
+            
+            if path == '/predict':
+                if method != 'POST':
+                    return 405, {'error': 'Use POST'}, {}
+                return await self.predict(headers, body, query)
+        except Overloaded as e:
+            return 503, {'success': False, 'error': str(e)}, {'Retry-After': '1'}
+        except BadRequest as e:
+            return 400, {'success': False, 'error': str(e)}, {}
+        except Exception as e:
+            return 500, {'success': False, 'error': str(e)}, {}
+        
+        return 404, {'error': f'No route for {path}'}, {}
+    
+    def health(self):
+        # Never block the event loop on a background model load. A load that
+        # failed is reported with a 500 so supervisors stop waiting for it.
+        loaded = self.predictor.is_loaded
+        error = self.predictor.load_error
+        health = {
+            'status': 'ok' if loaded else 'error' if error is not None else 'loading',
+            'models_loaded': loaded and self.predictor.models_loaded,
+            'queue_depth': self.batcher.depth,
+            'batches': self.batcher.batches,
+            'predictions': self.batcher.items,
+            'uptime_s': round(time.time() - self.started, 1),
+        }
+        if error is not None:
+            health['error'] = f"Model loading failed: {error}"
+        return health
+    
+    def _check_load_error(self):
+        if self.predictor.load_error is not None:
+            raise RuntimeError(f"Model loading failed: {self.predictor.load_error}")
+    
+    def _require_models(self):
+        self._check_load_error()
+        if not self.predictor.is_loaded:
+            raise Overloaded("Models are still loading")
+    
+    def nutrition(self, food_type):
+        self._require_models()
+        nutrition = self.predictor.get_nutrition_info(food_type)
+        if nutrition is None:
+            return 404, {'success': False, 'error': f'Unknown food: {food_type}'}, {}
+        return 200, {'success': True, 'food_type': food_type, 'nutrition': nutrition}, {}
+    
+    def search_foods(self, query):
+        self._require_models()
+        try:
+            limit = int(query.get('limit', 10))
+        except ValueError:
+            raise BadRequest("limit must be an integer")
+        foods = self.predictor.search_foods(query.get('q', ''), limit)
+        return 200, {'success': True, 'query': query.get('q', ''), 'foods': foods}, {}
+    
+    async def predict(self, headers, body, query):
+        fields = dict(query)
+        content_type = headers.get('content-type', '')
+        if content_type.startswith('multipart/form-data'):
+            image_bytes, form = parse_multipart(content_type, body)
+            fields.update(form)
+        else:
+            image_bytes = body
+        
+        if not image_bytes:
+            raise BadRequest("No image uploaded")
+        # Unlike the lookups, predictions made while loading queue until it
+        # finishes.
+        self._check_load_error()
+        
+        # Decode off the event loop and before batching, so a corrupt upload
+        # fails on its own instead of taking its whole batch down.
+        try:
+            image = await asyncio.get_running_loop().run_in_executor(self.decoder, decode_image, image_bytes)
+        except Exception:
+            raise BadRequest("Could not decode image")
+        
+        goal = fields.get('goal', 'maintenance')
+        if goal not in DIETARY_GOALS:
+            raise BadRequest(f"Unknown goal: {goal}")
+        
+        try:
+            consumed = {field: float(fields.get(field, 0) or 0) for field in INTAKE_FIELDS}
+        except ValueError:
+            raise BadRequest("Intake values must be numbers")
+        
+        result = await self.batcher.submit(image, goal, consumed)
+        return (200 if result.get('success') else 500), result, {}
+
+def parse_multipart(content_type, body):
+    message = BytesParser(policy=HTTP).parsebytes(
+        b"Content-Type: " + content_type.encode("latin-1") + b"\r\n\r\n" + body
+    )
+    if not message.is_multipart():
+        raise BadRequest("Malformed multipart body")
+    
+    image_bytes = None
+    fields = {}
+    for part in message.iter_parts():
+        name = part.get_param('name', header='content-disposition')
+        payload = part.get_payload(decode=True) or b""
+        if name == 'image' or (image_bytes is None and part.get_filename()):
+            image_bytes = payload
+        elif name:
+            fields[name] = payload.decode("utf-8", "replace")
+    return image_bytes, fields
+
+async def run_server(predictor, host="127.0.0.1", port=8000, sock=None, max_batch_size=32,
+                     max_wait_ms=5.0, max_queue=256, max_concurrency=None):
+    if max_concurrency is None:
+        # Room for a full queue plus the batch being scored, so the
+        # queue-full 503 is reached before requests are turned away.
+        max_concurrency = max_queue + max_batch_size
+    batcher = MicroBatcher(predictor, max_batch_size, max_wait_ms, max_queue)
+    batcher.start()
+    service = NutritionService(predictor, batcher, max_concurrency)
+    
+    if sock is not None:
+        server = await asyncio.start_server(service.handle_connection, sock=sock)
+    else:
+        server = await asyncio.start_server(service.handle_connection, host, port)
+    
+    addresses = ", ".join(str(s.getsockname()) for s in server.sockets)
+    print(f"Serving on {addresses} (pid {os.getpid()})")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await batcher.stop()
+        service.decoder.shutdown(wait=False)
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="HTTP inference service for NutritionPredictor")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--max-queue", type=int, default=256,
+                        help="Queued predictions before new requests get 503")
+    parser.add_argument("--max-concurrency", type=int,
+                        help="Requests handled at once before new ones get 503 "
+                             "(default: --max-queue plus --max-batch-size)")
+    parser.add_argument("--metrics", action="store_true",
+                        help="Record per-stage timings and serve them at GET /metrics")
+    parser.add_argument("--profile-slow-ms", type=float, default=0.0,
+                        help="Sample the stack of predictions slower than this (0 = off)")
+    parser.add_argument("--profile-dir", help="Write slow-request stack samples here")
+    return parser
+
+def configure_instrumentation(args):
+    if args.metrics:
+        METRICS.enable()
+    if args.profile_slow_ms > 0:
+        set_slow_request_profiler(SlowRequestProfiler(args.profile_slow_ms, output_dir=args.profile_dir))
+
+def main():
+    from pipeline.predict import NutritionPredictor
+    
+    args = build_parser().parse_args()
+    configure_instrumentation(args)
+    # Bind the port straight away and load the models behind it; /predict
+    # requests queue until loading finishes.
+    predictor = NutritionPredictor(shared_models=True, load="background")
+    try:
+        asyncio.run(run_server(
+            predictor, args.host, args.port,
+            max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms,
+            max_queue=args.max_queue, max_concurrency=args.max_concurrency
+        ))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
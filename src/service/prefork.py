@@ -0,0 +1,170 @@
+import os
+import sys
+import time
+import signal
+import socket
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from service.http_server import run_server, configure_instrumentation
+
+MEMORY_FIELDS = ('Rss', 'Pss', 'Shared_Clean', 'Shared_Dirty', 'Private_Clean', 'Private_Dirty')
+
+def read_memory(pid):
+    # Values in kB from /proc/<pid>/smaps_rollup (Linux only).
+    memory = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                name, _, rest = line.partition(":")
+                if name in MEMORY_FIELDS:
+                    memory[name] = int(rest.split()[0])
+    except OSError:
+        return None
+    return memory
+
+def memory_report(pids):
+    lines = [f"{'pid':>8} {'role':>10} " + " ".join(f"{name:>14}" for name in MEMORY_FIELDS)]
+    totals = dict.fromkeys(MEMORY_FIELDS, 0)
+    for role, pid in pids:
+        memory = read_memory(pid)
+        if memory is None:
+            continue
+        for name in MEMORY_FIELDS:
+            totals[name] += memory.get(name, 0)
+        lines.append(f"{pid:>8} {role:>10} " + " ".join(f"{memory.get(name, 0) / 1024:>11.1f} MB" for name in MEMORY_FIELDS))
+    lines.append(f"{'':>8} {'total':>10} " + " ".join(f"{totals[name] / 1024:>11.1f} MB" for name in MEMORY_FIELDS))
+    return "\n".join(lines)
+
+def create_socket(host, port, backlog=1024):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.setblocking(False)
+    return sock
+
+class Supervisor:
+    # Models are loaded (memory-mapped) and the listening socket is bound in
+    # the parent, then workers are forked. Every worker accepts on the shared
+    # socket and reads the same model pages. Workers that exit are restarted;
+    # one that dies within min_uptime of starting is restarted after a
+    # growing delay so a crash loop does not spin the CPU.
+    
+    def __init__(self, predictor, sock, n_workers, server_options, min_uptime=5.0, max_backoff=30.0):
+        self.predictor = predictor
+        self.sock = sock
+        self.n_workers = n_workers
+        self.server_options = server_options
+        self.min_uptime = min_uptime
+        self.max_backoff = max_backoff
+        self.workers = {}
+        self.restarts = 0
+        self._backoff = 0.0
+        self._stopping = False
+    
+    def spawn(self, slot):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGUSR1, signal.SIG_DFL)
+            code = 0
+            try:
+                asyncio.run(run_server(self.predictor, sock=self.sock, **self.server_options))
+            except BaseException as e:
+                print(f"Worker {os.getpid()} failed: {e!r}")
+                code = 1
+            finally:
+                sys.stdout.flush()
+                os._exit(code)
+        
+        self.workers[pid] = (slot, time.monotonic())
+        return pid
+    
+    def report(self):
+        pids = [('supervisor', os.getpid())] + [('worker', pid) for pid in sorted(self.workers)]
+        print(memory_report(pids))
+        sys.stdout.flush()
+    
+    def stop(self, signum=None, frame=None):
+        self._stopping = True
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+    
+    def run(self, report_interval=0.0):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGUSR1, lambda signum, frame: self.report())
+        
+        for slot in range(self.n_workers):
+            self.spawn(slot)
+        print(f"Supervisor {os.getpid()} started {self.n_workers} workers")
+        
+        next_report = time.monotonic() + report_interval if report_interval else None
+        while self.workers:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                time.sleep(0.2)
+                if next_report is not None and time.monotonic() >= next_report:
+                    self.report()
+                    next_report = time.monotonic() + report_interval
+                continue
+            
+            slot, started = self.workers.pop(pid)
+            if self._stopping:
+                continue
+            
+            uptime = time.monotonic() - started
+            if uptime < self.min_uptime:
+                self._backoff = min(self.max_backoff, max(1.0, self._backoff * 2))
+            else:
+                self._backoff = 0.0
+            print(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)} after {uptime:.1f}s; "
+                  f"restarting in {self._backoff:.0f}s")
+            time.sleep(self._backoff)
+            if not self._stopping:
+                self.spawn(slot)
+                self.restarts += 1
+        
+        print("All workers stopped")
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Pre-forked HTTP inference workers sharing memory-mapped models")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--max-queue", type=int, default=256)
+    parser.add_argument("--max-concurrency", type=int)
+    parser.add_argument("--report-interval", type=float, default=0.0,
+                        help="Seconds between memory reports (0 = only on SIGUSR1)")
+    parser.add_argument("--metrics", action="store_true",
+                        help="Per-stage timings at GET /metrics (each worker reports its own)")
+    parser.add_argument("--profile-slow-ms", type=float, default=0.0)
+    parser.add_argument("--profile-dir")
+    return parser
+
+def main():
+    from pipeline.predict import NutritionPredictor
+    
+    args = build_parser().parse_args()
+    configure_instrumentation(args)
+    predictor = NutritionPredictor(shared_models=True)
+    sock = create_socket(args.host, args.port)
+    server_options = {
+        'max_batch_size': args.max_batch_size,
+        'max_wait_ms': args.max_wait_ms,
+        'max_queue': args.max_queue,
+        'max_concurrency': args.max_concurrency,
+    }
+    print(f"Listening on {args.host}:{args.port}")
+    Supervisor(predictor, sock, args.workers, server_options).run(args.report_interval)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+import os
+import sys
+import numpy as np
+from sklearn.datasets import make_classification, make_regression
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+from pipeline.forest_engine import CompiledForest
+
+def test_classifier_matches_sklearn():
+    X, y = make_classification(n_samples=400, n_features=20, n_informative=8, n_classes=4, random_state=0)
+    forest = RandomForestClassifier(n_estimators=25, max_depth=8, random_state=0).fit(X[:300], y[:300])
+    engine = CompiledForest.from_sklearn(forest)
+    
+    labels, proba = engine.predict_with_proba(X[300:])
+    np.testing.assert_array_equal(proba, forest.predict_proba(X[300:]))
+    np.testing.assert_array_equal(labels, forest.predict(X[300:]))
+
+def test_regressor_matches_sklearn():
+    X, y = make_regression(n_samples=400, n_features=10, random_state=0)
+    forest = RandomForestRegressor(n_estimators=25, max_depth=8, random_state=0).fit(X[:300], y[:300])
+    engine = CompiledForest.from_sklearn(forest)
+    
+    np.testing.assert_array_equal(engine.predict(X[300:]), forest.predict(X[300:]))
+
+def test_saved_engine_matches(tmp_path):
+    X, y = make_classification(n_samples=200, n_features=10, random_state=1)
+    engine = CompiledForest.from_sklearn(RandomForestClassifier(n_estimators=10, random_state=1).fit(X, y))
+    engine.save(str(tmp_path))
+    
+    np.testing.assert_array_equal(CompiledForest.load(str(tmp_path)).predict_proba(X), engine.predict_proba(X))
@@ -0,0 +1,31 @@
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+from config import FOOD_CATEGORIES
+from data.create_dataset import generate_synthetic_food_images
+from data.preprocess import extract_features, extract_features_batch
+
+def synthetic_images(per_class=2):
+    rng = np.random.default_rng(0)
+    return np.concatenate([generate_synthetic_food_images(food, per_class, rng) for food in FOOD_CATEGORIES])
+
+def test_batch_features_match_extract_features():
+    images = synthetic_images()
+    reference = np.stack([extract_features(image / 255.0) for image in images])
+    
+    batched = extract_features_batch(images, precision="float64")
+    assert batched.dtype == np.float64
+    np.testing.assert_allclose(batched, reference, rtol=0, atol=1e-12)
+    # uint8 and [0, 1] float input give the same features.
+    np.testing.assert_array_equal(extract_features_batch(images / 255.0, precision="float64"), batched)
+
+def test_float32_features_stay_within_tolerance():
+    # The tolerance extract_features_batch documents for float32.
+    images = synthetic_images()
+    reference = np.stack([extract_features(image / 255.0) for image in images])
+    
+    batched = extract_features_batch(images, precision="float32")
+    assert batched.dtype == np.float32
+    np.testing.assert_allclose(batched, reference, rtol=0, atol=1e-2)
@@ -1,28 +1,54 @@
 import os
 import sys
+import argparse
 
 sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
 
 from data.create_dataset import create_dataset
+from data.nutrition_store import build_store
 from models.train_classifier import train_food_classifier
 from models.train_calorie_model import train_calorie_regressor
+from data.preprocess import feature_params
+from pipeline.model_bundle import write_bundle, source_stamps
+from pipeline.forest_compaction import compact_models
+from pipeline.backends import BACKENDS, DEFAULT_BACKEND
+from config import PRECISION, MODELS_DIR, MODEL_BUNDLE_DIR, NUTRITION_DB_PATH
 
-def main():
+def main(packed=False, precision=PRECISION, compact=False, max_accuracy_drop=0.005, max_mae_increase=0.02,
+         backend=DEFAULT_BACKEND):
     print("=" * 60)
     print("AI-Powered Nutrition Recommendation System - Training")
     print("=" * 60)
     
     print("\n[1/3] Creating synthetic food dataset...")
     print("-" * 40)
-    create_dataset(samples_per_class=50)
+    create_dataset(samples_per_class=50, packed=packed)
+    if not os.path.exists(NUTRITION_DB_PATH):
+        # An existing database may hold imported foods; it is left as is.
+        build_store(NUTRITION_DB_PATH)
+        print(f"Nutrition database written to {NUTRITION_DB_PATH}")
     
     print("\n[2/3] Training food classifier...")
     print("-" * 40)
-    classifier, label_encoder, accuracy = train_food_classifier()
+    classifier, label_encoder, accuracy = train_food_classifier(packed=packed, precision=precision, backend=backend)
     
     print("\n[3/3] Training calorie regressor...")
     print("-" * 40)
-    regressor, food_encoder = train_calorie_regressor()
+    regressor, food_encoder = train_calorie_regressor(packed=packed)
+    
+    if compact:
+        print("\nCompacting models...")
+        print("-" * 40)
+        compacted = compact_models(classifier, regressor, max_accuracy_drop, max_mae_increase,
+                                   precision=precision, packed=packed)
+        classifier = compacted.get('classifier', classifier)
+        regressor = compacted.get('regressor', regressor)
+    
+    manifest = write_bundle(
+        classifier, label_encoder, regressor, food_encoder, feature_params(precision),
+        sources=source_stamps(MODELS_DIR)
+    )
+    print(f"\nModel bundle {manifest['bundle_id']} written to {MODEL_BUNDLE_DIR}")
     
     print("\n" + "=" * 60)
     print("Training Complete!")
@@ -32,4 +58,17 @@ def main():
     print("You can now run the Streamlit app!")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Create the dataset and train all models")
+    parser.add_argument("--packed", action="store_true",
+                        help="Store images in memory-mapped shards instead of one PNG per sample")
+    parser.add_argument("--precision", choices=["float64", "float32"], default=PRECISION,
+                        help="float32 keeps pixels as uint8 and features as float32")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default=DEFAULT_BACKEND,
+                        help="Food classifier model family (see src/models/backend_leaderboard.py)")
+    parser.add_argument("--compact", action="store_true",
+                        help="Prune and quantize the forests in the model bundle within the limits below")
+    parser.add_argument("--max-accuracy-drop", type=float, default=0.005)
+    parser.add_argument("--max-mae-increase", type=float, default=0.02)
+    args = parser.parse_args()
+    main(packed=args.packed, precision=args.precision, compact=args.compact,
+         max_accuracy_drop=args.max_accuracy_drop, max_mae_increase=args.max_mae_increase, backend=args.backend)